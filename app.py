@@ -1,82 +1,84 @@
+import os
 import re
-import requests
-from bs4 import BeautifulSoup
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
-from dash import Dash, dcc, html, Input, Output, dash_table
+from dash import Dash, dcc, html, Input, Output, State, dash_table
+from flask import Response, request
 import plotly.graph_objects as go
 
+import jpx_calendar
+from yahoo_quote import fetch_quote_snapshot
+from ohlcv_store import DailyStore
+from ttl_cache import TTLCache
+from shared_cache import SharedCache
+from volume_profile import build_profile
+from http_client import http_stats
+from metrics import span, traced, carry_run, count_error, observe, register_collector, render_prometheus
+
+try:
+    import diskcache
+    import multiprocess
+    import psutil
+    from dash import DiskcacheManager
+except ImportError:  # dash[diskcache] が無ければ通常のコールバックで動かす
+    diskcache = None
+
+
+# ===============================
+# 上流取得のキャッシュ（シグナル切替などの再実行で取り直さない）
+# ===============================
+CACHE_TTLS = {
+    "history": 60,            # 日足2年（ストア経由）
+    "name": 24 * 60 * 60,     # 銘柄名
+    "margin": 10 * 60,        # 信用残（週1更新）
+    "volume_profile": 2 * 60, # 価格帯別出来高
+}
+# gunicorn の全ワーカーで共有する2段目（SHARED_CACHE=0 で無効）。
+# 共有するときはプロセス内の1段目を小さく・短くして、ワーカー数が増えても各プロセスのメモリを一定に保つ
+SHARED_CACHE = SharedCache() if os.environ.get("SHARED_CACHE", "1") != "0" else None
+CACHE = TTLCache(
+    CACHE_TTLS,
+    max_bytes=int(os.environ.get("APP_CACHE_MAX_MB", "32" if SHARED_CACHE else "128")) * 1024 * 1024,
+    shared=SHARED_CACHE,
+    local_ttl=30 if SHARED_CACHE else None,
+)
+
 
 # ===============================
 # 信用需給（Margin Balance）スクレイピング
 # ===============================
+@CACHE.memoize("margin")
 def get_margin_balance(ticker: str):
     """
-    Yahooファイナンスのトップ（または信用情報欄）から信用買残・売残・倍率を取得する。
-    ログイン不要の公開情報のみ使用。
+    Yahooファイナンスの銘柄ページから信用買残・売残・倍率を取得する。
+    ログイン不要の公開情報のみ使用（取得・解析は yahoo_quote のスナップショットに集約）。
     """
-    base_url = f"https://finance.yahoo.co.jp/quote/{ticker}"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    
-    try:
-        r = requests.get(base_url, headers=headers, timeout=5)
-        if r.status_code != 200:
-            return None
-        
-        soup = BeautifulSoup(r.content, "html.parser")
-        
-        # クラス名などは変動リスクがあるため、キーワード探索で粘る
-        # "信用買残", "信用売残", "信用倍率" のテキストを持つ要素の近傍を探す手法
-        
-        data = {
-            "buy_rem": "-",    # 信用買残
-            "sell_rem": "-",   # 信用売残
-            "ratio": "-",      # 信用倍率
-            "date": "-"        # 基準日
-        }
-        
-        # 全テキストから探索（少し強引だが構造変化に強い）
-        # ただしYahooはSPA化が進んでいるため、SSRされている範囲で取れるか確認
-        # セレクタで見つかればラッキー
-        
-        # 2024/01時点の構造に近い形での探索
-        # <span class="_3rXWJKZF">信用買残</span>...<span class="_3rXWJKZF">123,400株</span>
-        
-        sections = soup.find_all("section")
-        margin_section = None
-        for s in sections:
-            if "信用取引情報" in s.get_text():
-                margin_section = s
-                break
-        
-        if margin_section:
-            # セクション内のdl/dt/ddなどを解析
-            text = margin_section.get_text()
-            
-            # 正規表現で引っこ抜く（"信用買残1,234,500株" のようなパターン）
-            # 数値にはカンマが含まれる
-            m_buy = re.search(r"信用買残([\d,]+)株", text)
-            m_sell = re.search(r"信用売残([\d,]+)株", text)
-            m_ratio = re.search(r"信用倍率([\d,.]+)倍", text)
-            m_date = re.search(r"\(([\d/]+)\)", text) # 日付 (01/24) とか
-
-            if m_buy: data["buy_rem"] = m_buy.group(1)
-            if m_sell: data["sell_rem"] = m_sell.group(1)
-            if m_ratio: data["ratio"] = m_ratio.group(1)
-            if m_date: data["date"] = m_date.group(1)
-            
-        return data
-
-    except Exception as e:
-        print(f"Scrape Error: {e}")
+    snap = fetch_quote_snapshot(ticker)
+    if not snap.ok:
         return None
 
+    return {
+        "buy_rem": snap.margin_buy,              # 信用買残
+        "sell_rem": snap.margin_sell,            # 信用売残
+        "ratio": snap.margin_ratio,              # 信用倍率
+        "date": snap.margin_date or "-",         # 基準日
+    }
+
 # ===============================
 # 価格帯別出来高（Volume Profile）計算
 # ===============================
+VP_BINS = 30
+VP_TICK_ALIGNED = True
+
+
+@CACHE.memoize("volume_profile")
 def calc_volume_profile(ticker: str, mode="short"):
     """
     mode="short": 直近5日（1分足ベース）でザラ場・直近の出来高分布を見る
@@ -97,37 +99,8 @@ def calc_volume_profile(ticker: str, mode="short"):
         if isinstance(df.columns, pd.MultiIndex):
             df.columns = df.columns.get_level_values(0)
             
-        # 必要な列: Close（または平均価格）, Volume
-        # 価格帯を決める
-        price = df["Close"]
-        volume = df["Volume"]
-        
-        min_p = price.min()
-        max_p = price.max()
-        
-        if min_p == max_p:
-            return None
-            
-        # ビン分割（価格の刻みに合わせたいが、簡易的に30分割）
-        # ステップ値をそれっぽく丸める処理を入れると綺麗だが、一旦単純分割
-        bins = np.linspace(min_p, max_p, 31) # 30区間
-        
-        # digitizeで所属ビンを判定
-        # 1オリジンで返ってくるので -1 する
-        indices = np.digitize(price, bins) - 1
-        
-        # ビンごとのVolume合計
-        profile = {}
-        for i, vol in zip(indices, volume):
-            if 0 <= i < len(bins)-1:
-                # ビンの中央値または下限をキーにする
-                p_range_val = (bins[i] + bins[i+1]) / 2
-                p_key = int(p_range_val) # 整数丸め
-                profile[p_key] = profile.get(p_key, 0) + vol
-                
-        # リスト化してソート（価格降順）
-        result = sorted(profile.items(), key=lambda x: x[0], reverse=True)
-        return result
+        # Close と Volume から価格帯別出来高を集計（呼値に揃えた30区間前後）
+        return build_profile(df["Close"], df["Volume"], bins=VP_BINS, tick_aligned=VP_TICK_ALIGNED)
 
     except Exception as e:
         print(f"VP Error: {e}")
@@ -166,10 +139,10 @@ def generate_volume_profile_table(profile_data, current_price, title):
     """
     Dashの各種コンポーネント(html.Table等)を返す
     """
-    if not profile_data:
+    if profile_data is None:
         return html.Div(f"{title}: データなし")
 
-    max_vol = max(p[1] for p in profile_data)
+    max_vol = profile_data.max_volume
     
     # テーブルヘッダー
     header = html.Tr([
@@ -180,14 +153,9 @@ def generate_volume_profile_table(profile_data, current_price, title):
     
     rows = []
     limit_count = 0
-    total_vol = sum(p[1] for p in profile_data)
+    total_vol = profile_data.total_volume
     
-    # ビン幅推定 (最初の2つの差分から)
-    bin_width = 0
-    if len(profile_data) > 1:
-        bin_width = abs(profile_data[0][0] - profile_data[1][0])
-    
-    for price, vol in profile_data:
+    for lower, upper, vol in profile_data.descending():
         # 1%未満は省略
         if total_vol > 0 and (vol / total_vol) < 0.01:
             continue
@@ -197,8 +165,8 @@ def generate_volume_profile_table(profile_data, current_price, title):
             break
             
         # 範囲表示 (ex: 3400 - 3500)
-        p_lower = int(price - bin_width/2)
-        p_upper = int(price + bin_width/2)
+        p_lower = int(lower)
+        p_upper = int(upper)
         price_range_text = f"{p_lower:,} - {p_upper:,}"
         
         # 現在値がこの範囲に含まれるか
@@ -240,6 +208,59 @@ def generate_volume_profile_table(profile_data, current_price, title):
 # ===============================
 LOOKBACK_DAYS = 365 * 2
 
+# 日足は永続ストアから読む（2回目以降は末尾の差分だけ取得）
+DAILY_STORE = DailyStore()
+
+
+@CACHE.memoize("history")
+def fetch_history(ticker: str, day: str):
+    """過去2年の日足（day はキャッシュキー用の日付）"""
+    end = datetime.strptime(day, "%Y-%m-%d")
+    start = end - timedelta(days=LOOKBACK_DAYS)
+    return DAILY_STORE.history(ticker, start=start, end=end + timedelta(days=1))
+
+
+# ===============================
+# 上流呼び出しの並列化
+# コールバックの中の互いに独立した取得（日足2年と銘柄名、価格帯別出来高×2 など）を同時に投げ、
+# 1リクエストの締め切りまでに返ってこなかったものは「データなし」として先に画面を返す。
+# 間に合わなかった取得もそのまま続き、結果はキャッシュに入るので次の表示では使える
+# ===============================
+UPDATE_DEADLINE = float(os.environ.get("APP_UPDATE_DEADLINE", "8"))  # 秒
+UPSTREAM_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("APP_UPSTREAM_THREADS", "16")),
+                                   thread_name_prefix="upstream")
+MISSING = object()  # 締め切りに間に合わなかった
+
+
+def fan_out(calls, deadline=None, **labels):
+    """
+    calls: {名前: (段階名, 関数)} を同時に実行し、{名前: 結果} を返す。
+    例外はその例外オブジェクト、締め切りに間に合わなければ MISSING を返す
+    """
+    def run(name, stage, func):
+        with span(stage, source=name, **labels):
+            return func()
+
+    futures = {name: UPSTREAM_POOL.submit(carry_run(run), name, stage, func)
+               for name, (stage, func) in calls.items()}
+    done, _ = wait(futures.values(), timeout=UPDATE_DEADLINE if deadline is None else deadline)
+    results = {}
+    for name, future in futures.items():
+        if future not in done:
+            count_error("deadline", name)
+            results[name] = MISSING
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = e
+    return results
+
+
+def _or_none(value):
+    """並列取得の結果のうち、使えないもの（例外・時間切れ）は None にする"""
+    return None if value is MISSING or isinstance(value, Exception) else value
+
 
 # ===============================
 # ティッカー整形（285A対応）
@@ -265,6 +286,7 @@ def normalize_ticker(code: str) -> str:
 # ===============================
 # 銘柄名の取得（yfinance）
 # ===============================
+@CACHE.memoize("name")
 def get_ticker_name(ticker: str) -> str:
     try:
         info = yf.Ticker(ticker).info
@@ -368,8 +390,17 @@ def state_badge(text: str):
 # 共通フィルター（あなたの方針）:
 #  - RSI<50 かつ SDI<50 の時だけ点灯（過熱域は点灯しない）
 # ===============================
-def make_entry_signal(df: pd.DataFrame, sig_mode: str) -> pd.DataFrame:
-    out = df.sort_values("Date", ascending=True).copy()
+SIGNAL_MODE_TEXT = {
+    "NONE": "シグナル: なし",
+    "A": "シグナル: A（RSI30回復）",
+    "B": "シグナル: B（RSIがSDIを上抜け）",
+    "C": "シグナル: C（AまたはB）",
+}
+
+
+def calc_signal_flags(df: pd.DataFrame) -> pd.DataFrame:
+    """A/B/C 各モードの点灯フラグ（日付昇順）。モード切替はこの結果から選ぶだけ"""
+    out = df.sort_values("Date", ascending=True)
 
     sdi = pd.to_numeric(out["SDI"], errors="coerce")
     rsi = pd.to_numeric(out["RSI14"], errors="coerce")
@@ -383,26 +414,50 @@ def make_entry_signal(df: pd.DataFrame, sig_mode: str) -> pd.DataFrame:
     # 共通フィルター: 50以上は割安じゃないので点灯しない
     cheap_filter = (rsi < 50) & (sdi < 50)
 
+    return pd.DataFrame({
+        "A": (A & cheap_filter).fillna(False),
+        "B": (B & cheap_filter).fillna(False),
+        "C": ((A | B) & cheap_filter).fillna(False),
+    }, index=out.index)
+
+
+def make_entry_signal(df: pd.DataFrame, sig_mode: str) -> pd.DataFrame:
+    out = df.sort_values("Date", ascending=True).copy()
+
     sig_mode = (sig_mode or "NONE").upper()
+    if sig_mode not in SIGNAL_MODE_TEXT:
+        sig_mode = "NONE"
 
-    if sig_mode == "A":
-        entry_raw = A & cheap_filter
-        mode_text = "シグナル: A（RSI30回復）"
-    elif sig_mode == "B":
-        entry_raw = B & cheap_filter
-        mode_text = "シグナル: B（RSIがSDIを上抜け）"
-    elif sig_mode == "C":
-        entry_raw = (A | B) & cheap_filter
-        mode_text = "シグナル: C（AまたはB）"
-    else:
+    if sig_mode == "NONE":
         entry_raw = pd.Series(False, index=out.index)
-        mode_text = "シグナル: なし"
+    else:
+        entry_raw = calc_signal_flags(out)[sig_mode]
 
-    out["Signal"] = np.where(entry_raw.fillna(False), "エントリー(買い)", "")
-    out["SignalModeText"] = mode_text
+    out["Signal"] = np.where(entry_raw, "エントリー(買い)", "")
+    out["SignalModeText"] = SIGNAL_MODE_TEXT[sig_mode]
     return out
 
 
+def build_signal_store(df: pd.DataFrame) -> dict:
+    """
+    ブラウザに渡すシグナル情報（モード切替はクライアント側だけで行う）
+    A/B/C は点灯した行の位置（日付昇順）のリスト
+    """
+    asc = df.sort_values("Date", ascending=True)
+    flags = calc_signal_flags(asc)
+    dates = pd.to_datetime(asc["Date"], errors="coerce")
+    rsi = pd.to_numeric(asc["RSI14"], errors="coerce")
+    store = {
+        "x": dates.dt.strftime("%Y-%m-%d").tolist(),       # グラフ用
+        "label": dates.dt.strftime("%Y/%m/%d").tolist(),   # テーブルの日付列と同じ表記
+        "rsi": [None if pd.isna(v) else float(v) for v in rsi],
+        "text": SIGNAL_MODE_TEXT,
+    }
+    for mode in ["A", "B", "C"]:
+        store[mode] = np.flatnonzero(flags[mode].to_numpy()).tolist()
+    return store
+
+
 # ===============================
 # 表示整形
 # ===============================
@@ -429,10 +484,139 @@ def fmt_int_comma(x):
         return ""
 
 
+def make_chart(df_asc: pd.DataFrame) -> go.Figure:
+    """SDI + RSI14 のグラフ（df_asc は日付昇順）"""
+    fig = go.Figure()
+
+    PASTEL_RED = "#FF9AA2"
+    PASTEL_BLUE = "#A0C4FF"
+
+    fig.add_trace(go.Scatter(
+        x=df_asc["Date"], y=df_asc["SDI"],
+        mode="lines", name="SDI",
+        line=dict(color=PASTEL_RED, width=2),
+        hovertemplate="日付=%{x|%Y/%m/%d}<br>SDI=%{y:.2f}<extra></extra>",
+    ))
+    fig.add_trace(go.Scatter(
+        x=df_asc["Date"], y=df_asc["RSI14"],
+        mode="lines", name="RSI(14)",
+        line=dict(color=PASTEL_BLUE, width=2),
+        hovertemplate="日付=%{x|%Y/%m/%d}<br>RSI(14)=%{y:.2f}<extra></extra>",
+    ))
+
+    # 点灯日のマーカー（当日だけ）。中身はモードに応じてブラウザ側で差し替える
+    fig.add_trace(go.Scatter(
+        x=[],
+        y=[],
+        mode="markers",
+        name="エントリー(買い)",
+        marker=dict(size=10, symbol="circle"),
+        hovertemplate="日付=%{x|%Y/%m/%d}<br>エントリー(買い)<br>RSI(14)=%{y:.2f}<extra></extra>",
+    ))
+
+    fig.update_yaxes(range=[0, 100])
+    fig.add_hline(y=75, line_width=1, line_dash="dot")
+    fig.add_hline(y=50, line_width=1, line_dash="dot")
+    fig.add_hline(y=25, line_width=1, line_dash="dot")
+
+    fig.update_layout(
+        height=460,
+        margin=dict(l=40, r=20, t=20, b=40),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        hovermode="x unified",
+        template="plotly_white", # 少し綺麗に
+    )
+    fig.update_xaxes(showspikes=True, spikemode="across", spikesnap="cursor", spikedash="dot")
+    return fig
+
+
+# ===============================
+# バックグラウンドコールバック（APP_BACKGROUND=1 のときだけ。既定は従来どおり同期実行）
+# 上流を待つ日足・グラフのコールバック（update）を、gunicorn のワーカーのスレッドではなく別プロセスのジョブで実行する。
+# ワーカーはジョブを起動してすぐ返り、ブラウザは BACKGROUND_POLL_MS ごとに結果を取りに来るだけなので、
+# 遅い銘柄を待つ間も他の利用者のリクエストを受けられる。信用残・価格帯別出来高は共有キャッシュで足りるので同期のまま。
+# - ジョブの受け渡しはローカルの diskcache（外部のブローカーは不要）。全ワーカーが同じディレクトリを見る
+# - ジョブは app を読み込み済みの forkserver から fork する。スレッドが動いているワーカーから直接 fork すると、
+#   他のスレッドが SQLite の内部ロックを持った瞬間の状態を子が引き継いで止まることがある。
+#   プロセス全体の start method は変えず、このマネージャーだけが forkserver のコンテキストを使う。
+#   forkserver はワーカーごとに最初のジョブのときに起動する（その1回だけ数秒かかる）
+# - 入力中に銘柄コードが変わると、ブラウザが前のジョブを oldJob として送り、サーバーがそのプロセスを止める
+# - ジョブの中で取った値は共有キャッシュ（SHARED_CACHE）経由で次の表示・他のワーカーに渡る
+# - ジョブの中のスパン・キャッシュ統計は JSON Lines（SPAN_LOG_PATH）には残るが、/metrics・/cache/stats は
+#   ワーカーのメモリ上にあるので、ジョブの分は載らない
+# 1 CPU の環境では bench_load.py でスループットが 4.33 -> 0.95 件/秒に落ちた。
+# 有効にするのは、デプロイ先で bench_load.py が同期より速いことを確かめてから
+# ===============================
+BACKGROUND_PATH = os.environ.get("APP_BACKGROUND_PATH", os.path.join(".cache", "dash_jobs"))
+BACKGROUND_POLL_MS = 250
+BACKGROUND_EXPIRE = 60  # 受け取られなかった結果を消すまでの秒数
+# forkserver に先に読み込ませるモジュール。APP_JOB_PRELOAD（カンマ区切り）で前に足せる
+JOB_PRELOAD = [m for m in os.environ.get("APP_JOB_PRELOAD", "").split(",") if m] + ["app"]
+BACKGROUND_MANAGER = None
+
+if diskcache is not None:
+    class JobManager(DiskcacheManager):
+        """
+        DiskcacheManager のジョブの起動・止め方・確かめ方を変えたもの（dash のバージョンは requirements.txt で固定。
+        上げるときは test_background_jobs.py を通すこと）。
+        - call_job_fn: 渡されたコンテキスト（forkserver）でプロセスを作る
+        - terminate_job: 元は diskcache 全体のロックを取ったまま終了を最大1秒待つので、同時に使う人が増えると
+          全員のポーリングがそこで詰まる。ジョブは利用者（ページ）ごとに別のキーで、止めるのもその利用者だけなので、
+          ロックも待ちもせず kill するだけにする
+        - job_running: 確かめている間にプロセスが消えても例外にしない
+        """
+
+        def __init__(self, cache, context, **kwargs):
+            super().__init__(cache, **kwargs)
+            self.context = context
+
+        def call_job_fn(self, key, job_fn, args, context):
+            process = self.context.Process(target=job_fn, args=(key, self._make_progress_key(key), args, context))
+            process.start()
+            return process.pid
+
+        def terminate_job(self, job):
+            if job is None:
+                return
+            try:
+                proc = psutil.Process(int(job))
+                if proc.status() != psutil.STATUS_ZOMBIE:
+                    proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+
+        def job_running(self, job):
+            try:
+                return psutil.Process(int(job)).status() != psutil.STATUS_ZOMBIE
+            except (psutil.NoSuchProcess, TypeError, ValueError):
+                return False
+
+
+def make_job_manager(path=BACKGROUND_PATH, preload=None):
+    """forkserver のコンテキストで動く JobManager（preload: forkserver に先に読み込ませるモジュール）"""
+    context = multiprocess.get_context("forkserver")
+    context.set_forkserver_preload(preload or [])
+    return JobManager(
+        diskcache.Cache(path),
+        context,
+        # 同じ銘柄を同時に開いた利用者どうしで結果（と読んだ後のジョブの後始末）が混ざらないよう、
+        # ページ（endId）ごとに別のキーにする。同じページの入れ直しは同じキーで、前のジョブは oldJob で止まる
+        cache_by=[lambda: request.args.get("endId", "")],
+        expire=BACKGROUND_EXPIRE,
+    )
+
+
+if diskcache is not None and os.environ.get("APP_BACKGROUND", "0") == "1":
+    BACKGROUND_MANAGER = make_job_manager(preload=JOB_PRELOAD)
+# update の @app.callback に渡す追加の引数（無効なら空）
+BACKGROUND = {"background": True, "interval": BACKGROUND_POLL_MS} if BACKGROUND_MANAGER else {}
+
+
 # ===============================
 # Dash App
 # ===============================
-app = Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}])
+app = Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}],
+           background_callback_manager=BACKGROUND_MANAGER)
 server = app.server  # Gunicorn用にserverを公開
 app.title = "株需給判定（2年・楽天RSI・エントリー点灯）"
 
@@ -449,18 +633,22 @@ app.layout = html.Div(
     children=[
         html.H2("需給スイング判定", style={"textAlign": "center", "fontSize": "20px", "marginTop": "10px"}),
 
-        # btnなし：入力したら即反映（debounce=True）
+        # btnなし：Enter かフォーカスを外したら反映（code_entered）。
+        # 打っている途中の値（code.value）は先読み（prefetch）にだけ使う
         html.Div(
             style={"display": "flex", "gap": "8px", "alignItems": "center"},
             children=[
                 dcc.Input(
                     id="code",
                     value="7203",
-                    debounce=True,
+                    debounce=False,
                     style={"flex": 1, "height": "36px", "fontSize": "16px"}
                 ),
             ],
         ),
+        dcc.Store(id="code_entered", data="7203"),
+        dcc.Store(id="prefetch_code"),
+        dcc.Store(id="lookup_warm"),
 
         html.Div(
             style={"marginTop": "10px"},
@@ -489,8 +677,37 @@ app.layout = html.Div(
             ],
         ),
 
-        html.Div(id="summary", style={"marginTop": "10px"}),
-        dcc.Graph(id="graph", figure=EMPTY_FIG, config={'displayModeBar': False}),
+        html.Div(id="signal_info", style={"marginTop": "10px", "fontSize": "14px", "fontFamily": "sans-serif"}),
+        html.Div(id="summary", style={"marginTop": "4px"}),
+        dcc.Store(id="signal_store"),
+        dcc.Store(id="paint_start"),
+        dcc.Store(id="graph_drawn"),  # update がグラフを返した時刻（表示時間の計測用。シグナル切替では変わらない）
+
+        # --- 需給・価格帯レポート（グラフより後に、それぞれのコールバックで埋まる） ---
+        html.Details(
+            open=True,
+            style={"marginTop": "12px", "border": "1px solid #e2e8f0", "borderRadius": "4px", "padding": "8px",
+                   "fontFamily": "sans-serif", "fontSize": "14px"},
+            children=[
+                html.Summary("📊 需給・価格帯レポート (クリックで開閉)", style={"fontWeight": "bold", "cursor": "pointer", "marginBottom": "8px"}),
+                html.Div(
+                    style={"padding": "8px", "backgroundColor": "#fff"},
+                    children=[
+                        dcc.Loading(html.Div(id="margin_line"), type="dot"),
+                        html.Div(
+                            style={"display": "flex", "flexWrap": "wrap", "gap": "20px"},
+                            children=[
+                                html.Div(dcc.Loading(html.Div(id="vp_short"), type="dot"), style={"flex": "1", "minWidth": "300px"}),
+                                html.Div(dcc.Loading(html.Div(id="vp_mid"), type="dot"), style={"flex": "1", "minWidth": "300px"}),
+                            ]
+                        ),
+                    ]
+                ),
+            ]
+        ),
+
+        dcc.Loading(dcc.Graph(id="graph", figure=EMPTY_FIG, config={'displayModeBar': False}), type="default"),
+        html.Div(id="paint_info", style={"fontSize": "11px", "color": "#94a3b8", "textAlign": "right"}),
 
         html.H4("過去2年（22営業日 / ページ）", style={"fontSize": "16px", "marginBottom": "8px"}),
         dash_table.DataTable(
@@ -546,34 +763,46 @@ app.layout = html.Div(
     Output("graph", "figure"),
     Output("table", "data"),
     Output("table", "columns"),
-    Input("code", "value"),
-    Input("sig_mode", "value"),
+    Output("signal_store", "data"),
+    Output("graph_drawn", "data"),
+    Input("code_entered", "data"),
+    **BACKGROUND,
 )
-def update(code, sig_mode):
+@traced("app.update")
+def update(code):
     summary = ""
     fig = EMPTY_FIG
     data = []
     columns = []
+    store = None
 
     if not code:
-        return summary, fig, data, columns
+        return summary, fig, data, columns, store, time.time()
 
     ticker = normalize_ticker(code)
     if not ticker:
-        return summary, fig, data, columns
-
-    end = datetime.today()
-    start = end - timedelta(days=LOOKBACK_DAYS)
-
-    try:
-        df = yf.download(ticker, start=start, end=end, auto_adjust=False, progress=False)
-    except Exception as e:
-        summary = html.Div(["❌ yfinance取得で例外: ", html.Code(str(e))])
-        return summary, fig, data, columns
-
+        return summary, fig, data, columns, store, time.time()
+
+    # グラフと表に要る日足と銘柄名だけを同時に取り、締め切りまで待つ
+    # （信用残・価格帯別出来高は別のコールバックが並行して取る）
+    day = datetime.today().strftime("%Y-%m-%d")
+    upstream = fan_out({
+        "history": ("fetch", lambda: fetch_history(ticker, day)),
+        "name": ("fetch", lambda: get_ticker_name(ticker)),
+    }, ticker=ticker)
+
+    df = upstream["history"]
+    if isinstance(df, Exception):
+        count_error("yfinance", type(df).__name__)
+        summary = html.Div(["❌ yfinance取得で例外: ", html.Code(str(df))])
+        return summary, fig, data, columns, store, time.time()
+    if df is MISSING:
+        summary = f"❌ データなし（日足の取得が {UPDATE_DEADLINE:g} 秒以内に終わりませんでした。少し待って再表示してください）"
+        return summary, fig, data, columns, store, time.time()
     if df is None or df.empty:
+        count_error("yfinance", "empty_history")
         summary = "❌ データ取得失敗（ティッカー/ネットワーク確認）"
-        return summary, fig, data, columns
+        return summary, fig, data, columns, store, time.time()
 
     if isinstance(df.columns, pd.MultiIndex):
         df.columns = df.columns.get_level_values(0)
@@ -585,101 +814,40 @@ def update(code, sig_mode):
 
     df = df.reset_index()
 
-    name = get_ticker_name(ticker)
+    name = _or_none(upstream["name"]) or ""
 
     try:
-        df["SDI"] = calc_sdi(df)
-        df["RSI14"] = calc_rsi_cutler(df["Close"], period=14).round(2)
+        with span("indicator", ticker=ticker):
+            df["SDI"] = calc_sdi(df)
+            df["RSI14"] = calc_rsi_cutler(df["Close"], period=14).round(2)
     except Exception as e:
         summary = html.Div(["❌ 指標計算で例外: ", html.Code(str(e))])
-        return summary, fig, data, columns
+        return summary, fig, data, columns, store, time.time()
 
     df["状態"] = df["SDI"].apply(judge_sdi)
 
-    df_sig = make_entry_signal(df, sig_mode=sig_mode)
+    # シグナル列は空で作り、A/B/C の点灯位置は signal_store 経由でブラウザ側で反映する
+    df_sig = make_entry_signal(df, sig_mode="NONE")
     df_desc = df_sig.sort_values("Date", ascending=False).copy()
+    store = build_signal_store(df_sig)
 
     latest_sdi = float(df_desc["SDI"].iloc[0])
     latest_state = df_desc["状態"].iloc[0]
     latest_rsi14 = float(df_desc["RSI14"].iloc[0]) if pd.notna(df_desc["RSI14"].iloc[0]) else np.nan
-    sig_text = df_desc["SignalModeText"].iloc[0]
     ticker_text = f"{ticker}（{name}）" if name else ticker
 
-    # 点灯回数 & 直近点灯日（モード切替に連動）
-    entry_mask = (df_sig["Signal"] == "エントリー(買い)")
-    entry_count = int(entry_mask.sum())
-    if entry_count > 0:
-        last_entry_dt = pd.to_datetime(df_sig.loc[entry_mask, "Date"], errors="coerce").max()
-        last_entry_date = last_entry_dt.strftime("%Y/%m/%d") if pd.notna(last_entry_dt) else "-"
-    else:
-        last_entry_date = "-"
-
-    # --------------------------
-    # 信用需給 & 価格帯別出来高レポート作成
-    # --------------------------
-    margin_data = get_margin_balance(ticker)
-    vp_short = calc_volume_profile(ticker, mode="short")
-    vp_mid = calc_volume_profile(ticker, mode="mid")
-    
-    # 信用情報の整形
-    # "信用買残: 123,400 (+1,200) / 倍率: 2.30" みたいな一行
-    margin_text = "信用情報取得失敗"
-    if margin_data and margin_data["buy_rem"] != "-":
-        margin_text = (
-            f"信用買残: {margin_data['buy_rem']}株 / "
-            f"売残: {margin_data['sell_rem']}株 / "
-            f"倍率: {margin_data['ratio']}倍 ({margin_data['date']}時点)"
-        )
-    
-    # VPレポート整形 (Dash Componentへ変更)
-    # 現在価格を取得（dfの最新Close）
-    current_price = df["Close"].iloc[-1] if not df.empty else 0
-    
-    table_short = generate_volume_profile_table(vp_short, current_price, f"直近5日 ({int(current_price):,}円周辺・短期)")
-    table_mid = generate_volume_profile_table(vp_mid, current_price, f"直近1ヶ月 ({int(current_price):,}円周辺・中期)")
-    
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
+    render_span = span("render", ticker=ticker).start()
 
+    # 信用需給・価格帯別出来高は別のコールバック（update_margin / update_volume_profile）で後から埋める
     summary_div = html.Div(
         style={"fontSize": "14px", "marginTop": "6px", "fontFamily": "sans-serif"},
         children=[
             html.Div([
-                html.Span(f"{sig_text} / "),
                 html.Span("RSI方式: Cutler / "),
                 html.Span(f"銘柄: {ticker_text} / 最新SDI: {latest_sdi:.2f}（"),
                 state_badge(latest_state),
                 html.Span(f"） / RSI(14): {latest_rsi14:.2f}"),
             ]),
-            html.Div(f"過去2年の点灯回数: {entry_count:,}回 / 直近: {last_entry_date}", style={"marginTop": "2px"}),
-            
-            # --- レポート表示エリア ---
-            html.Details(
-                open=True,
-                style={"marginTop": "12px", "border": "1px solid #e2e8f0", "borderRadius": "4px", "padding": "8px"},
-                children=[
-                    html.Summary("📊 需給・価格帯レポート (クリックで開閉)", style={"fontWeight": "bold", "cursor": "pointer", "marginBottom": "8px"}),
-                    
-                    html.Div(
-                        style={"padding": "8px", "backgroundColor": "#fff"},
-                        children=[
-                            html.Div(f"更新日時: {now_str}", style={"fontSize": "11px", "color": "#64748b", "marginBottom": "8px", "textAlign": "right"}),
-                            
-                            html.Div(
-                                style={"border": "1px solid #ddd", "padding": "8px", "marginBottom": "12px", "backgroundColor": "#f8fafc", "borderRadius": "4px"},
-                                children=[html.B(margin_text)]
-                            ),
-                            
-                            html.Div(
-                                style={"display": "flex", "flexWrap": "wrap", "gap": "20px"},
-                                children=[
-                                    html.Div(table_short, style={"flex": "1", "minWidth": "300px"}),
-                                    html.Div(table_mid, style={"flex": "1", "minWidth": "300px"}),
-                                ]
-                            )
-                        ]
-                    )
-                ]
-            )
         ],
     )
 
@@ -687,49 +855,7 @@ def update(code, sig_mode):
     # グラフ（SDI + RSI14）
     # --------------------------
     df_asc = df_sig.sort_values("Date", ascending=True).copy()
-    fig = go.Figure()
-
-    PASTEL_RED = "#FF9AA2"
-    PASTEL_BLUE = "#A0C4FF"
-
-    fig.add_trace(go.Scatter(
-        x=df_asc["Date"], y=df_asc["SDI"],
-        mode="lines", name="SDI",
-        line=dict(color=PASTEL_RED, width=2),
-        hovertemplate="日付=%{x|%Y/%m/%d}<br>SDI=%{y:.2f}<extra></extra>",
-    ))
-    fig.add_trace(go.Scatter(
-        x=df_asc["Date"], y=df_asc["RSI14"],
-        mode="lines", name="RSI(14)",
-        line=dict(color=PASTEL_BLUE, width=2),
-        hovertemplate="日付=%{x|%Y/%m/%d}<br>RSI(14)=%{y:.2f}<extra></extra>",
-    ))
-
-    # 点灯日のマーカー（当日だけ）
-    marks = df_asc[df_asc["Signal"] == "エントリー(買い)"].copy()
-    if not marks.empty:
-        fig.add_trace(go.Scatter(
-            x=marks["Date"],
-            y=marks["RSI14"],
-            mode="markers",
-            name="エントリー(買い)",
-            marker=dict(size=10, symbol="circle"),
-            hovertemplate="日付=%{x|%Y/%m/%d}<br>エントリー(買い)<br>RSI(14)=%{y:.2f}<extra></extra>",
-        ))
-
-    fig.update_yaxes(range=[0, 100])
-    fig.add_hline(y=75, line_width=1, line_dash="dot")
-    fig.add_hline(y=50, line_width=1, line_dash="dot")
-    fig.add_hline(y=25, line_width=1, line_dash="dot")
-
-    fig.update_layout(
-        height=460,
-        margin=dict(l=40, r=20, t=20, b=40),
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-        hovermode="x unified",
-        template="plotly_white", # 少し綺麗に
-    )
-    fig.update_xaxes(showspikes=True, spikemode="across", spikesnap="cursor", spikedash="dot")
+    fig = make_chart(df_asc)
 
     # --------------------------
     # テーブル整形
@@ -754,9 +880,447 @@ def update(code, sig_mode):
 
     columns = [{"name": c, "id": c} for c in view.columns]
     data = view.to_dict("records")
+    render_span.end()
+
+    # Figure のままだとバックグラウンドのジョブから受け取るとき（unpickle）に全属性の検証をやり直して重いので、
+    # 素の dict で返す（ブラウザに送る JSON は同じ）
+    return summary_div, fig.to_dict(), data, columns, store, time.time()
+
+
+# ===============================
+# 信用需給（グラフの後から埋まる）
+# ===============================
+@app.callback(
+    Output("margin_line", "children"),
+    Input("code_entered", "data"),
+)
+@traced("app.update_margin")
+def update_margin(code):
+    ticker = normalize_ticker(code) if code else ""
+    if not ticker:
+        return ""
+
+    upstream = fan_out({"margin": ("fetch", lambda: get_margin_balance(ticker))}, ticker=ticker)
+    margin_data = _or_none(upstream["margin"])
+
+    # "信用買残: 123,400 (+1,200) / 倍率: 2.30" みたいな一行
+    margin_text = "信用情報取得失敗"
+    if upstream["margin"] is MISSING:
+        margin_text = "信用情報: データなし（時間切れ）"
+    elif margin_data and margin_data["buy_rem"] != "-":
+        margin_text = (
+            f"信用買残: {margin_data['buy_rem']}株 / "
+            f"売残: {margin_data['sell_rem']}株 / "
+            f"倍率: {margin_data['ratio']}倍 ({margin_data['date']}時点)"
+        )
+
+    now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
+    return [
+        html.Div(f"更新日時: {now_str}", style={"fontSize": "11px", "color": "#64748b", "marginBottom": "8px", "textAlign": "right"}),
+        html.Div(
+            style={"border": "1px solid #ddd", "padding": "8px", "marginBottom": "12px", "backgroundColor": "#f8fafc", "borderRadius": "4px"},
+            children=[html.B(margin_text)]
+        ),
+    ]
+
+
+# ===============================
+# 価格帯別出来高（短期・中期の2表。グラフの後から埋まる）
+# ===============================
+@app.callback(
+    Output("vp_short", "children"),
+    Output("vp_mid", "children"),
+    Input("code_entered", "data"),
+)
+@traced("app.update_volume_profile")
+def update_volume_profile(code):
+    ticker = normalize_ticker(code) if code else ""
+    if not ticker:
+        return "", ""
+
+    # 現在値は日足の最新終値（update と同じキーなので取得は合流する）
+    day = datetime.today().strftime("%Y-%m-%d")
+    upstream = fan_out({
+        "history": ("fetch", lambda: fetch_history(ticker, day)),
+        "vp_short": ("volume_profile", lambda: calc_volume_profile(ticker, mode="short")),
+        "vp_mid": ("volume_profile", lambda: calc_volume_profile(ticker, mode="mid")),
+    }, ticker=ticker)
+
+    df = _or_none(upstream["history"])
+    if df is None or df.empty:
+        # 現在値が無いと価格帯の位置づけ（〇〇円周辺）が出せないので、表は出さない
+        reason = "時間切れ" if upstream["history"] is MISSING else "日足を取得できませんでした"
+        return html.Div(f"価格帯別出来高: 現在値を取得できませんでした（{reason}）"), ""
+    current_price = float(df["Close"].iloc[-1])
+
+    with span("render", ticker=ticker):
+        table_short = generate_volume_profile_table(_or_none(upstream["vp_short"]), current_price, f"直近5日 ({int(current_price):,}円周辺・短期)")
+        table_mid = generate_volume_profile_table(_or_none(upstream["vp_mid"]), current_price, f"直近1ヶ月 ({int(current_price):,}円周辺・中期)")
+    return table_short, table_mid
+
+
+# ===============================
+# 先読み
+# - 起動時のウォームアップ: APP_WARM_CODES（カンマ区切り）の銘柄の日足・銘柄名・信用残・価格帯別出来高を
+#   最初のリクエストの時点で裏で取り始め、その後は jpx_calendar の更新フェーズ（立会時間前後）の間隔で取り直す。
+#   休場日・夜間・昼休みは次の更新フェーズまで寝る。共有キャッシュがあれば、各周期に取りに行くのは
+#   SHARED_CACHE の claim を取れた1ワーカーだけ（他のワーカーはその結果を共有キャッシュから読む）
+# - 入力中の先読み: 打っている途中のコードが東証のコード（4桁・数字3桁+英字）になり、少し手が止まった時点で、
+#   Enter を待たずに同じ取得を始めておく。判定はブラウザ側でするので、打ちかけの文字ではサーバーに送らない
+# どちらも結果をキャッシュに入れるだけで画面は変えない。バックグラウンドのジョブ（別プロセス）からは
+# 共有キャッシュ（SHARED_CACHE）経由で使われるので、SHARED_CACHE=0 だとジョブの表示は速くならない
+# ===============================
+WARM_UP_KEY = "warm_up"  # 周期ごとのウォームアップを1ワーカーに絞る共有キャッシュのキー
+PREFETCH_DELAY_MS = 300  # 打つ手がこれだけ止まったら先読みする
+WARM_CODES = list(dict.fromkeys(t for t in (normalize_ticker(c) for c in os.environ.get("APP_WARM_CODES", "").split(",")) if t))
+PREFETCH_INTERVAL = 30  # 同じ銘柄をこの秒数の間は先読みし直さない
+_WARM_UP = {"thread": None, "runs": 0, "last": None, "seconds": None, "next_in": None}
+_PREFETCH = {"requests": 0, "started": 0, "recent": {}}  # recent: ticker -> 先読みした時刻（monotonic）
+_PREFETCH_LOCK = threading.Lock()
+
+
+def preload_calls(ticker, day):
+    """1銘柄の表示に要る上流の取得（update / update_margin / update_volume_profile と同じキー）"""
+    return {
+        "history": lambda: fetch_history(ticker, day),
+        "name": lambda: get_ticker_name(ticker),
+        "margin": lambda: get_margin_balance(ticker),
+        "vp_short": lambda: calc_volume_profile(ticker, mode="short"),
+        "vp_mid": lambda: calc_volume_profile(ticker, mode="mid"),
+    }
+
+
+def is_warm(ticker, day):
+    """表示に要る取得がすべてキャッシュ済みか"""
+    return (fetch_history.is_cached(ticker, day) and get_ticker_name.is_cached(ticker)
+            and get_margin_balance.is_cached(ticker) and calc_volume_profile.is_cached(ticker, mode="short")
+            and calc_volume_profile.is_cached(ticker, mode="mid"))
+
+
+def preload(ticker):
+    """1銘柄分の取得を UPSTREAM_POOL に投げる（待たない）。失敗は次の表示で取り直すので無視する"""
+    day = datetime.today().strftime("%Y-%m-%d")
+    return [UPSTREAM_POOL.submit(func) for func in preload_calls(ticker, day).values()]
+
+
+def warm_up_once():
+    """APP_WARM_CODES を1銘柄ずつ取得する（リクエスト用の UPSTREAM_POOL を埋め尽くさないように）"""
+    started = time.perf_counter()
+    for ticker in WARM_CODES:
+        wait(preload(ticker), timeout=UPDATE_DEADLINE * 2)
+    _WARM_UP["runs"] += 1
+    _WARM_UP["last"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _WARM_UP["seconds"] = round(time.perf_counter() - started, 2)
+    print(f"Warm-up: {len(WARM_CODES)} codes in {_WARM_UP['seconds']}s")
+
+
+def _warm_up_loop():
+    while True:
+        next_in = jpx_calendar.seconds_until_next_refresh()
+        try:
+            # 次の周期まで押さえるので、同じ周期の他のワーカーは取りに行かない
+            if SHARED_CACHE is None or SHARED_CACHE.claim(WARM_UP_KEY, max(1, next_in - 1)):
+                warm_up_once()
+        except Exception as e:
+            print(f"Warm-up error: {e}")
+        _WARM_UP["next_in"] = jpx_calendar.seconds_until_next_refresh()
+        time.sleep(_WARM_UP["next_in"])
+
+
+def start_warm_up():
+    """
+    ウォームアップのスレッドを（プロセスごとに1回だけ）起動する。
+    import 時に起動しないのは、app を読み込んだ forkserver やジョブのプロセスでスレッドを走らせないため
+    """
+    with _PREFETCH_LOCK:
+        if not WARM_CODES or _WARM_UP["thread"] is not None:
+            return
+        _WARM_UP["thread"] = threading.Thread(target=_warm_up_loop, name="warm-up", daemon=True)
+    _WARM_UP["thread"].start()
+
+
+@server.before_request
+def _start_warm_up_on_first_request():
+    if WARM_CODES and _WARM_UP["thread"] is None:
+        start_warm_up()
+
+
+def is_prefetchable(ticker):
+    """先読みしてよい銘柄か（東証のコードだけ。米国株などは打ちかけの文字列も別の銘柄になる）"""
+    return bool(re.fullmatch(r"\d{3}[0-9A-Z]\.T", ticker))
+
+
+# 打っている途中の値から、東証のコードになって PREFETCH_DELAY_MS 止まったときだけ prefetch_code を更新する
+app.clientside_callback(
+    """
+    function(code) {
+        const noUpdate = window.dash_clientside.no_update;
+        const seq = window._prefetchSeq = (window._prefetchSeq || 0) + 1;  // 待っている前の入力を無効にする
+        code = (code || "").trim().toUpperCase();
+        if (!/^\\d{3}[0-9A-Z](\\.T)?$/.test(code)) {
+            return noUpdate;
+        }
+        return new Promise(resolve => setTimeout(
+            () => resolve(seq === window._prefetchSeq ? code : noUpdate), %d));
+    }
+    """ % PREFETCH_DELAY_MS,
+    Output("prefetch_code", "data"),
+    Input("code", "value"),
+    prevent_initial_call=True,
+)
+
+
+@app.callback(
+    Input("prefetch_code", "data"),
+    prevent_initial_call=True,
+)
+def prefetch(code):
+    ticker = normalize_ticker(code) if code else ""
+    now = time.monotonic()
+    with _PREFETCH_LOCK:
+        _PREFETCH["requests"] += 1
+        if not is_prefetchable(ticker) or now - _PREFETCH["recent"].get(ticker, -PREFETCH_INTERVAL) < PREFETCH_INTERVAL:
+            return
+        recent = _PREFETCH["recent"]
+        for old in [t for t, at in recent.items() if now - at >= PREFETCH_INTERVAL]:
+            del recent[old]
+        recent[ticker] = now
+        _PREFETCH["started"] += 1
+    preload(ticker)
+
+
+@app.callback(
+    Output("lookup_warm", "data"),
+    Input("code_entered", "data"),
+)
+def lookup_warmth(code):
+    """
+    入力が確定した時点で表示に要る取得がキャッシュ済みか（/metrics/paint で cold / warm に分けるため）。
+    update がバックグラウンドのジョブでも、ジョブを起動するワーカー側で、取得が始まる前に確かめる
+    """
+    ticker = normalize_ticker(code) if code else ""
+    if not ticker:
+        return None
+    return is_warm(ticker, datetime.today().strftime("%Y-%m-%d"))
+
+
+# Enter / フォーカスを外したときだけ code_entered を更新する（同じ値なら何もしない）
+app.clientside_callback(
+    """
+    function(nSubmit, nBlur, code, entered) {
+        if (code === entered) {
+            return window.dash_clientside.no_update;
+        }
+        return code;
+    }
+    """,
+    Output("code_entered", "data"),
+    Input("code", "n_submit"),
+    Input("code", "n_blur"),
+    State("code", "value"),
+    State("code_entered", "data"),
+    prevent_initial_call=True,
+)
+
+
+# ===============================
+# 表示までの時間（ブラウザで計測）
+# 銘柄コードの入力からグラフが出るまで（first paint）と、レポートまで全部埋まるまで（complete）。
+# 画面右下に表示し、/metrics/paint に送って /metrics のヒストグラム（kind="browser"）に積む。
+# 表示に要る取得がキャッシュ済みだったか（cold / warm）でも分け、/lookup/stats で p50 / p95 を返す
+# ===============================
+PAINT_STAGES = ("first_paint", "complete")
+PAINT_SAMPLES = 1000  # cold / warm ごとに直近この件数で p50 / p95 を出す
+_PAINT_SAMPLES = {(phase, stage): deque(maxlen=PAINT_SAMPLES)
+                  for phase in ("cold", "warm") for stage in PAINT_STAGES}
+_PAINT_LOCK = threading.Lock()
+
+
+@server.route("/metrics/paint", methods=["POST"])
+def record_paint():
+    payload = request.get_json(force=True, silent=True) or {}
+    warm = payload.get("warm")
+    phase = ("warm" if warm else "cold") if isinstance(warm, bool) else None
+    for stage in PAINT_STAGES:
+        ms = payload.get(f"{stage}_ms")
+        if isinstance(ms, (int, float)) and 0 <= ms < 10 * 60 * 1000:
+            observe("browser", stage, ms / 1000)
+            if phase:
+                observe(f"browser.{phase}", stage, ms / 1000)
+                with _PAINT_LOCK:
+                    _PAINT_SAMPLES[(phase, stage)].append(ms)
+    return "", 204
+
+
+@server.route("/lookup/stats")
+def lookup_stats():
+    """表示までの時間（cold / warm 別の p50 / p95、このワーカーの分）と先読みの状況"""
+    with _PAINT_LOCK:
+        samples = {key: list(v) for key, v in _PAINT_SAMPLES.items()}
+    latency = {}
+    for (phase, stage), values in samples.items():
+        summary = {"count": len(values)}
+        if values:
+            summary["p50_ms"] = round(float(np.percentile(values, 50)), 1)
+            summary["p95_ms"] = round(float(np.percentile(values, 95)), 1)
+        latency.setdefault(phase, {})[stage] = summary
+    with _PREFETCH_LOCK:
+        prefetch_stats = {"requests": _PREFETCH["requests"], "started": _PREFETCH["started"]}
+    warm_up = {k: v for k, v in _WARM_UP.items() if k != "thread"}
+    warm_up.update(codes=WARM_CODES, running=_WARM_UP["thread"] is not None)
+    return {"latency": latency, "warm_up": warm_up, "prefetch": prefetch_stats}
+
+
+@server.route("/cache/stats")
+def cache_stats():
+    """キャッシュのヒット/ミス数など"""
+    return CACHE.stats()
+
+
+@register_collector
+def cache_metrics():
+    """/metrics 用: 取得キャッシュ（種類別）と HTTP キャッシュの統計"""
+    stats = CACHE.stats()
+    families = [("cache_entries", "gauge", "Entries in the in-process cache", [({}, stats["entries"])]),
+                ("cache_bytes", "gauge", "Estimated size of the in-process cache", [({}, stats["bytes"])])]
+    for name in ("hits", "misses", "coalesced", "evictions", "errors"):
+        families.append((f"cache_{name}_total", "counter", f"In-process cache {name} by kind",
+                         [({"kind": kind}, v[name]) for kind, v in sorted(stats["kinds"].items())]))
+    shared = stats.get("shared")
+    if shared:
+        families.append(("shared_cache_entries", "gauge", "Live entries in the cross-worker cache", [({}, shared.get("entries", 0))]))
+        families.append(("shared_cache_bytes", "gauge", "Serialized size of the cross-worker cache", [({}, shared.get("bytes", 0))]))
+        families.append(("shared_cache_events_total", "counter", "Cross-worker cache lookups, loads and lock waits in this worker",
+                         [({"event": k}, shared[k]) for k in ("hits", "misses", "loads", "waits", "takeovers", "errors")]))
+    http = http_stats()
+    families.append(("http_requests_total", "counter", "Upstream HTTP requests by cache outcome",
+                     [({"outcome": k}, http[k]) for k in ("hits", "revalidated", "misses", "errors")]))
+    families.append(("http_bytes_saved_total", "counter", "Bytes served from the HTTP cache", [({}, http["bytes_saved"])]))
+    return families
+
+
+@server.route("/metrics")
+def prometheus_metrics():
+    """Prometheus 形式のメトリクス（段階ごとの所要時間・上流エラー数・キャッシュ統計）"""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+app.clientside_callback(
+    """
+    function(code) {
+        window._paint = {start: performance.now(), parts: {}};
+        return window._paint.start;
+    }
+    """,
+    Output("paint_start", "data"),
+    Input("code_entered", "data"),
+)
+
+app.clientside_callback(
+    """
+    function(drawn, margin, vpMid, start, lookupWarm) {
+        const p = window._paint;
+        if (!p || !start) {
+            return window.dash_clientside.no_update;
+        }
+        const ctx = window.dash_clientside.callback_context;
+        const now = performance.now();
+        ctx.triggered.forEach(t => {
+            const id = t.prop_id.split(".")[0];
+            if (!(id in p.parts)) p.parts[id] = now - p.start;
+        });
+        const first = p.parts["graph_drawn"];
+        const done = ["graph_drawn", "margin_line", "vp_mid"].every(id => id in p.parts);
+        if (first === undefined) {
+            return window.dash_clientside.no_update;
+        }
+        let text = "グラフ表示 " + (first / 1000).toFixed(2) + "秒";
+        if (done) {
+            const complete = Math.max(...Object.values(p.parts));
+            text += " / 全体 " + (complete / 1000).toFixed(2) + "秒";
+            if (!p.sent) {
+                p.sent = true;
+                const warm = typeof lookupWarm === "boolean" ? lookupWarm : null;
+                const body = JSON.stringify({first_paint_ms: first, complete_ms: complete, warm: warm});
+                if (navigator.sendBeacon) {
+                    navigator.sendBeacon("/metrics/paint", new Blob([body], {type: "application/json"}));
+                }
+            }
+        }
+        return text;
+    }
+    """,
+    Output("paint_info", "children"),
+    Input("graph_drawn", "data"),
+    Input("margin_line", "children"),
+    Input("vp_mid", "children"),
+    State("paint_start", "data"),
+    State("lookup_warm", "data"),
+    prevent_initial_call=True,
+)
+
+
+# ===============================
+# シグナルモード切替（ブラウザ側のみ・サーバー往復なし）
+# マーカー（3本目のトレース）、テーブルのシグナル列、点灯回数/直近日だけを差し替える
+# ===============================
+app.clientside_callback(
+    """
+    function(mode, store, fig, rows) {
+        const noUpdate = window.dash_clientside.no_update;
+        if (!store || !fig || !rows) {
+            return [noUpdate, noUpdate, ""];
+        }
+        mode = (mode || "NONE").toUpperCase();
+        const hits = store[mode] || [];
+        const hitLabels = new Set(hits.map(i => store.label[i]));
+
+        const data = fig.data.slice();
+        data[2] = Object.assign({}, data[2], {
+            x: hits.map(i => store.x[i]),
+            y: hits.map(i => store.rsi[i]),
+        });
+        const newFig = Object.assign({}, fig, {data: data});
+
+        const newRows = rows.map(r => Object.assign({}, r, {
+            "シグナル": hitLabels.has(r["日付"]) ? "エントリー(買い)" : "",
+        }));
+
+        const count = hits.length.toLocaleString();
+        const last = hits.length ? store.label[hits[hits.length - 1]] : "-";
+        const text = (store.text[mode] || store.text.NONE)
+            + " / 過去2年の点灯回数: " + count + "回 / 直近: " + last;
+        return [newFig, newRows, text];
+    }
+    """,
+    Output("graph", "figure", allow_duplicate=True),
+    Output("table", "data", allow_duplicate=True),
+    Output("signal_info", "children"),
+    Input("sig_mode", "value"),
+    Input("signal_store", "data"),
+    State("graph", "figure"),
+    State("table", "data"),
+    prevent_initial_call=True,
+)
+
+
+def _prime_job_imports():
+    """
+    ジョブは app を読み込み済みの forkserver から fork するので、plotly・pandas の初回だけの処理
+    （遅延 import、テンプレートの読み込み、日付の変換の準備）をここで一度済ませておく。
+    しないとジョブのたびにやり直し、1回あたり数百ミリ秒余計にかかる
+    """
+    n = 60
+    df = pd.DataFrame({"Date": pd.date_range("2024-01-01", periods=n, unit="us"),
+                       "SDI": np.linspace(30, 70, n), "RSI14": np.linspace(70, 30, n)})
+    build_signal_store(df)
+    make_chart(df).to_dict()
+    pd.to_datetime(df["Date"], errors="coerce").dt.strftime("%Y/%m/%d")
 
-    return summary_div, fig, data, columns
 
+if BACKGROUND_MANAGER is not None:
+    _prime_job_imports()
 
 if __name__ == "__main__":
+    start_warm_up()
     app.run(debug=True, port=8052, host="0.0.0.0", use_reloader=False)
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+import replay
+
+# ===============================
+# 負荷試験（同時利用者 N 人）
+#
+# replay.py の fixtures を遅延つきで再生する gunicorn を立て、ブラウザと同じ手順
+# （ページを開いて end_id を受け取り、銘柄コードごとに3つのコールバックを同時に POST、
+#   バックグラウンドのジョブなら結果が出るまでポーリング）で N 人が銘柄を見続ける。
+# バックグラウンドコールバックあり（APP_BACKGROUND=1）と無し（=0）を同じ条件で比べ、
+#   - 表示できた銘柄数（スループット）
+#   - グラフが出るまで（first paint）・全部埋まるまで（complete）の p50 / p95
+#   - 負荷中の軽いリクエスト（/cache/stats）の応答時間（ワーカーが塞がっていないか）
+# を表示する。--retype の割合の利用者は入力途中で別の銘柄に変える（前のジョブは oldJob で止まる）。
+#
+#   python replay.py synth 7203 6501 ...       # fixtures が無ければ合成する
+#   python bench_load.py                       # 20人・あり/なしを比較
+#   python bench_load.py --synth 60 --users 20 --duration 30
+# ===============================
+DEFAULT_PORT = 8071
+POLL_SECONDS = 0.25  # バックグラウンドのジョブの結果を取りに行く間隔（app.BACKGROUND_POLL_MS と同じ）
+PROBE_SECONDS = 0.1  # 軽いリクエストを投げる間隔
+REPLAY_ENV = "BENCH_LOAD_REPLAY"  # サーバー側で再生する fixtures と遅延（JSON）
+
+# サーバーとして起動されたとき、またジョブを起動する forkserver に読み込まれたとき（APP_JOB_PRELOAD）は、
+# import した時点で fixtures の再生を有効にする（ジョブの中の取得も同じ条件で再生される）
+if os.environ.get(REPLAY_ENV):
+    replay.replay(**json.loads(os.environ[REPLAY_ENV]))
+
+
+# ===============================
+# サーバー（別プロセス）
+# ===============================
+def serve(args):
+    """app を読み込み、gunicorn で起動する（再生は import 時に有効になり、ワーカーは再生の設定ごと fork される）"""
+    from gunicorn.app.base import BaseApplication
+
+    import app
+
+    class _Server(BaseApplication):
+        def load_config(self):
+            for key, value in {"bind": f"127.0.0.1:{args.port}", "workers": args.workers,
+                               "threads": args.threads, "worker_class": "gthread",
+                               "timeout": 120, "loglevel": "warning"}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app.server
+
+    _Server().run()
+
+
+def start_server(args, background, workdir):
+    playback = {"fixture_dir": os.path.abspath(args.fixtures), "page_latency": args.page_latency,
+                "ohlcv_latency": args.ohlcv_latency, "jitter": args.jitter}
+    env = dict(os.environ, APP_BACKGROUND="1" if background else "0", APP_JOB_PRELOAD="bench_load",
+               PYTHONUNBUFFERED="1", SPAN_LOG_PATH="")
+    env[REPLAY_ENV] = json.dumps(playback)
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+           "--workers", str(args.workers), "--threads", str(args.threads)]
+    # 作業ディレクトリを変えても app を読めるようにする
+    env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH", "")])
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, start_new_session=True)
+    base = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            if requests.get(f"{base}/", timeout=1).ok:
+                return proc, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError("server did not start within 60 seconds")
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+# ===============================
+# 利用者（ブラウザの代わり）
+# ===============================
+def code_callbacks(base):
+    """銘柄コードの確定（code_entered）だけで動くサーバー側のコールバック（グラフ / 信用残 / 価格帯別出来高）"""
+    deps = requests.get(f"{base}/_dash-dependencies", timeout=10).json()
+    callbacks = []
+    for dep in deps:
+        if dep.get("clientside_function") or [i["id"] for i in dep["inputs"]] != ["code_entered"]:
+            continue
+        outputs = []
+        for part in dep["output"].strip(".").split("..."):
+            component, prop = part.rsplit(".", 1)
+            outputs.append({"id": component, "property": prop.split("@")[0]})
+        callbacks.append({"output": dep["output"], "outputs": outputs if len(outputs) > 1 else outputs[0],
+                          "graph": any(o["id"] == "graph" for o in outputs)})
+    return callbacks
+
+
+class User:
+    def __init__(self, base, callbacks, stats, background):
+        self.base = base
+        self.callbacks = callbacks
+        self.stats = stats
+        self.background = background
+        self.session = requests.Session()
+        self.pool = ThreadPoolExecutor(max_workers=6)  # ブラウザの1ホストあたりの同時接続数
+        self.end_id = None
+        self.jobs = {}  # コールバック -> 走っているジョブ（入力が変わったら oldJob で送る）
+
+    def open_page(self):
+        html = self.session.get(f"{self.base}/", timeout=30).text
+        config = json.loads(re.search(r'<script id="_dash-config" type="application/json">(.*?)</script>',
+                                      html, re.S).group(1))
+        self.end_id = config.get("end_id")
+
+    def _post(self, cb, code, args):
+        payload = {"output": cb["output"], "outputs": cb["outputs"],
+                   "inputs": [{"id": "code_entered", "property": "data", "value": code}],
+                   "changedPropIds": ["code_entered.data"], "state": []}
+        res = self.session.post(f"{self.base}/_dash-update-component", params=args, json=payload, timeout=120)
+        if res.status_code == 204:
+            return {}
+        res.raise_for_status()
+        return res.json()
+
+    def start(self, cb, code):
+        """最初の POST。バックグラウンドならジョブの引換券を、同期なら結果を返す"""
+        args = [("endId", self.end_id)] if self.end_id else []
+        old = self.jobs.pop(cb["output"], None)
+        if old:
+            args.append(("oldJob", old))
+            self.stats.add("cancelled", 1)
+        return self._post(cb, code, args)
+
+    def finish(self, cb, code, data):
+        """ジョブなら結果が出るまでポーリングする"""
+        if "job" not in data:
+            return data
+        self.jobs[cb["output"]] = data["job"]
+        args = [("endId", self.end_id), ("cacheKey", data["cacheKey"]), ("job", data["job"])]
+        while "response" not in data:
+            time.sleep(POLL_SECONDS)
+            data = self._post(cb, None, args)
+            self.stats.add("polls", 1)
+            if not data:
+                break  # 止められたジョブ
+        self.jobs.pop(cb["output"], None)
+        return data
+
+    def view(self, code, abandon=None):
+        """1銘柄を表示する。abandon なら直前にその銘柄を入れかけてやめた（前のジョブは止める）"""
+        if abandon:
+            started = [self.pool.submit(self.start, cb, abandon) for cb in self.callbacks]
+            if self.background:
+                for cb, f in zip(self.callbacks, started):
+                    data = f.result()
+                    if "job" in data:
+                        self.jobs[cb["output"]] = data["job"]
+            # 同期のコールバックは止められない（ブラウザは結果を捨てるだけ）ので投げっぱなしにする
+
+        t0 = time.perf_counter()
+        first = None
+
+        def one(cb):
+            data = self.finish(cb, code, self.start(cb, code))
+            return cb, time.perf_counter() - t0, data
+
+        for future in [self.pool.submit(one, cb) for cb in self.callbacks]:
+            cb, elapsed, _ = future.result()
+            if cb["graph"]:
+                first = elapsed
+        return first, time.perf_counter() - t0
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {"first_paint": [], "complete": [], "probe": []}
+        self.counts = {"views": 0, "errors": 0, "cancelled": 0, "polls": 0}
+
+    def add(self, name, value):
+        with self.lock:
+            if name in self.samples:
+                self.samples[name].append(value)
+            else:
+                self.counts[name] += value
+
+
+def _describe(values):
+    if not values:
+        return {"calls": 0, "p50_ms": None, "p95_ms": None}
+    a = np.asarray(values, dtype=float) * 1000
+    return {"calls": len(a), "p50_ms": round(float(np.percentile(a, 50)), 1),
+            "p95_ms": round(float(np.percentile(a, 95)), 1)}
+
+
+def run_load(base, codes, users, duration, retype, seed, background):
+    callbacks = code_callbacks(base)
+    stats = Stats()
+    stop = time.monotonic() + duration
+
+    def user_loop(i):
+        rng = random.Random(seed + i)
+        user = User(base, callbacks, stats, background)
+        user.open_page()
+        while time.monotonic() < stop:
+            code = rng.choice(codes)
+            abandon = rng.choice(codes) if rng.random() < retype else None
+            try:
+                first, complete = user.view(code, abandon)
+                stats.add("first_paint", first)
+                stats.add("complete", complete)
+                stats.add("views", 1)
+            except (requests.RequestException, ValueError) as e:
+                stats.add("errors", 1)
+                print(f"  user {i}: {type(e).__name__}: {e}")
+        user.pool.shutdown(wait=False)
+
+    def probe():
+        session = requests.Session()
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            try:
+                session.get(f"{base}/cache/stats", timeout=30)
+                stats.add("probe", time.perf_counter() - t0)
+            except requests.RequestException:
+                stats.add("errors", 1)
+            time.sleep(PROBE_SECONDS)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=user_loop, args=(i,)) for i in range(users)]
+    threads.append(threading.Thread(target=probe))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    return {"views": stats.counts["views"], "errors": stats.counts["errors"],
+            "cancelled_jobs": stats.counts["cancelled"], "polls": stats.counts["polls"],
+            "throughput_per_s": round(stats.counts["views"] / elapsed, 2),
+            **{name: _describe(values) for name, values in stats.samples.items()}}
+
+
+# ===============================
+# 実行
+# ===============================
+def fixture_codes(fixture_dir):
+    info = os.path.join(fixture_dir, "info")
+    if not os.path.isdir(info):
+        return []
+    return sorted(name[:-len(".T.json")] for name in os.listdir(info) if name.endswith(".T.json"))
+
+
+def print_result(mode, res):
+    print(f"\n[{mode}] {res['views']} views, {res['throughput_per_s']}/s, "
+          f"errors {res['errors']}, cancelled jobs {res['cancelled_jobs']}, polls {res['polls']}")
+    for name in ("first_paint", "complete", "probe"):
+        d = res[name]
+        if d["calls"]:
+            print(f"  {name:12s} p50 {d['p50_ms']:8.1f} ms  p95 {d['p95_ms']:8.1f} ms  ({d['calls']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="同時利用者 N 人で Dash アプリを負荷試験する（fixtures の再生）")
+    parser.add_argument("codes", nargs="*", help="銘柄コード（省略時は fixtures にある全銘柄）")
+    parser.add_argument("--fixtures", default=replay.FIXTURE_DIR)
+    parser.add_argument("--synth", type=int, default=0, help="N 銘柄の fixtures を一時ディレクトリに合成して使う")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="1モードあたりの秒数")
+    parser.add_argument("--retype", type=float, default=0.2, help="入力途中で銘柄を変える利用者の割合")
+    parser.add_argument("--mode", choices=["both", "background", "sync"], default="both")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn のワーカー数")
+    parser.add_argument("--threads", type=int, default=4, help="ワーカーあたりのスレッド数")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--page-latency", type=float, default=0.15, help="銘柄ページの応答遅延（秒）")
+    parser.add_argument("--ohlcv-latency", type=float, default=0.4, help="yfinance の応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="遅延のばらつき（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args)
+        return 0
+
+    synth_dir = None
+    if args.synth:
+        synth_dir = tempfile.mkdtemp(prefix="bench_load_fixtures_")
+        replay.synthesize([str(1000 + i) for i in range(args.synth)], synth_dir, seed=args.seed)
+        args.fixtures = synth_dir
+    codes = args.codes or fixture_codes(args.fixtures)
+    if not codes:
+        print(f"No fixtures in {args.fixtures}/ (run `python replay.py synth <codes>` or pass --synth N)")
+        return 1
+
+    modes = ["background", "sync"] if args.mode == "both" else [args.mode]
+    results = {}
+    try:
+        for mode in modes:
+            workdir = tempfile.mkdtemp(prefix="bench_load_")  # キャッシュは毎回空から
+            proc, base = start_server(args, mode == "background", workdir)
+            try:
+                print(f"{mode}: {args.users} users x {args.duration:g}s, {len(codes)} tickers, "
+                      f"gunicorn {args.workers} workers x {args.threads} threads")
+                results[mode] = run_load(base, codes, args.users, args.duration, args.retype, args.seed,
+                                          mode == "background")
+            finally:
+                stop_server(proc)
+                shutil.rmtree(workdir, ignore_errors=True)
+            print_result(mode, results[mode])
+    finally:
+        if synth_dir:
+            shutil.rmtree(synth_dir, ignore_errors=True)
+
+    if len(results) == 2 and results["sync"]["throughput_per_s"]:
+        ratio = results["background"]["throughput_per_s"] / results["sync"]["throughput_per_s"]
+        print(f"\nbackground / sync throughput: x{ratio:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import replay
+
+# ===============================
+# パイプライン全体のベンチマーク（オフライン）
+#
+# replay.py の fixtures を遅延つきで再生し、
+#   - 静的レポート生成（generate_static_report.main）
+#   - Dash のコールバック（app.update / update_margin / update_volume_profile を並行に。
+#     グラフが出るまで = first paint、レポートまで全部 = end to end）
+# について、段階ごと・全体の所要時間、スループット、メモリのピークを測る。
+# 結果は JSON に保存し、基準（baseline）との差を表示する。
+#
+#   python replay.py synth                       # fixtures が無ければ合成する
+#   python bench_pipeline.py --save-baseline     # 基準を保存
+#   python bench_pipeline.py                     # 基準と比較
+# ===============================
+BASELINE_PATH = os.path.join(replay.FIXTURE_DIR, "bench_baseline.json")
+RESULT_PATH = os.path.join(replay.FIXTURE_DIR, "bench_latest.json")
+
+# 所要時間を記録する関数（モジュール内の名前を差し替えて計測する）
+STATIC_STAGES = ["prefetch_ohlcv", "screen_tickers", "process_ticker", "fetch_quote_snapshot",
+                 "calc_profile", "write_data_files", "write_report"]
+APP_STAGES = ["fetch_history", "get_margin_balance", "calc_volume_profile", "get_ticker_name"]
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, module, name):
+        func = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.samples[name].append(time.perf_counter() - t0)
+        setattr(module, name, timed)
+        return func
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+    def summary(self):
+        with self._lock:
+            return {name: _describe(v) for name, v in self.samples.items()}
+
+
+def _describe(values):
+    a = np.asarray(values, dtype=float) * 1000
+    return {"calls": len(a), "total_ms": round(float(a.sum()), 2), "p50_ms": round(float(np.percentile(a, 50)), 2),
+            "p95_ms": round(float(np.percentile(a, 95)), 2)}
+
+
+@contextlib.contextmanager
+def _workdir():
+    """実行ごとに空の作業ディレクトリ（.cache / 出力を前回から持ち越さない）"""
+    cwd = os.getcwd()
+    path = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _peak_mb(func):
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+# ===============================
+# 静的レポート
+# ===============================
+def bench_static(codes, workers, repeat):
+    import generate_static_report as g
+    from fragment_cache import FragmentCache
+    from ohlcv_store import DailyStore
+
+    timer = StageTimer()
+    originals = {name: timer.wrap(g, name) for name in STATIC_STAGES}
+    fd, watchlist = tempfile.mkstemp(prefix="bench_watchlist_", suffix=".txt")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write("\n".join(codes))
+
+    original_store, original_fragments = g._DAILY_STORE, g._FRAGMENTS
+
+    def fresh_state(path):
+        # 既定のパスは環境変数で絶対パスにもなるので、作業ディレクトリ内を明示する
+        g._DAILY_STORE = DailyStore(os.path.join(path, "ohlcv.sqlite"))
+        g._RSI_ENGINES.update(loaded=False, engines={})
+        g._FRAGMENTS = FragmentCache(os.path.join(path, "fragments.json"))
+
+    def run_once():
+        with contextlib.redirect_stdout(io.StringIO()):
+            g.main(["--force", "--watchlist", watchlist, "--workers", str(workers)])
+
+    runs = {"cold": [], "warm": []}
+    stages = {}
+    try:
+        for i in range(repeat):
+            with _workdir() as path:
+                for phase in ("cold", "warm"):
+                    if phase == "cold":
+                        fresh_state(path)
+                    timer.reset()
+                    t0 = time.perf_counter()
+                    run_once()
+                    runs[phase].append(time.perf_counter() - t0)
+                    if i == repeat - 1:
+                        stages[phase] = timer.summary()
+        with _workdir() as path:
+            fresh_state(path)
+            peak = _peak_mb(run_once)
+    finally:
+        for name, func in originals.items():
+            setattr(g, name, func)
+        g._DAILY_STORE, g._FRAGMENTS = original_store, original_fragments
+        g._RSI_ENGINES.update(loaded=False, engines={})
+        os.remove(watchlist)
+
+    return {
+        phase: {"end_to_end": _describe(values),
+                "throughput_per_s": round(len(codes) / float(np.median(values)), 2),
+                "stages": stages.get(phase, {})}
+        for phase, values in runs.items()
+    } | {"peak_mb": peak}
+
+
+# ===============================
+# Dash のコールバック
+# ===============================
+def bench_app(codes, repeat):
+    import app
+    from ohlcv_store import DailyStore
+    from shared_cache import SharedCache
+
+    timer = StageTimer()
+    originals = {name: timer.wrap(app, name) for name in APP_STAGES}
+    runs = {"cold": [], "warm": []}
+    first_paint = {"cold": [], "warm": []}
+    stages = {}
+    # ブラウザと同じく、コード入力で3つのコールバックが同時に呼ばれる
+    pool = ThreadPoolExecutor(max_workers=3)
+
+    def run_all(samples, first=None):
+        for code in codes:
+            t0 = time.perf_counter()
+            futures = [pool.submit(app.update, code), pool.submit(app.update_margin, code),
+                       pool.submit(app.update_volume_profile, code)]
+            futures[0].result()
+            if first is not None:
+                first.append(time.perf_counter() - t0)
+            for f in futures[1:]:
+                f.result()
+            samples.append(time.perf_counter() - t0)
+
+    def fresh_state(path):
+        # SharedCache は import 時に絶対パスを決めるので、cwd を変えても本番の .cache を消してしまう。
+        # memoize は CACHE 自体を掴んでいるため、差し替えるのは 2段目と日足ストアだけにする
+        app.DAILY_STORE = DailyStore(os.path.join(path, "ohlcv.sqlite"))
+        if original_shared is not None:
+            app.CACHE.shared = SharedCache(os.path.join(path, "shared_cache.sqlite"))
+        app.CACHE.invalidate()
+
+    original_store, original_shared = app.DAILY_STORE, app.CACHE.shared
+    try:
+        for i in range(repeat):
+            with _workdir() as path:
+                fresh_state(path)
+                for phase in ("cold", "warm"):
+                    timer.reset()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        run_all(runs[phase], first_paint[phase])
+                    if i == repeat - 1:
+                        stages[phase] = timer.summary()
+        with _workdir() as path:
+            fresh_state(path)
+            peak = _peak_mb(lambda: run_all([]))
+    finally:
+        pool.shutdown()
+        for name, func in originals.items():
+            setattr(app, name, func)
+        # 一時ディレクトリの値を1段目に残さない。2段目（本番のファイル）は消さないよう外してから捨てる
+        app.CACHE.shared = None
+        app.CACHE.invalidate()
+        app.DAILY_STORE, app.CACHE.shared = original_store, original_shared
+
+    return {
+        phase: {"end_to_end": _describe(values),
+                "first_paint": _describe(first_paint[phase]),
+                "throughput_per_s": round(len(values) / float(np.sum(values)), 2),
+                "stages": stages.get(phase, {})}
+        for phase, values in runs.items()
+    } | {"peak_mb": peak}
+
+
+# ===============================
+# 基準との比較
+# ===============================
+def _flatten(result, prefix=""):
+    out = {}
+    for k, v in result.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{key}."))
+        elif isinstance(v, (int, float)) and not k == "calls":
+            out[key] = v
+    return out
+
+
+def compare(result, baseline):
+    cur, base = _flatten(result["results"]), _flatten(baseline["results"])
+    print(f"\nvs baseline ({baseline['meta']['created']}):")
+    for key in sorted(cur):
+        if key not in base or not (key.endswith("p50_ms") or key.endswith("throughput_per_s") or key.endswith("peak_mb")):
+            continue
+        if base[key]:
+            delta = (cur[key] - base[key]) / base[key] * 100
+            print(f"  {key:60s} {base[key]:10.2f} -> {cur[key]:10.2f} ({delta:+.1f}%)")
+
+
+def print_result(result):
+    for scenario, res in result["results"].items():
+        print(f"\n[{scenario}] peak memory {res['peak_mb']} MB")
+        for phase in ("cold", "warm"):
+            e2e = res[phase]["end_to_end"]
+            print(f"  {phase}: p50 {e2e['p50_ms']:.1f} ms / p95 {e2e['p95_ms']:.1f} ms "
+                  f"({e2e['calls']} runs), {res[phase]['throughput_per_s']}/s")
+            if "first_paint" in res[phase]:
+                fp = res[phase]["first_paint"]
+                print(f"    first paint: p50 {fp['p50_ms']:.1f} ms / p95 {fp['p95_ms']:.1f} ms")
+            for name, s in res[phase]["stages"].items():
+                print(f"    {name:22s} x{s['calls']:<4d} total {s['total_ms']:9.1f} ms  "
+                      f"p50 {s['p50_ms']:8.2f} ms  p95 {s['p95_ms']:8.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="fixtures の再生でパイプライン全体を計測する")
+    parser.add_argument("codes", nargs="*", help="銘柄コード（省略時は監視銘柄リスト）")
+    parser.add_argument("--fixtures", default=replay.FIXTURE_DIR)
+    parser.add_argument("--page-latency", type=float, default=0.15, help="銘柄ページの応答遅延（秒）")
+    parser.add_argument("--ohlcv-latency", type=float, default=0.4, help="yfinance の応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="遅延のばらつき（秒）")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-app", action="store_true", help="Dash のコールバックは測らない")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準として保存する")
+    args = parser.parse_args(argv)
+
+    codes = args.codes
+    if not codes:
+        from generate_static_report import TARGET_TICKERS
+        codes = TARGET_TICKERS
+
+    fixtures = os.path.abspath(args.fixtures)
+    replay.replay(fixtures, args.page_latency, args.ohlcv_latency, args.jitter)
+    try:
+        results = {"static_report": bench_static(codes, args.workers, args.repeat)}
+        if not args.skip_app:
+            results["dash_update"] = bench_app(codes, args.repeat)
+    finally:
+        replay.uninstall()
+
+    stats = replay.replay_stats()
+    result = {
+        "meta": {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "tickers": len(codes), "workers": args.workers,
+                 "repeat": args.repeat, "page_latency": args.page_latency, "ohlcv_latency": args.ohlcv_latency,
+                 "jitter": args.jitter, "python": platform.python_version(), "replay": stats},
+        "results": results,
+    }
+    print_result(result)
+    if stats["misses"]:
+        print(f"\nWarning: {stats['misses']} requests were not in {args.fixtures}/ (served as empty / 404)")
+
+    os.makedirs(fixtures, exist_ok=True)
+    out = os.path.join(fixtures, os.path.basename(BASELINE_PATH if args.save_baseline else RESULT_PATH))
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nSaved {out}")
+
+    baseline_path = os.path.join(fixtures, os.path.basename(BASELINE_PATH))
+    if not args.save_baseline and os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            compare(result, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
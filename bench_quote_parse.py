@@ -0,0 +1,96 @@
+import json
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+import yahoo_quote as yq
+
+# ===============================
+# 銘柄ページ解析のベンチマーク
+# 合成した銘柄ページ（実ページと同程度の大きさ・構造）または保存済みのページで、
+# 従来のページ全体の DOM 解析と、埋め込み JSON / 部分解析を比較する
+#   python bench_quote_parse.py                 # 合成ページ
+#   python bench_quote_parse.py page1.html ...  # 保存済みページ
+# ===============================
+REPEAT = 20
+FILLER_SECTIONS = 120  # ニュース・関連銘柄・広告枠など、値に関係ない部分
+
+
+def make_page(with_state=True, code="7203", name="トヨタ自動車(株)", price="2,876.5", margin=True):
+    """実ページに近い構造の合成ページ（約 300KB）。margin=False は信用残の欄が無いページ（ETF・REIT など）"""
+    state = {
+        "mainStocksPriceBoard": {"priceBoard": {"code": code, "name": name, "price": price}},
+        "mainStocksMarginTransaction": {"marginTransaction": {
+            "marginBuyingBalance": 12345600, "marginSellingBalance": 2345600,
+            "marginRatio": "5.26", "updateDate": "2026/10/10"}},
+        "pageInfo": {"filler": ["x" * 80] * 300},
+    }
+    if not margin:
+        del state["mainStocksMarginTransaction"]
+    filler = "".join(
+        f'<section class="Section__{i}"><h2>関連ニュース {i}</h2><ul>'
+        + "".join(f'<li><a href="/news/{i}-{j}"><span class="Text__{j}">見出し {i}-{j} の本文テキスト</span></a></li>'
+                  for j in range(10))
+        + "</ul></section>"
+        for i in range(FILLER_SECTIONS)
+    )
+    margin_html = """<section class="MarginTransactionInformation"><h2>信用取引情報</h2>
+<span class="MarginTransactionInformation__date__2kqM">(10/10)</span>
+<dl><dt>信用買残</dt><dd><span class="StyledNumber__value__3rXW">12,345,600</span>株</dd></dl>
+<dl><dt>信用売残</dt><dd><span class="StyledNumber__value__3rXW">2,345,600</span>株</dd></dl>
+<dl><dt>信用倍率</dt><dd><span class="StyledNumber__value__3rXW">5.26</span>倍</dd></dl>
+</section>"""
+    script = f"<script>window.__PRELOADED_STATE__ = {json.dumps(state, ensure_ascii=False)}</script>" if with_state else ""
+    html = f"""<!DOCTYPE html><html><head><title>{name}【{code}】：株価・株式情報 - Yahoo!ファイナンス</title></head>
+<body><div id="root"><header><h1>{name}</h1></header>
+<div class="PriceBoard"><span class="PriceBoard__price__1V0k"><span class="StyledNumber__value__3rXW">{price}</span></span></div>
+{filler}{margin_html if margin else ""}{filler}</div>{script}</body></html>"""
+    return html.encode("utf-8")
+
+
+def full_dom(content):
+    """従来の方法: ページ全体を html.parser で木にしてから探す"""
+    soup = BeautifulSoup(content, "html.parser")
+    return yq._parse_soup(soup)
+
+
+def fields(snap):
+    return (snap.price, snap.name, snap.margin_buy, snap.margin_sell, snap.margin_ratio, snap.margin_date)
+
+
+def bench(func, content):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(paths):
+    if paths:
+        pages = []
+        for p in paths:
+            with open(p, "rb") as f:
+                pages.append((p, f.read()))
+    else:
+        pages = [("synthetic (with state)", make_page(True)), ("synthetic (no state)", make_page(False)),
+                 ("synthetic (no margin, e.g. ETF)", make_page(True, margin=False))]
+
+    print(f"partial parser: {yq.PARTIAL_PARSER}, best of {REPEAT}")
+    for label, content in pages:
+        legacy = full_dom(content)
+        snap = yq.parse_quote_page("7203.T", content)
+        expected = (legacy["price"], legacy["name"], legacy["buy"], legacy["sell"], legacy["ratio"], legacy["date"])
+        match = "OK" if fields(snap) == expected else f"MISMATCH {fields(snap)} != {expected}"
+
+        dom = bench(full_dom, content)
+        layered = bench(lambda c: yq.parse_quote_page("7203.T", c), content)
+        print(f"{label}: {len(content) / 1024:.0f} KB, resolved by '{snap.parsed_by}' [{match}]")
+        print(f"  full DOM (html.parser) : {dom * 1000:8.2f} ms")
+        print(f"  layered parse          : {layered * 1000:8.2f} ms  (x{dom / layered:.1f})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from generate_static_report import TARGET_TICKERS
+from volume_profile import build_profile
+
+# ===============================
+# 価格帯別出来高のベンチマーク
+# 監視銘柄全体 × 直近5日の1分足（合成データ）で、
+# 旧実装（Pythonループ + dict）と共通エンジン（np.histogram）を比較する
+# ===============================
+BARS_PER_DAY = 330  # 9:00-11:30 / 12:30-15:30
+DAYS = 5
+REPEAT = 20
+
+
+def legacy_profile(price, volume):
+    """旧 calc_profile / calc_volume_profile のビン分割部分"""
+    p_min, p_max = price.min(), price.max()
+    if p_min == p_max:
+        return []
+    bins = np.linspace(p_min, p_max, 31)
+    indices = np.digitize(price, bins) - 1
+    profile = {}
+    for i, vol in zip(indices, volume):
+        if 0 <= i < len(bins) - 1:
+            p_key = int((bins[i] + bins[i + 1]) / 2)
+            profile[p_key] = profile.get(p_key, 0) + vol
+    return sorted(profile.items(), key=lambda x: x[0], reverse=True)
+
+
+def make_bars(seed):
+    rng = np.random.default_rng(seed)
+    n = BARS_PER_DAY * DAYS
+    start = rng.uniform(200, 20000)
+    price = start * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    volume = rng.integers(100, 50_000, n)
+    return pd.Series(price), pd.Series(volume)
+
+
+def bench(func, data):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        for price, volume in data:
+            func(price, volume)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    data = [make_bars(i) for i in range(len(TARGET_TICKERS))]
+    rows = len(data) * BARS_PER_DAY * DAYS
+    legacy = bench(legacy_profile, data)
+    engine = bench(lambda p, v: build_profile(p, v), data)
+    aligned = bench(lambda p, v: build_profile(p, v, tick_aligned=True), data)
+    print(f"{len(data)} tickers x {BARS_PER_DAY * DAYS} bars ({rows:,} rows), best of {REPEAT}")
+    print(f"  legacy loop      : {legacy * 1000:8.2f} ms")
+    print(f"  np.histogram     : {engine * 1000:8.2f} ms  ({legacy / engine:5.1f}x)")
+    print(f"  tick-aligned bins: {aligned * 1000:8.2f} ms  ({legacy / aligned:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
-import requests
+from http_client import http_get
 from bs4 import BeautifulSoup
 import re
 
 def check_jsf_data(ticker):
     url = f"https://finance.yahoo.co.jp/quote/{ticker}"
     try:
-        r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=5)
+        r = http_get(url, timeout=5)
         soup = BeautifulSoup(r.content, "html.parser")
         
         # 貸借取引情報 (JSF) を探す
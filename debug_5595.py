@@ -1,4 +1,4 @@
-import requests
+from http_client import http_get
 from bs4 import BeautifulSoup
 import re
 import yfinance as yf
@@ -8,8 +8,7 @@ def get_current_price(ticker):
     url = f"https://finance.yahoo.co.jp/quote/{code}"
     print(f"URL: {url}")
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        r = requests.get(url, headers=headers, timeout=5)
+        r = http_get(url, timeout=5)
         soup = BeautifulSoup(r.content, "html.parser")
         
         price_tag = soup.select_one('span[class*="PriceBoard__price__"]')
@@ -1,5 +1,5 @@
 import yfinance as yf
-import requests
+from http_client import http_get
 from bs4 import BeautifulSoup
 import pandas as pd
 
@@ -23,8 +23,7 @@ def get_scraped_price(ticker):
     code = ticker.replace(".T", "")
     url = f"https://finance.yahoo.co.jp/quote/{code}"
     print(f"Scraping {url}...")
-    headers = {"User-Agent": "Mozilla/5.0"}
-    r = requests.get(url, headers=headers)
+    r = http_get(url, timeout=5)
     soup = BeautifulSoup(r.content, "html.parser")
     
     # 典型的な現在値のセレクタ (Yahoo JP)
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+# ===============================
+# HTML 断片（銘柄カード・ランキング行・ヒートマップタイル）のキャッシュ
+#
+# 断片ごとに「描画関数 + 入力データ」のハッシュをキーにして HTML を保存し、
+# 入力が変わった断片だけを描画し直す。実行をまたいで .cache に保存する。
+# 描画関数のテンプレート（f-string の文字列部分）が変われば自動的にキーも変わる。
+# ===============================
+FRAGMENT_CACHE_PATH = os.path.join(".cache", "fragments.json")
+
+# 描画関数から呼んでいる下請け関数（generate_table_html など）を変えたときに上げる
+FRAGMENT_VERSION = 2
+
+
+def _json_default(o):
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, np.generic):
+        return o.item()
+    return str(o)
+
+
+def _code_digest(func):
+    """描画関数のバイトコードと定数（テンプレート文字列）のハッシュ"""
+    code = func.__code__
+    h = hashlib.sha256(code.co_code)
+    h.update(repr(code.co_consts).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class FragmentCache:
+    def __init__(self, path=FRAGMENT_CACHE_PATH, version=FRAGMENT_VERSION):
+        self.path = path
+        self.version = version
+        self._entries = {}   # キー -> HTML
+        self._used = set()   # 今回の実行で使ったキー（保存時に使わなかった分は捨てる）
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.reused = 0
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        if raw.get("version") == self.version:
+            self._entries = dict(raw.get("fragments", {}))
+
+    def key(self, kind, renderer, inputs):
+        payload = json.dumps([self.version, kind, _code_digest(renderer), inputs],
+                             sort_keys=True, ensure_ascii=False, default=_json_default)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def render(self, kind, renderer, **inputs):
+        """入力が前回と同じなら保存済みの HTML を、違えば renderer(**inputs) の結果を返す"""
+        key = self.key(kind, renderer, inputs)
+        with self._lock:
+            self._used.add(key)
+            html = self._entries.get(key)
+            if html is not None:
+                self.reused += 1
+                return html
+        html = renderer(**inputs)
+        with self._lock:
+            self._entries[key] = html
+            self.rendered += 1
+        return html
+
+    def begin_run(self):
+        """1回の生成の開始（カウンタと使用済みキーをリセット）"""
+        with self._lock:
+            self._used.clear()
+            self.rendered = 0
+            self.reused = 0
+
+    def save(self):
+        """今回使った断片だけを保存する"""
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if k in self._used}
+            entries = dict(self._entries)
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "fragments": entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def stats(self):
+        with self._lock:
+            return {"rendered": self.rendered, "reused": self.reused, "entries": len(self._entries)}
@@ -1,13 +1,35 @@
+import gzip
+import hashlib
 import json
+import math
+import os
 import re
-import requests
+import time
 import argparse
-from bs4 import BeautifulSoup
+import threading
+import glob
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import yfinance as yf
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta, timezone
 
+try:
+    import brotli  # 任意: 入っていれば .br も出力する
+except ImportError:
+    brotli = None
+
+from http_client import HOST_LIMITS, host_slot, configure as configure_http, reset_http_stats, format_http_stats
+from yahoo_quote import fetch_quote_snapshot, use_snapshot, quote_stats, reset_quote_stats
+from ohlcv_batch import OhlcvBatch, flatten_columns
+from ohlcv_plan import plan_downloads, execute_plan, slice_period
+from ohlcv_store import DailyStore
+from volume_profile import build_profile
+from fragment_cache import FragmentCache
+from metrics import span, traced, stage_summary
+from streaming_indicators import StreamingRSI, load_states, save_states
+from panel_indicators import screen_universe
+import jpx_calendar
+
 # ===============================
 # 設定: 監視銘柄リスト
 # ===============================
@@ -18,92 +40,139 @@ TARGET_TICKERS = [
     "8088.T"
 ]
 
+# ===============================
+# 並列実行の設定
+# ===============================
+DEFAULT_WORKERS = 4
+
+# ホスト別の同時接続数の上限（HOST_LIMITS / host_slot）は http_client にある
+
+def yf_download(ticker, **kwargs):
+    """yf.download をホスト別の同時接続数制限つきで呼ぶ"""
+    with host_slot("query2.finance.yahoo.com"):
+        return yf.download(ticker, **kwargs)
+
+# ===============================
+# OHLCV の一括取得
+# 各ヘルパーが必要とする (period, interval) を実行開始時に集めてプランを立て、
+# 最小限のダウンロード（全銘柄まとめて）と手元での導出で揃える。
+# 各ヘルパーは load_ohlcv で自分の分を受け取る
+# ===============================
+DATA_REQUIREMENTS = {
+    "calc_profile(short)": [("5d", "1m")],
+    "calc_profile(mid)": [("1mo", "1d")],
+    "get_heat_score": [("5d", "5m"), ("5d", "1d")],
+    "get_rsi": [("1mo", "1d")],
+    "get_current_price (fallback)": [("5d", "1m"), ("5d", "1d")],
+    "screen_tickers": [("1mo", "1d"), ("5d", "5m")],
+}
+_BATCH = OhlcvBatch()
+_SINGLE_FETCHES = {"count": 0}
+# 日足は永続ストアから差分同期して読む
+_DAILY_STORE = DailyStore()
+
+def collect_requirements():
+    return [req for reqs in DATA_REQUIREMENTS.values() for req in reqs]
+
+def prefetch_ohlcv(tickers):
+    """今回の実行で必要な OHLCV をプランに従って一括取得・導出する"""
+    _BATCH.clear()
+    _SINGLE_FETCHES["count"] = 0
+    plan = plan_downloads(collect_requirements())
+    print(plan.summary())
+    with host_slot("query2.finance.yahoo.com"), span("fetch", source="ohlcv"):
+        execute_plan(plan, tickers, _BATCH, threads=HOST_LIMITS["query2.finance.yahoo.com"], store=_DAILY_STORE)
+
+def load_ohlcv(ticker, period, interval):
+    """一括取得済みの分を返す。無ければ単独で取得する"""
+    df = _BATCH.get(ticker, period, interval)
+    if df is not None:
+        return df
+    _SINGLE_FETCHES["count"] += 1
+    if interval == "1d":
+        return slice_period(_DAILY_STORE.load_period([ticker], period)[ticker], period)
+    df = yf_download(ticker, period=period, interval=interval, progress=False, threads=False, timeout=10)
+    return flatten_columns(df)
+
+# ===============================
+# 全銘柄まとめてのスクリーニング（SDI / RSI / シグナル / 勢い / 前日比）
+# 一括取得済みの足を (銘柄 × 日付) に並べて1回の NumPy 計算で出す
+# ===============================
+_SCREEN = {}
+
+def screen_tickers(tickers):
+    _SCREEN.clear()
+    try:
+        daily = {t: _BATCH.get(t, "1mo", "1d") for t in tickers}
+        intraday = {t: _BATCH.get(t, "5d", "5m") for t in tickers}
+        with span("indicator", source="screen"):
+            _SCREEN.update(screen_universe(tickers, daily, intraday))
+    except Exception as e:
+        # 失敗しても銘柄ごとの計算（get_heat_score）にフォールバックする
+        print(f"Screen error: {e}")
+    return _SCREEN
+
 def normalize_ticker(code):
     """ティッカーを.T形式に統一"""
     code = str(code).strip()
     if not code: return ""
     if code.endswith(".T"): return code
-    if re.match(r'^\d{4}[A-Z]?$', code): # 285A or 7203
+    if re.match(r'^\d[0-9A-Z]\d[0-9A-Z]$', code): # 285A or 7203（英字入りの新コードも4桁）
         return f"{code}.T"
     return code
 
 # ===============================
 # ロジック
 # ===============================
-def analyze_volume_zone(vol, max_vol):
+# 価格帯の評価: キー -> (クラス名, 表示)
+VOLUME_ZONES = {
+    "big": ("z-big", "★ 巨大なしこり"),
+    "thick": ("z-thick", "厚いゾーン"),
+    "vac": ("z-vac", "真空地帯"),
+}
+
+def volume_zone(vol, max_vol):
+    """価格帯の評価キー（該当なしは空文字）"""
     ratio = vol / max_vol if max_vol > 0 else 0
-    labels = []
     if ratio >= 0.8:
-        labels.append('<span style="color:#d32f2f; font-weight:bold;">★ 巨大なしこり</span>')
+        return "big"
     elif ratio >= 0.5:
-        labels.append('<span style="color:#f57f17; font-weight:bold;">厚いゾーン</span>')
+        return "thick"
     elif ratio <= 0.1:
-        labels.append('<span style="color:#757575;">真空地帯</span>')
-    return " / ".join(labels) if labels else ""
+        return "vac"
+    return ""
 
-def get_margin_balance(ticker):
-    url = f"https://finance.yahoo.co.jp/quote/{ticker}"
-    try:
-        r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=5)
-        soup = BeautifulSoup(r.content, "html.parser")
-        
-        def get_val(label):
-            # テキストノードを探してから、親のdtを取得する確実な方法
-            target_text = soup.find(string=re.compile(label))
-            if target_text and target_text.parent.name == "dt":
-                dt = target_text.parent
-                dd = dt.find_next_sibling("dd")
-                if dd:
-                    val_span = dd.find("span", class_=lambda c: c and "StyledNumber__value" in c)
-                    if val_span:
-                        return val_span.get_text(strip=True)
-                    return dd.get_text(strip=True)
-            return "-"
-
-        # 日付取得
-        date_span = soup.find("span", class_=lambda c: c and "MarginTransactionInformation__date" in c)
-        date_str = date_span.get_text(strip=True) if date_span else ""
-        date_str = date_str.replace("(", "").replace(")", "") # (01/23) -> 01/23
-
-        return {
-            "buy": get_val("信用買残"),
-            "sell": get_val("信用売残"),
-            "ratio": get_val("信用倍率"),
-            "date": date_str
-        }
+def analyze_volume_zone(vol, max_vol):
+    zone = volume_zone(vol, max_vol)
+    if not zone:
+        return ""
+    cls, label = VOLUME_ZONES[zone]
+    return f'<span class="{cls}">{label}</span>'
 
-    except Exception as e:
-        print(f"Margin Error {ticker}: {e}")
-        return {"buy": "-", "sell": "-", "ratio": "-", "date": ""}
+def get_margin_balance(ticker, snapshot=None):
+    """信用買残・売残・倍率・基準日（銘柄ページのスナップショットから読む）"""
+    snap = use_snapshot(ticker, snapshot)
+    return {
+        "buy": snap.margin_buy,
+        "sell": snap.margin_sell,
+        "ratio": snap.margin_ratio,
+        "date": snap.margin_date
+    }
 
-def get_current_price(ticker):
+def get_current_price(ticker, snapshot=None):
     """Yahoo Finance JPから最新の価格を取得 (yfinanceの数分〜15分の遅延を回避)"""
-    code = str(ticker).replace(".T", "").strip()
-    url = f"https://finance.yahoo.co.jp/quote/{code}"
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        r = requests.get(url, headers=headers, timeout=5)
-        soup = BeautifulSoup(r.content, "html.parser")
-        
-        # 1. <span>タグのクラス名から取得 (PriceBoard__price__ シリーズが現在の標準)
-        price_tag = soup.select_one('span[class*="PriceBoard__price__"]')
-        if not price_tag:
-            # 2. 強力なフォールバック (StyledNumber__value__ や _3rXWJKZF)
-            price_tag = soup.select_one('span[class*="StyledNumber__value__"], span[class*="_3rXWJKZF"]')
-        
-        if price_tag:
-            price_text = price_tag.get_text().replace(",", "")
-            return float(price_text)
+        snap = use_snapshot(ticker, snapshot)
+        if snap.price is not None:
+            return snap.price
             
-        # 3. yfinanceでフォールバック
+        # yfinanceでフォールバック
         print(f"Scraping failed for {ticker}, falling back to yfinance...")
-        df = yf.download(ticker, period="1d", interval="1m", progress=False, threads=False)
+        df = load_ohlcv(ticker, "5d", "1m")
         if df.empty:
-            df = yf.download(ticker, period="5d", interval="1d", progress=False, threads=False)
+            df = load_ohlcv(ticker, "5d", "1d")
         
         if not df.empty:
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
             return float(df["Close"].dropna().iloc[-1])
             
         return None
@@ -112,34 +181,9 @@ def get_current_price(ticker):
         print(f"Price Error {ticker}: {e}")
         return None
 
-def get_japanese_name(ticker):
+def get_japanese_name(ticker, snapshot=None):
     """Yahoo!ファイナンスJPから日本語の銘柄名を取得"""
-    url = f"https://finance.yahoo.co.jp/quote/{ticker}"
-    try:
-        r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=5)
-        soup = BeautifulSoup(r.content, "html.parser")
-        
-        # タイトルから銘柄名を抽出 (例: "キオクシアホールディングス(株)【285A】")
-        title = soup.find("title")
-        if title:
-            title_text = title.get_text(strip=True)
-            # 【】より前の部分を取得
-            if "【" in title_text:
-                name_part = title_text.split("【")[0].strip()
-                # (株)などを削除
-                name_part = name_part.replace("(株)", "").replace("（株）", "")
-                name_part = name_part.replace("株式会社", "").strip()
-                return name_part
-        
-        # フォールバック: h1タグから取得
-        h1 = soup.find("h1")
-        if h1:
-            return h1.get_text(strip=True)
-        
-        return None
-    except Exception as e:
-        print(f"Japanese name error {ticker}: {e}")
-        return None
+    return use_snapshot(ticker, snapshot).name
 
 def get_heat_score(ticker):
     """出来高の急増度（ヒートスコア）を算出"""
@@ -148,25 +192,19 @@ def get_heat_score(ticker):
     default_res = (1.0, 0.0, 0.0)
     try:
         # 5分足(5d分)
-        df_5m = yf.download(ticker, period="5d", interval="5m", progress=False, threads=False, timeout=10)
+        df_5m = load_ohlcv(ticker, "5d", "5m")
         if df_5m.empty or len(df_5m) < 2:
             # データが少なすぎる場合は終了
             return default_res
             
-        if isinstance(df_5m.columns, pd.MultiIndex):
-            df_5m.columns = df_5m.columns.get_level_values(0)
-            
         avg_vol = df_5m["Volume"].mean()
         current_vol = float(df_5m["Volume"].iloc[-1])
         score = float(current_vol / avg_vol) if avg_vol > 0 else 1.0
         
         # 前日比計算用
-        df_1d = yf.download(ticker, period="5d", interval="1d", progress=False, threads=False, timeout=10)
+        df_1d = load_ohlcv(ticker, "5d", "1d")
         change_pct = 0.0
         if not df_1d.empty and len(df_1d) >= 2:
-            if isinstance(df_1d.columns, pd.MultiIndex):
-                df_1d.columns = df_1d.columns.get_level_values(0)
-            
             closes = df_1d["Close"].dropna()
             if len(closes) >= 2:
                 current_close = float(closes.iloc[-1])
@@ -180,41 +218,170 @@ def get_heat_score(ticker):
         print(f"Heat score error {ticker}: {e}")
         return default_res
 
+# ヒートマップの色分け: (このスコア以上, クラス名, 背景色, 文字色)
+HEAT_LEVELS = [
+    (3.0, "h5", "#ff5252", "#fff"),     # 鮮やかな赤
+    (2.0, "h4", "#ff9800", "#fff"),     # オレンジ
+    (1.5, "h3", "#ffd740", "#333"),     # 黄色
+    (1.0, "h2", "#e0e0e0", "#666"),     # グレー（標準）
+    (1e-9, "h1", "#c8e6c9", "#388e3c"), # 薄い緑（低調）
+]
+HEAT_NO_DATA = ("h0", "#f5f5f5", "#ccc") # データなし
+
+def get_heat_level(score):
+    """スコアに応じたヒートマップの (クラス名, 背景色, 文字色) を返す"""
+    for threshold, cls, bg, fg in HEAT_LEVELS:
+        if score >= threshold:
+            return cls, bg, fg
+    return HEAT_NO_DATA
+
 def get_heat_color(score):
     """スコアに応じたヒートマップの色を返す"""
-    if score >= 3.0:
-        return "#ff5252", "#fff" # 鮮やかな赤
-    elif score >= 2.0:
-        return "#ff9800", "#fff" # オレンジ
-    elif score >= 1.5:
-        return "#ffd740", "#333" # 黄色
-    elif score >= 1.0:
-        return "#e0e0e0", "#666" # グレー（標準）
-    elif score > 0:
-        return "#c8e6c9", "#388e3c" # 薄い緑（低調）
-    return "#f5f5f5", "#ccc" # データなし
+    _, bg, fg = get_heat_level(score)
+    return bg, fg
+
+# ===============================
+# レポートの共通スタイルシート
+# 各要素には style 属性を書かず、ここで定義したクラスを付ける
+# （銘柄数が増えても、増えるのはクラス名だけで済む）
+# ===============================
+REPORT_CSS = """
+body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; padding: 10px; max-width: 900px; margin: 0 auto; background-color: #fcfcfc; }
+h1 { text-align: center; color: #333; }
+.updated { text-align: center; color: #666; font-size: 12px; }
+.nav { text-align: center; margin-bottom: 20px; }
+.nav a { margin: 0 5px; color: #2196F3; text-decoration: none; font-size: 14px; }
+.csv { text-align: center; margin-bottom: 20px; }
+.csv-btn { padding: 10px 20px; background-color: #4CAF50; color: white; border: none; border-radius: 5px; cursor: pointer; font-size: 14px; display: inline-flex; align-items: center; gap: 8px; }
+.b { font-weight: bold; }
+.red, .up, .buy { color: #d32f2f; }
+.down { color: #388e3c; }
+.flat { color: #666; }
+.sell { color: #1976d2; }
+.nowrap { white-space: nowrap; }
+
+/* ヒートマップ */
+#heatmap-container { margin-bottom: 24px; }
+#heatmap-container h3 { margin-top: 0; color: #333; }
+.grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(130px, 1fr)); gap: 8px; }
+.tile { display: flex; flex-direction: column; justify-content: space-between; min-height: 100px; padding: 10px; border-radius: 8px; text-align: center; text-decoration: none; box-shadow: 0 2px 4px rgba(0,0,0,0.1); transition: transform 0.2s; }
+.tile:hover { transform: scale(1.03); }
+.tile .code { font-weight: bold; font-size: 13px; border-bottom: 1px solid rgba(0,0,0,0.1); padding-bottom: 4px; margin-bottom: 4px; }
+.tile .stats { display: grid; grid-template-columns: 1fr; gap: 2px; font-size: 11px; }
+.tile .score { font-weight: bold; font-size: 14px; }
+.tile .tname { font-size: 9px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; opacity: 0.8; margin-top: 6px; }
+.rsi-hi { color: #d32f2f; font-weight: bold; }
+.rsi-lo { color: #388e3c; font-weight: bold; }
+""" + "".join(f".{cls} {{ background: {bg}; color: {fg}; }}\n" for _, cls, bg, fg in HEAT_LEVELS + [(0, *HEAT_NO_DATA)]) + """
+/* ランキング */
+.rank { background: #fff; border: 2px solid var(--accent); border-radius: 8px; padding: 16px; margin-bottom: 24px; }
+#heat-ranking { --accent: #ff5252; --head: #fee2e2; }
+#margin-ranking { --accent: #2196F3; --head: #e3f2fd; }
+.rank h3 { margin-top: 0; color: var(--accent); }
+.rank table { width: 100%; border-collapse: collapse; font-size: 14px; }
+.rank thead { background: var(--head); }
+.rank th { padding: 8px; border-bottom: 2px solid var(--accent); }
+.rank td { padding: 8px; border-bottom: 1px solid #eee; }
+.rank td a { font-weight: bold; text-decoration: none; color: #1565c0; }
+.c { text-align: center; }
+.r { text-align: right; }
+.sub { font-size: 0.8em; color: #666; }
+.chg { font-size: 0.85em; }
+.hot-score { font-weight: bold; color: #ff5252; }
+.low-ratio { font-weight: bold; color: #1565c0; }
+.muted { color: #ccc; }
+.note { font-size: 12px; color: #666; margin-top: 10px; }
+.rbadge { color: white; padding: 1px 6px; border-radius: 10px; font-size: 0.7em; margin-left: 4px; white-space: nowrap; }
+.rbadge.hot, .badge.hot { background: #ff5252; }
+.rbadge.warm, .badge.warm { background: #ff9800; }
+
+/* 銘柄カード */
+.ticker-card { border: 2px solid #333; border-radius: 8px; padding: 16px; margin-bottom: 24px; }
+.ticker-card h2 { margin-top: 0; border-bottom: 2px solid #2196F3; padding-bottom: 8px; }
+.ticker-card .nm { font-size: 0.8em; color: #666; }
+.ticker-card .price { float: right; font-size: 0.6em; font-weight: normal; margin-top: 8px; }
+.badge { color: white; padding: 2px 8px; border-radius: 12px; font-size: 0.5em; vertical-align: middle; margin-left: 8px; }
+.margin { background: #f1f8e9; padding: 8px; border-radius: 4px; font-size: 13px; margin-bottom: 12px; }
+.vp-wrap { display: flex; flex-wrap: wrap; gap: 16px; }
+.vp-col { flex: 1; min-width: 300px; }
+.vp { margin-bottom: 16px; }
+.vp h4 { margin: 8px 0 4px 0; font-size: 14px; color: #555; }
+.vp-t { width: 100%; border-collapse: collapse; }
+.vp-t thead { background-color: #f8fafc; }
+.vp-t th { padding: 6px; border: 1px solid #ddd; font-size: 12px; }
+.vp-t td { padding: 6px; border: 1px solid #eee; font-size: 12px; }
+.vp-t td.c, .vp-t td.r { font-size: 13px; }
+.vp-t tr.cur { background-color: #e3f2fd; }
+.z-big { color: #d32f2f; font-weight: bold; }
+.z-thick { color: #f57f17; font-weight: bold; }
+.z-vac { color: #757575; }
+.z-cur { font-weight: bold; color: #1565c0; }
+.card-body.lazy { min-height: 240px; color: #999; }
+.error { color: red; }
+
+@media (max-width: 600px) {
+    .ticker-card { padding: 8px; }
+    h2 { font-size: 1.2em; }
+}
+"""
+
+# ===============================
+# RSI の逐次更新状態
+# 実行をまたいで保存し、前回以降の日足だけを反映する（過去全体は再計算しない）
+# ===============================
+INDICATOR_STATE_PATH = os.path.join(".cache", "indicator_state.json")
+_RSI_ENGINES = {"loaded": False, "engines": {}}
+_RSI_LOCK = threading.Lock()
+
+def _rsi_engines():
+    with _RSI_LOCK:
+        if not _RSI_ENGINES["loaded"]:
+            _RSI_ENGINES["engines"] = load_states(INDICATOR_STATE_PATH)
+            _RSI_ENGINES["loaded"] = True
+        return _RSI_ENGINES["engines"]
+
+def save_indicator_states():
+    with _RSI_LOCK:
+        if _RSI_ENGINES["loaded"]:
+            save_states(INDICATOR_STATE_PATH, _RSI_ENGINES["engines"])
+
+def update_rsi_engine(ticker, df, period=14):
+    """保存済みの RSI 状態に、まだ取り込んでいない日足だけを反映して返す"""
+    engines = _rsi_engines()
+    key = f"{ticker}:rsi{period}"
+    keys = list(df.index.strftime("%Y-%m-%d"))
+    closes = [float(c) for c in df["Close"]]
+
+    engine = engines.get(key)
+    start = None
+    if engine is not None and engine.last_key in keys:
+        pos = keys.index(engine.last_key)
+        # 1本前の終値が変わっていたら（株式分割などで過去が修正された）作り直す
+        if pos == 0 or (engine.prev is not None and math.isclose(engine.prev, closes[pos - 1], rel_tol=1e-9)):
+            engine.amend(closes[pos], keys[pos])  # 前回の最新足（当日足）は値が動くので差し替え
+            start = pos + 1
+    if start is None:
+        engine = StreamingRSI(period)
+        start = 0
+    for k, c in zip(keys[start:], closes[start:]):
+        engine.push(c, k)
+
+    with _RSI_LOCK:
+        engines[key] = engine
+    return engine
 
 def get_rsi(ticker, period="14d"):
     """RSI(14)を算出"""
     try:
         # 過去1ヶ月分程度の日足データを取得
-        df = yf.download(ticker, period="1mo", interval="1d", progress=False, threads=False, timeout=10)
+        df = load_ohlcv(ticker, "1mo", "1d")
         if df.empty or len(df) < 15:
             return 50.0 # デフォルト
             
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-            
-        delta = df["Close"].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        
-        div = loss.iloc[-1]
-        if pd.isna(div) or div == 0:
+        rsi = update_rsi_engine(ticker, df, 14).value
+        # 下落ゼロ（計算不能）の場合も従来どおり 50
+        if pd.isna(rsi):
             return 50.0
-            
-        rs = gain.iloc[-1] / div
-        rsi = 100 - (100 / (1 + rs))
         return round(float(rsi), 1)
     except Exception as e:
         print(f"RSI error {ticker}: {e}")
@@ -223,22 +390,24 @@ def get_rsi(ticker, period="14d"):
 def get_wall_info(current_price, vp_data):
     """最寄りの壁（しこり・真空）への距離を算出"""
     try:
-        if not vp_data or current_price is None or current_price <= 0:
+        if vp_data is None or current_price is None or current_price <= 0:
             return "N/A", 0
             
-        max_vol = max(v[1] for v in vp_data)
+        max_vol = vp_data.max_volume
         
-        # 上方向の壁を探す
-        # vp_dataは価格降順なので、下から上に見ていく
+        # 上方向の壁を探す（価格の低いビンから順に、ビン中央値で判定）
+        # 出来高0のビンは従来どおり対象外
         target_wall = None
-        for p, v in reversed(vp_data):
+        for p, v in zip(vp_data.mids, vp_data.volumes):
+            if v == 0:
+                continue
             if p > current_price:
                 ratio = v / max_vol if max_vol > 0 else 0
                 if ratio >= 0.8: # 巨大なしこりレベル
-                    target_wall = (p, "しこり")
+                    target_wall = (float(p), "しこり")
                     break
                 elif ratio <= 0.1: # 真空地帯レベル
-                    target_wall = (p, "真空")
+                    target_wall = (float(p), "真空")
                     break
             
         if target_wall:
@@ -250,102 +419,227 @@ def get_wall_info(current_price, vp_data):
     except Exception as e:
         return "Error", 0
 
+# 価格帯別出来高の設定（app.py と共通のエンジンを使う）
+VP_BINS = 30
+VP_TICK_ALIGNED = True
+
 def calc_profile(ticker, mode="short"):
     period = "5d" if mode == "short" else "1mo"
     interval = "1m" if mode == "short" else "1d"
     try:
-        df = yf.download(ticker, period=period, interval=interval, progress=False, threads=False, timeout=10)
-        if df.empty: return [], 0
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
+        df = load_ohlcv(ticker, period, interval)
+        if df.empty: return None, 0
         
         price = df["Close"].dropna()
-        volume = df["Volume"].loc[price.index]
-        if price.empty: return [], 0
+        if price.empty: return None, 0
         
         current = float(price.iloc[-1])
-        
-        p_min, p_max = price.min(), price.max()
-        if p_min == p_max: return [], current
-        
-        bins = np.linspace(p_min, p_max, 31) # 30区間
-        indices = np.digitize(price, bins) - 1
-        
-        profile = {}
-        for i, vol in zip(indices, volume):
-            if 0 <= i < len(bins)-1:
-                p_key = int((bins[i] + bins[i+1])/2)
-                profile[p_key] = profile.get(p_key, 0) + vol
-                
-        sorted_profile = sorted(profile.items(), key=lambda x: x[0], reverse=True)
-        return sorted_profile, current
+        profile = build_profile(price, df["Volume"].loc[price.index], bins=VP_BINS, tick_aligned=VP_TICK_ALIGNED)
+        return profile, current
     except Exception as e:
         print(f"Profile Error {ticker}: {e}")
-        return [], 0
+        return None, 0
 
-def generate_table_html(profile, current_price, title):
-    if not profile: return f"<p>{title}: データなし</p>"
-    
-    max_vol = max(p[1] for p in profile)
-    total_vol = sum(p[1] for p in profile)
-    bin_width = abs(profile[0][0] - profile[1][0]) if len(profile) > 1 else 0
+def profile_table_rows(profile, current_price):
+    """
+    表に載せる価格帯: [[下限, 上限, 出来高, 評価キー, 現在値を含むか], ...]（価格の高い順）
+    出来高が全体の1%未満の帯は省き、最大15行
+    """
+    if profile is None:
+        return None
+    max_vol = profile.max_volume
+    total_vol = profile.total_volume
     
     rows = []
-    limit = 0
-    for p, v in profile:
+    for lower, upper, v in profile.descending():
         if total_vol > 0 and (v/total_vol) < 0.01: continue
-        limit += 1
-        if limit > 15: break
-        
-        lower = int(p - bin_width/2)
-        upper = int(p + bin_width/2)
-        
+        if len(rows) >= 15: break
+        lower = int(lower)
+        upper = int(upper)
+        rows.append([lower, upper, v, volume_zone(v, max_vol), lower <= current_price < upper])
+    return rows
+
+def render_vp_table(title, rows):
+    """profile_table_rows の結果を表にする（ブラウザ側の renderVpTable と同じ出力）"""
+    if rows is None: return f"<p>{title}: データなし</p>"
+    
+    body = []
+    for lower, upper, v, zone, is_current in rows:
         # 現在値の強調
-        row_style = ""
-        eval_text = analyze_volume_zone(v, max_vol)
-        
-        if lower <= current_price < upper:
-            row_style = "background-color: #e3f2fd;" # 現在値付近を青く
-            eval_text += ' <span style="font-weight:bold; color:#1565c0;">📍 現在値</span>'
-
-        rows.append(f"""
-        <tr style="{row_style}">
-            <td style="padding:6px; border:1px solid #eee; text-align:center; font-size:13px;">{lower:,} - {upper:,}</td>
-            <td style="padding:6px; border:1px solid #eee; text-align:right; font-size:13px;">{v:,}</td>
-            <td style="padding:6px; border:1px solid #eee; font-size:12px;">{eval_text}</td>
-        </tr>
-        """)
+        row_class = ""
+        eval_text = ""
+        if zone:
+            cls, label = VOLUME_ZONES[zone]
+            eval_text = f'<span class="{cls}">{label}</span>'
+        if is_current:
+            row_class = ' class="cur"' # 現在値付近を青く
+            eval_text += ' <span class="z-cur">📍 現在値</span>'
+        body.append(f'<tr{row_class}><td class="c">{lower:,} - {upper:,}</td><td class="r">{v:,}</td><td>{eval_text}</td></tr>')
         
     return f"""
-    <div style="margin-bottom: 16px;">
-        <h4 style="margin: 8px 0 4px 0; font-size:14px; color:#555;">{title}</h4>
-        <table style="width:100%; border-collapse:collapse;">
-            <thead style="background-color:#f8fafc;">
-                <tr>
-                    <th style="padding:6px; border:1px solid #ddd; font-size:12px;">価格帯</th>
-                    <th style="padding:6px; border:1px solid #ddd; font-size:12px;">出来高</th>
-                    <th style="padding:6px; border:1px solid #ddd; font-size:12px;">評価</th>
-                </tr>
-            </thead>
-            <tbody>
-                {''.join(rows)}
-            </tbody>
+    <div class="vp">
+        <h4>{title}</h4>
+        <table class="vp-t">
+            <thead><tr><th>価格帯</th><th>出来高</th><th>評価</th></tr></thead>
+            <tbody>{''.join(body)}</tbody>
         </table>
     </div>
     """
 
-def process_ticker(code):
-    html_parts = []
+def generate_table_html(profile, current_price, title):
+    return render_vp_table(title, profile_table_rows(profile, current_price))
+
+# ===============================
+# HTML 断片の描画（FragmentCache で入力ごとにキャッシュする）
+# ===============================
+_FRAGMENTS = FragmentCache()
+
+VP_TITLES = {"short": "⚡️ 短期 (1週/1分足)", "mid": "📅 中期 (1ヶ月/日足)"}
+
+def build_shard(code, name, current_price, margin, heat_score, vp_short, vp_mid):
+    """銘柄カードの詳細（信用残・価格帯別出来高）。data/tickers/<code>.json に書き出す"""
+    return {
+        "code": code,
+        "name": name,
+        "price": current_price,
+        "heat_score": heat_score,
+        "margin": dict(margin),
+        "vp": {
+            "short": profile_table_rows(vp_short, current_price),
+            "mid": profile_table_rows(vp_mid, current_price),
+        },
+    }
+
+def render_card_header(code, name, current_price, heat_score):
+    # スパイク判定バッジ
+    spike_badge = ""
+    if heat_score >= 3.0:
+        spike_badge = '<span class="badge hot">🔥 出来高急騰!</span>'
+    elif heat_score >= 1.5:
+        spike_badge = '<span class="badge warm">⚡️ 活性化</span>'
+
+    price_display = f"{int(current_price):,}円" if current_price > 0 else "データなし"
+    return f"""
+        <h2>
+            {code} <span class="nm">{name}</span>
+            {spike_badge}
+            <span class="price">現在値: {price_display}</span>
+        </h2>
+    """
+
+def render_card_body(margin, heat_score, vp):
+    return f"""
+        <div class="margin">
+            <strong>信用需給 ({margin['date']})</strong>: 
+            <span class="buy">買残 {margin['buy']}</span> / 
+            <span class="sell">売残 {margin['sell']}</span> / 
+            倍率 {margin['ratio']}倍 | 
+            <strong>勢い</strong>: <span class="b{' red' if heat_score >= 2 else ''}">{heat_score}倍</span> (直近5分出来高/平均)
+        </div>
+        
+        <div class="vp-wrap">
+            <div class="vp-col">
+                {render_vp_table(VP_TITLES["short"], vp["short"])}
+            </div>
+            <div class="vp-col">
+                {render_vp_table(VP_TITLES["mid"], vp["mid"])}
+            </div>
+        </div>
+    """
+
+def render_card(shard):
+    """銘柄カード（全部 HTML に埋め込む）"""
+    return f"""
+    <div class="ticker-card">
+        {render_card_header(shard["code"], shard["name"], shard["price"], shard["heat_score"])}
+        {render_card_body(shard["margin"], shard["heat_score"], shard["vp"])}
+    </div>
+    """
+
+def render_lazy_card(shard, shard_url):
+    """銘柄カード（見出しだけ。詳細は画面に入ったときにブラウザが shard を読んで描く）"""
+    return f"""
+    <div class="ticker-card">
+        {render_card_header(shard["code"], shard["name"], shard["price"], shard["heat_score"])}
+        <div class="card-body lazy" data-shard="{shard_url}">読み込み中...</div>
+    </div>
+    """
+
+def render_error_card(code, error):
+    return f'<div class="error">Error processing {code}: {error}</div>'
+
+def _change_style(change_pct):
+    """前日比のクラス名と符号"""
+    change_class = "up" if change_pct > 0 else ("down" if change_pct < 0 else "flat")
+    change_sign = "+" if change_pct > 0 else ""
+    return change_class, change_sign
+
+def _price_cell(price, change_pct):
+    change_class, change_sign = _change_style(change_pct)
+    return f'<td class="r"><span class="b">{int(price):,}円</span><br><span class="chg {change_class}">{change_sign}{change_pct}%</span></td>'
+
+def render_ranking_row(rank, code, name, score, price, change_pct):
+    """勢いランキングの1行"""
+    heat_class = ' class="c hot-score"' if score >= 2 else ' class="c"'
+    
+    # ステータスバッジの生成 (ランキング用)
+    badge = ""
+    if score >= 3.0:
+        badge = '<span class="rbadge hot">🔥 急騰</span>'
+    elif score >= 1.5:
+        badge = '<span class="rbadge warm">⚡️ 活性</span>'
+    
+    return (f'<tr><td class="c">{rank}</td>'
+            f'<td><a href="#{code}">{code}</a> {badge}<br><span class="sub">{name}</span></td>'
+            f'<td{heat_class}>{score}倍</td>{_price_cell(price, change_pct)}</tr>')
+
+def render_margin_row(rank, code, name, margin_ratio, price, change_pct):
+    """信用倍率ランキングの1行"""
+    if margin_ratio == 999.0:
+        ratio_display = "-"
+        ratio_class = "c muted"
+    else:
+        ratio_display = f"{margin_ratio:,}倍"
+        ratio_class = "c low-ratio" if margin_ratio < 1.0 else "c"
+    
+    return (f'<tr><td class="c">{rank}</td>'
+            f'<td><a href="#{code}">{code}</a><br><span class="sub">{name}</span></td>'
+            f'<td class="{ratio_class}">{ratio_display}</td>{_price_cell(price, change_pct)}</tr>')
+
+def render_tile(code, name, score, wall_name, wall_dist, rsi):
+    """ヒートマップのタイル"""
+    heat_class, _, _ = get_heat_level(score)
+    
+    # RSIの色付け
+    rsi_class = ""
+    if rsi >= 70: rsi_class = ' class="rsi-hi"'
+    elif rsi <= 30: rsi_class = ' class="rsi-lo"'
     
+    return f"""
+    <a href="#{code}" class="tile {heat_class}">
+        <div class="code">{code}</div>
+        <div class="stats">
+            <div title="バースト・スコア">💥 <span class="score">{score}</span>x</div>
+            <div title="壁までの距離" class="nowrap">🚧 {wall_name} <span class="b">{wall_dist}</span>%</div>
+            <div title="RSI(14)">📊 RSI <span{rsi_class}>{rsi}</span></div>
+        </div>
+        <div class="tname">{name}</div>
+    </a>
+    """
+
+def process_ticker(code):
     # データ取得
     try:
         ticker = f"{code}" if ".T" in code else f"{code}.T"
         
+        # 銘柄ページは1回だけ取得し、現在値・銘柄名・信用残で共有する（同時接続数は http_client が制限）
+        snapshot = fetch_quote_snapshot(ticker)
+        
         # 正確な終値を取得
-        current_price = get_current_price(ticker)
+        current_price = get_current_price(ticker, snapshot)
         
         # 日本語の銘柄名を取得
-        name = get_japanese_name(ticker)
+        name = get_japanese_name(ticker, snapshot)
         if not name:
             try:
                 ticker_info = yf.Ticker(ticker)
@@ -353,20 +647,26 @@ def process_ticker(code):
             except:
                 name = code
             
-        margin = get_margin_balance(ticker)
-        vp_short, cur_short = calc_profile(ticker, "short")
-        vp_mid, cur_mid = calc_profile(ticker, "mid")
+        margin = get_margin_balance(ticker, snapshot)
+        with span("volume_profile", ticker=ticker):
+            vp_short, cur_short = calc_profile(ticker, "short")
+            vp_mid, cur_mid = calc_profile(ticker, "mid")
         
-        # ヒートスコア・騰落率取得
+        # ヒートスコア・騰落率取得（スクリーニング済みならその値を使う）
+        screen = _SCREEN.get(ticker, {})
         try:
-            heat_score, last_vol, change_pct = get_heat_score(ticker)
+            if screen.get("heat_score") is not None:
+                heat_score, last_vol, change_pct = screen["heat_score"], screen["last_vol"], screen["change_pct"]
+            else:
+                heat_score, last_vol, change_pct = get_heat_score(ticker)
         except Exception as e:
             print(f"Failed to unpack heat score for {ticker}: {e}")
             heat_score, last_vol, change_pct = 0.0, 0.0, 0.0
         
         # RSI取得
         try:
-            rsi_val = get_rsi(ticker)
+            with span("indicator", ticker=ticker):
+                rsi_val = get_rsi(ticker)
         except Exception as e:
             print(f"Failed to get RSI for {ticker}: {e}")
             rsi_val = 50.0
@@ -381,42 +681,9 @@ def process_ticker(code):
         # 数値化を保証
         current_price = float(current_price) if current_price else 0.0
 
-        # スパイク判定バッジ
-        spike_badge = ""
-        if heat_score >= 3.0:
-            spike_badge = '<span style="background:#ff5252; color:white; padding:2px 8px; border-radius:12px; font-size:0.5em; vertical-align:middle; margin-left:8px;">🔥 出来高急騰!</span>'
-        elif heat_score >= 1.5:
-            spike_badge = '<span style="background:#ff9800; color:white; padding:2px 8px; border-radius:12px; font-size:0.5em; vertical-align:middle; margin-left:8px;">⚡️ 活性化</span>'
-
-        # 各銘柄のブロックHTML
-        price_display = f"{int(current_price):,}円" if current_price > 0 else "データなし"
-        
-        html_parts.append(f"""
-        <div class="ticker-card" style="border: 2px solid #333; border-radius: 8px; padding: 16px; margin-bottom: 24px;">
-            <h2 style="margin-top:0; border-bottom: 2px solid #2196F3; padding-bottom: 8px;">
-                {code} <span style="font-size:0.8em; color:#666;">{name}</span>
-                {spike_badge}
-                <span style="float:right; font-size:0.6em; font-weight:normal; margin-top:8px;">現在値: {price_display}</span>
-            </h2>
-            
-            <div style="background:#f1f8e9; padding:8px; border-radius:4px; font-size:13px; margin-bottom:12px;">
-                <strong>信用需給 ({margin['date']})</strong>: 
-                <span style="color:#d32f2f;">買残 {margin['buy']}</span> / 
-                <span style="color:#1976d2;">売残 {margin['sell']}</span> / 
-                倍率 {margin['ratio']}倍 | 
-                <strong>勢い</strong>: <span style="font-weight:bold; color:{'#d32f2f' if heat_score >= 2 else '#333'};">{heat_score}倍</span> (直近5分出来高/平均)
-            </div>
-            
-            <div style="display:flex; flex-wrap:wrap; gap:16px;">
-                <div style="flex:1; min-width:300px;">
-                    {generate_table_html(vp_short, current_price, "⚡️ 短期 (1週/1分足)")}
-                </div>
-                <div style="flex:1; min-width:300px;">
-                    {generate_table_html(vp_mid, current_price, "📅 中期 (1ヶ月/日足)")}
-                </div>
-            </div>
-        </div>
-        """)
+        # 銘柄カードの中身（描画は main でまとめて行う）
+        with span("render", ticker=ticker):
+            shard = build_shard(code, name, current_price, margin, heat_score, vp_short, vp_mid)
         
         # 信用倍率の数値化
         try:
@@ -434,116 +701,490 @@ def process_ticker(code):
             "wall_name": wall_name,
             "wall_dist": wall_dist,
             "rsi": rsi_val,
+            "sdi": screen.get("sdi"),
+            "signals": "/".join(screen.get("signals", [])),
             "margin_buy": margin['buy'],
             "margin_sell": margin['sell'],
             "margin_ratio": margin['ratio'],
             "margin_date": margin['date']
         }
 
-        return "".join(html_parts), heat_score, name, current_price, rsi_val, wall_name, wall_dist, change_pct, margin_ratio, raw_data
+        return shard, heat_score, name, current_price, rsi_val, wall_name, wall_dist, change_pct, margin_ratio, raw_data
         
     except Exception as e:
-        return f'<div style="color:red">Error processing {code}: {e}</div>', 0, code, 0, 50, "Error", 0, 0, 999.0, {}
+        return {"code": code, "error": str(e)}, 0, code, 0, 50, "Error", 0, 0, 999.0, {}
+
+def process_ticker_timed(code):
+    """process_ticker を実行し、銘柄ごとの所要時間と結果をログに出す"""
+    t0 = time.perf_counter()
+    result = process_ticker(code)
+    elapsed = time.perf_counter() - t0
+    outcome = "OK" if result[-1] else "ERROR"
+    print(f"[{code}] {outcome} {elapsed:.2f}s")
+    return result
+
+def run_tickers(codes, workers=DEFAULT_WORKERS, on_result=None):
+    """
+    全銘柄を処理する。結果は並列実行でも codes の順序で返す。
+    on_result(code, result) は各銘柄が終わるたびに（完了順に）呼ばれる
+    """
+    def run_one(code):
+        result = process_ticker_timed(code)
+        if on_result is not None:
+            on_result(code, result)
+        return result
+
+    if workers <= 1:
+        return [run_one(code) for code in codes]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ticker") as ex:
+        return list(ex.map(run_one, codes))
+
+# ===============================
+# 全銘柄モード（ウォッチリスト / シャード / チェックポイント）
+# - --watchlist: 銘柄コードを1行1つ書いたファイル（# 以降はコメント）
+# - --shards N : 銘柄を N 個に分けて別プロセスで処理する
+# - チェックポイント: 終わった銘柄の結果を JSONL に追記し、--resume で続きから再開する
+#   （先頭行に銘柄リストの指紋と取引日を書き、どちらかが今回と違えば再開せずに最初からやり直す）
+# 最後に全シャードの結果を集めて（マージして）ランキング・ヒートマップを作る
+# ===============================
+CHECKPOINT_PATH = os.path.join(".cache", "checkpoint.jsonl")
+
+def load_watchlist(path):
+    """ウォッチリストを読み、"1234.T" 形式に揃えて重複を除く（順序は保つ）"""
+    codes = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            for token in re.split(r"[,\s]+", line.split("#", 1)[0]):
+                if token:
+                    codes.append(normalize_ticker(token.upper()))
+    return list(dict.fromkeys(codes))
+
+def _json_value(o):
+    if hasattr(o, "item"):
+        return o.item()  # numpy の数値
+    return str(o)
+
+class CheckpointWriter:
+    """処理結果を1銘柄1行の JSONL に追記する（スレッドから呼んでよい）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+        # 中断で書きかけの行が残っていたら、次の行がそれに繋がらないよう改行しておく
+        if self._f.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._f.write("\n")
+
+    def write_header(self, header):
+        with self._lock:
+            self._f.write(json.dumps({"header": header}, ensure_ascii=False) + "\n")
+            self._f.flush()
+
+    def write(self, code, result):
+        line = json.dumps({"code": code, "result": list(result)}, ensure_ascii=False, default=_json_value)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+def checkpoint_files(path):
+    """本体とシャードごとのチェックポイントファイル"""
+    return [p for p in [path, *sorted(glob.glob(f"{path}.*"))] if os.path.exists(p) and not p.endswith(".tmp")]
+
+def trade_date(now=None):
+    """結果が属する取引日（休場日・寄り付き前は直前の営業日）"""
+    now = now or jpx_calendar.now_jst()
+    day = now.date()
+    if now.hour < 9:
+        day -= timedelta(days=1)
+    while not jpx_calendar.is_trading_day(day):
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+def checkpoint_header(codes):
+    """チェックポイントがどの入力（銘柄リスト）・どの取引日の結果か"""
+    return {"inputs": hashlib.sha256("\n".join(codes).encode("utf-8")).hexdigest(), "trade_date": trade_date()}
+
+def read_checkpoint_header(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.loads(f.readline()).get("header")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def load_checkpoint(path, include_errors=False):
+    """チェックポイントから {code: 結果タプル}。エラーだった銘柄は含めない（再開時に取り直す）"""
+    done = {}
+    for fname in checkpoint_files(path):
+        with open(fname, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # 中断時に書きかけだった行
+                if "code" not in item:
+                    continue  # 先頭行（header）
+                result = tuple(item["result"])
+                if result[-1] or include_errors:
+                    done[item["code"]] = result
+    return done
+
+def clear_checkpoint(path):
+    for fname in checkpoint_files(path):
+        os.remove(fname)
+
+def export_indicator_states(codes):
+    """指定銘柄の RSI 状態（子プロセスから親へ返す用）"""
+    tickers = {normalize_ticker(c) for c in codes}
+    engines = _rsi_engines()
+    with _RSI_LOCK:
+        return {k: e.to_state() for k, e in engines.items() if k.split(":", 1)[0] in tickers}
+
+def import_indicator_states(states):
+    engines = _rsi_engines()
+    with _RSI_LOCK:
+        for k, state in states.items():
+            engines[k] = StreamingRSI.from_state(state)
+
+@traced("static_report_shard", thread_local=False)
+def run_shard(index, codes, workers, checkpoint):
+    """1シャード分を処理する（子プロセスで実行）。RSI 状態は親でまとめて保存するので返す"""
+    started = time.perf_counter()
+    configure_http(workers)
+    reset_quote_stats()
+    reset_http_stats()
+    prefetch_ohlcv(codes)
+    screen_tickers(codes)
+    writer = CheckpointWriter(f"{checkpoint}.{index}")
+    try:
+        run_tickers(codes, workers, on_result=writer.write)
+    finally:
+        writer.close()
+    stats = quote_stats()
+    print(f"[shard {index}] {len(codes)} tickers in {time.perf_counter() - started:.1f}s "
+          f"(quote fetches {stats['fetches']}, batch downloads {_BATCH.calls})")
+    print(f"[shard {index}] {format_http_stats()}")
+    return export_indicator_states(codes)
+
+def collect_results(codes, workers=DEFAULT_WORKERS, shards=1, checkpoint=CHECKPOINT_PATH, resume=False):
+    """
+    全銘柄の結果を codes の順に返す。
+    resume なら前回のチェックポイントで終わっている銘柄は取り直さない
+    （ただし銘柄リストか取引日が違うチェックポイントは使わない）
+    """
+    header = checkpoint_header(codes)
+    if resume and read_checkpoint_header(checkpoint) != header:
+        print(f"Checkpoint {checkpoint} is not for this watchlist / trade date {header['trade_date']}; starting fresh")
+        resume = False
+    done = load_checkpoint(checkpoint) if resume else {}
+    if not resume:
+        clear_checkpoint(checkpoint)
+        writer = CheckpointWriter(checkpoint)
+        writer.write_header(header)
+        writer.close()
+    todo = [c for c in codes if c not in done]
+    print(f"Processing {len(todo)} tickers ({len(done)} restored from checkpoint) "
+          f"with {shards} shard(s) x {workers} workers...")
+
+    if todo and shards <= 1:
+        prefetch_ohlcv(todo)
+        screen_tickers(todo)
+        writer = CheckpointWriter(checkpoint)
+        try:
+            for code, result in zip(todo, run_tickers(todo, workers, on_result=writer.write)):
+                done[code] = result
+        finally:
+            writer.close()
+    elif todo:
+        size = math.ceil(len(todo) / shards)
+        chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+        with ProcessPoolExecutor(max_workers=len(chunks)) as ex:
+            futures = [ex.submit(run_shard, i, chunk, workers, checkpoint) for i, chunk in enumerate(chunks)]
+            for future in futures:
+                try:
+                    import_indicator_states(future.result())
+                except Exception as e:
+                    print(f"Shard failed: {e}")
+        # マージ: 各シャードが書いたチェックポイントから結果を集める
+        done.update(load_checkpoint(checkpoint, include_errors=True))
+
+    return [done.get(c) or ({"code": c, "error": "no result"}, 0, c, 0, 50, "Error", 0, 0, 999.0, {})
+            for c in codes]
+
+# ===============================
+# 入力データの指紋
+# 前回の生成から上流のデータ（株価・出来高・信用残など）が何も変わっていなければ
+# HTML の生成・書き出しを省略する（引け後や確定待ちの時間帯の無駄な更新を防ぐ）
+# ===============================
+FINGERPRINT_PATH = os.path.join(".cache", "report_fingerprint.txt")
+
+def input_fingerprint(raw_rows):
+    """銘柄ごとの集計値と、一括取得した足の末尾から指紋（sha256）を作る"""
+    tails = []
+    for (period, interval), frames in sorted(_BATCH.frames.items()):
+        for ticker in sorted(frames):
+            df = frames[ticker]
+            if df is None or df.empty:
+                continue
+            last = df.iloc[-1]
+            tails.append([period, interval, ticker, str(df.index[-1]), len(df),
+                          float(last.get("Close", 0) or 0), float(df["Volume"].sum()) if "Volume" in df else 0.0])
+    payload = json.dumps({"rows": raw_rows, "tails": tails}, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_fingerprint(path=FINGERPRINT_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def save_fingerprint(fingerprint, path=FINGERPRINT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(fingerprint)
+
+# ===============================
+# 出力（最小化 + 事前圧縮）
+# 事前圧縮（.gz / .br）は --precompress のときだけ。GitHub Pages はこれを Content-Encoding として配信しない
+# （自分で圧縮して返す）ので、gzip_static などで配信する自前の静的サーバー向け
+# ===============================
+_RAW_BLOCK = re.compile(r"(<script\b.*?</script>|<style\b.*?</style>)", re.S | re.I)
+
+def minify_html(html):
+    """
+    空白の連続を1つにまとめる（表示は変わらない）。
+    script / style の中は行ごとの前後の空白と空行だけを落とす
+    """
+    out = []
+    for i, chunk in enumerate(_RAW_BLOCK.split(html)):
+        if i % 2:
+            out.append("\n".join(line.strip() for line in chunk.splitlines() if line.strip()))
+        else:
+            out.append(re.sub(r"\s+", " ", chunk))
+    return "".join(out).strip()
+
+def write_report(filename, parts, precompress=False):
+    """HTML を最小化して書き出し、precompress なら .gz（と brotli があれば .br）も作る。サイズを表示して返す"""
+    html = "".join(parts)
+    raw_size = len(html.encode("utf-8"))
+    body = minify_html(html).encode("utf-8")
+    with open(filename, "wb") as f:
+        f.write(body)
+    sizes = {"raw": raw_size, "html": len(body)}
+
+    gz = gzip.compress(body, compresslevel=9, mtime=0)
+    sizes["gz"] = len(gz)  # 配信時に圧縮されたときの目安として表示する
+    if precompress:
+        with open(f"{filename}.gz", "wb") as f:
+            f.write(gz)
+        if brotli is not None:
+            br = brotli.compress(body, quality=11)
+            with open(f"{filename}.br", "wb") as f:
+                f.write(br)
+            sizes["br"] = len(br)
+    else:
+        # 前に --precompress で作ったものが残っていると、古い内容が配信されてしまう
+        for ext in (".gz", ".br"):
+            if os.path.exists(filename + ext):
+                os.remove(filename + ext)
+
+    line = f"Output: {raw_size / 1024:.1f} KB -> {len(body) / 1024:.1f} KB minified, {sizes['gz'] / 1024:.1f} KB gzip"
+    if "br" in sizes:
+        line += f", {sizes['br'] / 1024:.1f} KB brotli"
+    print(line)
+    return sizes
+
+# ===============================
+# データ（JSON）の書き出し
+#   data/index.json           : 全銘柄の一覧（ランキング・ヒートマップ・CSV用）
+#   data/tickers/<code>.json  : 銘柄カードの詳細（信用残・価格帯別出来高）
+# ページはランキングとヒートマップを先に表示し、各カードの詳細は
+# 画面に入ったときに shard を読み込んで描く
+# ===============================
+DATA_DIR = "data"
+
+def shard_url(code):
+    return f"{DATA_DIR}/tickers/{code}.json"
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def write_data_files(updated, rows, shards):
+    """一覧と銘柄ごとの shard を書き出し、監視対象から外れた銘柄の shard は消す"""
+    _write_json(os.path.join(DATA_DIR, "index.json"), {"updated": updated, "tickers": rows})
+    keep = set()
+    for shard in shards:
+        path = shard_url(shard["code"])
+        _write_json(path, shard)
+        keep.add(os.path.basename(path))
+    shard_dir = os.path.join(DATA_DIR, "tickers")
+    for fname in os.listdir(shard_dir) if os.path.isdir(shard_dir) else []:
+        if fname.endswith(".json") and fname not in keep:
+            os.remove(os.path.join(shard_dir, fname))
+
+# カード詳細の遅延描画（render_card_body / render_vp_table と同じ HTML を作る）
+CARD_SCRIPT = """
+const VP_TITLES = %(vp_titles)s;
+const VOLUME_ZONES = %(zones)s;
+function esc(s) {
+    return String(s).replace(/[&<>"]/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}[c]));
+}
+function num(v) { return Number(v).toLocaleString('en-US'); }
+function renderVpTable(title, rows) {
+    if (!rows) return `<p>${title}: データなし</p>`;
+    const body = rows.map(([lower, upper, v, zone, isCurrent]) => {
+        let evalText = zone ? `<span class="${VOLUME_ZONES[zone][0]}">${VOLUME_ZONES[zone][1]}</span>` : '';
+        if (isCurrent) evalText += ' <span class="z-cur">📍 現在値</span>';
+        return `<tr${isCurrent ? ' class="cur"' : ''}><td class="c">${num(lower)} - ${num(upper)}</td><td class="r">${num(v)}</td><td>${evalText}</td></tr>`;
+    }).join('');
+    return `<div class="vp"><h4>${title}</h4><table class="vp-t"><thead><tr><th>価格帯</th><th>出来高</th><th>評価</th></tr></thead><tbody>${body}</tbody></table></div>`;
+}
+function renderCardBody(d) {
+    const m = d.margin;
+    return `<div class="margin"><strong>信用需給 (${esc(m.date)})</strong>: `
+        + `<span class="buy">買残 ${esc(m.buy)}</span> / <span class="sell">売残 ${esc(m.sell)}</span> / 倍率 ${esc(m.ratio)}倍 | `
+        + `<strong>勢い</strong>: <span class="b${d.heat_score >= 2 ? ' red' : ''}">${d.heat_score}倍</span> (直近5分出来高/平均)</div>`
+        + `<div class="vp-wrap"><div class="vp-col">${renderVpTable(VP_TITLES.short, d.vp.short)}</div>`
+        + `<div class="vp-col">${renderVpTable(VP_TITLES.mid, d.vp.mid)}</div></div>`;
+}
+function loadCard(el) {
+    el.classList.remove('lazy');
+    fetch(el.dataset.shard)
+        .then(res => res.json())
+        .then(d => { el.innerHTML = renderCardBody(d); })
+        .catch(() => { el.textContent = '読み込みに失敗しました'; });
+}
+(function () {
+    const cards = document.querySelectorAll('.card-body.lazy');
+    if (!('IntersectionObserver' in window)) { cards.forEach(loadCard); return; }
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(e => {
+            if (e.isIntersecting) { observer.unobserve(e.target); loadCard(e.target); }
+        });
+    }, { rootMargin: '300px 0px' });
+    cards.forEach(el => observer.observe(el));
+})();
+""" % {
+    "vp_titles": json.dumps(VP_TITLES, ensure_ascii=False),
+    "zones": json.dumps(VOLUME_ZONES, ensure_ascii=False),
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="株需給レポート (index.html) を生成する")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"銘柄を並列処理するワーカー数 (1で逐次実行, 既定: {DEFAULT_WORKERS})")
+    parser.add_argument("--force", action="store_true",
+                        help="上流データに変化が無くても index.html を生成し直す")
+    parser.add_argument("--precompress", action="store_true",
+                        help="index.html.gz / .br も書き出す（自前の静的サーバー向け。GitHub Pages では使われない）")
+    parser.add_argument("--inline-cards", action="store_true",
+                        help="銘柄カードの詳細も index.html に埋め込む（file:// で開く場合など。既定は data/ から遅延読み込み）")
+    parser.add_argument("--watchlist", metavar="FILE",
+                        help="監視銘柄をファイルから読む（1行1コード, # 以降はコメント。既定: TARGET_TICKERS）")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="銘柄を N 分割して別プロセスで処理する (既定: 1 = このプロセスだけで処理)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH,
+                        help=f"処理済み銘柄の結果を追記するファイル (既定: {CHECKPOINT_PATH})")
+    parser.add_argument("--resume", action="store_true",
+                        help="チェックポイントで処理済みの銘柄は取り直さずに続きから再開する")
+    return parser.parse_args(argv)
 
 # ===============================
 # メイン処理
 # ===============================
-def main():
+@traced("static_report", thread_local=False)
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    codes = load_watchlist(args.watchlist) if args.watchlist else list(TARGET_TICKERS)
+
     # JST (UTC+9) に変換
     JST = timezone(timedelta(hours=9))
     now_str = datetime.now(JST).strftime("%Y-%m-%d %H:%M")
     
     # ヘッダー
-    full_html = f"""
+    header_html = f"""
     <!DOCTYPE html>
     <html lang="ja">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>株需給レポート</title>
-        <style>
-            body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; padding: 10px; max-width: 900px; margin: 0 auto; background-color: #fcfcfc; }}
-            h1 {{ text-align: center; color: #333; }}
-            .nav {{ text-align: center; margin-bottom: 20px; }}
-            .nav a {{ margin: 0 5px; color: #2196F3; text-decoration: none; font-size: 14px; }}
-            @media (max-width: 600px) {{
-                .ticker-card {{ padding: 8px !important; }}
-                h2 {{ font-size: 1.2em; }}
-            }}
-        </style>
+        <style>{REPORT_CSS}</style>
     </head>
     <body>
         <h1>📊 株需給レポート</h1>
-        <p style="text-align:center; color:#666; font-size:12px;">更新: {now_str}</p>
+        <p class="updated">更新: {now_str}</p>
         
-        <div style="text-align:center; margin-bottom: 20px;">
-            <button onclick="downloadFullCSV()" style="padding: 10px 20px; background-color: #4CAF50; color: white; border: none; border-radius: 5px; cursor: pointer; font-size: 14px; display: inline-flex; align-items: center; gap: 8px;">
+        <div class="csv">
+            <button onclick="downloadFullCSV()" class="csv-btn">
                 <svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v4"></path><polyline points="7 10 12 15 17 10"></polyline><line x1="12" y1="15" x2="12" y2="3"></line></svg>
                 全銘柄データをCSV保存
             </button>
         </div>
         
         <!-- ヒートマップセクション -->
-        <div id="heatmap-container" style="margin-bottom:24px;">
-            <h3 style="margin-top:0; color:#333;">🌡️ {len(TARGET_TICKERS)}銘柄ヒートマップ (勢い)</h3>
-            <div style="display:grid; grid-template-columns: repeat(auto-fill, minmax(130px, 1fr)); gap:8px;">
+        <div id="heatmap-container">
+            <h3>🌡️ {len(codes)}銘柄ヒートマップ (勢い)</h3>
+            <div class="grid">
                 <!-- ヒートマップタイルがここに挿入される -->
             </div>
         </div>
 
         <!-- ランキングセクション -->
-        <div id="heat-ranking" style="background:#fff; border:2px solid #ff5252; border-radius:8px; padding:16px; margin-bottom:24px;">
-            <h3 style="margin-top:0; color:#ff5252;">🔥 資金流入スピード・ランキング (直近5分)</h3>
-            <table style="width:100%; border-collapse:collapse; font-size:14px;">
-                <thead style="background:#fee2e2;">
-                    <tr>
-                        <th style="padding:8px; border-bottom:2px solid #ff5252;">順位</th>
-                        <th style="padding:8px; border-bottom:2px solid #ff5252;">銘柄</th>
-                        <th style="padding:8px; border-bottom:2px solid #ff5252;">勢いスコア</th>
-                        <th style="padding:8px; border-bottom:2px solid #ff5252;">現在値</th>
-                    </tr>
-                </thead>
+        <div id="heat-ranking" class="rank">
+            <h3>🔥 資金流入スピード・ランキング (直近5分)</h3>
+            <table>
+                <thead><tr><th>順位</th><th>銘柄</th><th>勢いスコア</th><th>現在値</th></tr></thead>
                 <tbody id="ranking-body">
                     <!-- JSまたはPythonで挿入 -->
                 </tbody>
             </table>
-        </div>
-        <p style="font-size:12px; color:#666; margin-top:10px;">※勢いスコア：直近5分間の出来高が、過去5日間の5分足平均出来高の何倍かを示した数値です。</p>
+            <p class="note">※勢いスコア：直近5分間の出来高が、過去5日間の5分足平均出来高の何倍かを示した数値です。</p>
         </div>
 
         <!-- 信用倍率ランキングセクション -->
-        <div id="margin-ranking" style="background:#fff; border:2px solid #2196F3; border-radius:8px; padding:16px; margin-bottom:24px;">
-            <h3 style="margin-top:0; color:#2196F3;">💎 信用倍率ランキング (低い順)</h3>
-            <table style="width:100%; border-collapse:collapse; font-size:14px;">
-                <thead style="background:#e3f2fd;">
-                    <tr>
-                        <th style="padding:8px; border-bottom:2px solid #2196F3;">順位</th>
-                        <th style="padding:8px; border-bottom:2px solid #2196F3;">銘柄</th>
-                        <th style="padding:8px; border-bottom:2px solid #2196F3;">倍率</th>
-                        <th style="padding:8px; border-bottom:2px solid #2196F3;">現在値</th>
-                    </tr>
-                </thead>
+        <div id="margin-ranking" class="rank">
+            <h3>💎 信用倍率ランキング (低い順)</h3>
+            <table>
+                <thead><tr><th>順位</th><th>銘柄</th><th>倍率</th><th>現在値</th></tr></thead>
                 <tbody id="margin-ranking-body">
                     <!-- 信用ランキング挿入 -->
                 </tbody>
             </table>
-            <p style="font-size:12px; color:#666; margin-top:10px;">※信用倍率が低いほど、将来の売り圧力が少なく需給が良いとされます。</p>
+            <p class="note">※信用倍率が低いほど、将来の売り圧力が少なく需給が良いとされます。</p>
         </div>
 
         <div class="nav">
-            {' '.join([f'<a href="#{t}">{t}</a>' for t in TARGET_TICKERS])}
+            {' '.join([f'<a href="#{t}">{t}</a>' for t in codes])}
         </div>
     """
     
-    # 各銘柄の処理
+    # 各銘柄の処理（HTTP 接続プールはワーカー数に合わせる）
+    configure_http(args.workers)
+    reset_quote_stats()
+    reset_http_stats()
+    _FRAGMENTS.begin_run()
+    store_requests = _DAILY_STORE.requests
     ticker_results = []
     full_raw_data = []
-    for code in TARGET_TICKERS:
-        print(f"Processing {code}...")
-        html, score, name, price, rsi, wall_name, wall_dist, change_pct, margin_ratio, raw_data = process_ticker(code)
+    results = collect_results(codes, args.workers, args.shards, args.checkpoint, args.resume)
+    for code, result in zip(codes, results):
+        shard, score, name, price, rsi, wall_name, wall_dist, change_pct, margin_ratio, raw_data = result
         ticker_results.append({
             "code": code,
-            "html": html,
+            "shard": shard,
             "score": score,
             "name": name,
             "price": price,
@@ -555,119 +1196,81 @@ def main():
         })
         if raw_data:
             full_raw_data.append(raw_data)
+
+    # 上流データに変化が無ければ生成を省略する
+    filename = "index.html"
+    fingerprint = input_fingerprint(full_raw_data)
+    if not args.force and os.path.exists(filename) and fingerprint == load_fingerprint():
+        save_indicator_states()
+        print(f"No upstream changes since the last report (fingerprint {fingerprint[:12]}); "
+              f"skipped regeneration after {time.perf_counter() - started:.1f}s.")
+        return False
     
+    # ページの描画（ランキング・タイル・カードの組み立てから書き出しまで）
+    render_span = span("render", target="page").start()
+
     # スコアでソート
     ranking = sorted(ticker_results, key=lambda x: x["score"], reverse=True)
     
     # ランキング行の生成
-    ranking_rows = []
-    for i, res in enumerate(ranking[:10]):
-        heat_style = "font-weight:bold; color:#ff5252;" if res["score"] >= 2 else ""
-        
-        # 前日比の色付け
-        change_color = "#d32f2f" if res["change_pct"] > 0 else ("#388e3c" if res["change_pct"] < 0 else "#666")
-        change_sign = "+" if res["change_pct"] > 0 else ""
-        
-        # ステータスバッジの生成 (ランキング用)
-        badge = ""
-        if res["score"] >= 3.0:
-            badge = '<span style="background:#ff5252; color:white; padding:1px 6px; border-radius:10px; font-size:0.7em; margin-left:4px; white-space:nowrap;">🔥 急騰</span>'
-        elif res["score"] >= 1.5:
-            badge = '<span style="background:#ff9800; color:white; padding:1px 6px; border-radius:10px; font-size:0.7em; margin-left:4px; white-space:nowrap;">⚡️ 活性</span>'
-        
-        ranking_rows.append(f"""
-        <tr>
-            <td style="padding:8px; border-bottom:1px solid #eee; text-align:center;">{i+1}</td>
-            <td style="padding:8px; border-bottom:1px solid #eee;">
-                <a href="#{res['code']}" style="font-weight:bold; text-decoration:none; color:#1565c0;">{res['code']}</a> {badge}<br>
-                <span style="font-size:0.8em; color:#666;">{res['name']}</span>
-            </td>
-            <td style="padding:8px; border-bottom:1px solid #eee; text-align:center; {heat_style}">{res['score']}倍</td>
-            <td style="padding:8px; border-bottom:1px solid #eee; text-align:right;">
-                <span style="font-weight:bold;">{int(res['price']):,}円</span><br>
-                <span style="font-size:0.85em; color:{change_color};">{change_sign}{res['change_pct']}%</span>
-            </td>
-        </tr>
-        """)
-    
-    full_html = full_html.replace('<!-- JSまたはPythonで挿入 -->', "".join(ranking_rows))
+    ranking_rows = [
+        _FRAGMENTS.render("ranking_row", render_ranking_row, rank=i + 1, code=res["code"], name=res["name"],
+                          score=res["score"], price=res["price"], change_pct=res["change_pct"])
+        for i, res in enumerate(ranking[:10])
+    ]
 
     # 信用倍率でソート (低い順、999は除外または末尾へ)
     margin_ranking = sorted(ticker_results, key=lambda x: x["margin_ratio"])
-    
-    margin_ranking_rows = []
-    for i, res in enumerate(margin_ranking[:10]):
-        if res["margin_ratio"] == 999.0:
-            ratio_display = "-"
-            ratio_style = "color:#ccc;"
-        else:
-            ratio_display = f"{res['margin_ratio']:,}倍"
-            ratio_style = "font-weight:bold; color:#1565c0;" if res["margin_ratio"] < 1.0 else ""
-        
-        # 前日比の色付け
-        change_color = "#d32f2f" if res["change_pct"] > 0 else ("#388e3c" if res["change_pct"] < 0 else "#666")
-        change_sign = "+" if res["change_pct"] > 0 else ""
-        
-        margin_ranking_rows.append(f"""
-        <tr>
-            <td style="padding:8px; border-bottom:1px solid #eee; text-align:center;">{i+1}</td>
-            <td style="padding:8px; border-bottom:1px solid #eee;">
-                <a href="#{res['code']}" style="font-weight:bold; text-decoration:none; color:#1565c0;">{res['code']}</a><br>
-                <span style="font-size:0.8em; color:#666;">{res['name']}</span>
-            </td>
-            <td style="padding:8px; border-bottom:1px solid #eee; text-align:center; {ratio_style}">{ratio_display}</td>
-            <td style="padding:8px; border-bottom:1px solid #eee; text-align:right;">
-                <span style="font-weight:bold;">{int(res['price']):,}円</span><br>
-                <span style="font-size:0.85em; color:{change_color};">{change_sign}{res['change_pct']}%</span>
-            </td>
-        </tr>
-        """)
-    
-    full_html = full_html.replace('<!-- 信用ランキング挿入 -->', "".join(margin_ranking_rows))
+    margin_ranking_rows = [
+        _FRAGMENTS.render("margin_row", render_margin_row, rank=i + 1, code=res["code"], name=res["name"],
+                          margin_ratio=res["margin_ratio"], price=res["price"], change_pct=res["change_pct"])
+        for i, res in enumerate(margin_ranking[:10])
+    ]
 
     # ヒートマップタイルの生成
-    heatmap_tiles = []
-    for res in ticker_results:
-        bg_color, text_color = get_heat_color(res["score"])
-        
-        # RSIの色付け
-        rsi_style = ""
-        if res["rsi"] >= 70: rsi_style = "color:#d32f2f; font-weight:bold;"
-        elif res["rsi"] <= 30: rsi_style = "color:#388e3c; font-weight:bold;"
-        
-        heatmap_tiles.append(f"""
-        <a href="#{res['code']}" style="text-decoration:none; color:inherit;">
-            <div style="background:{bg_color}; color:{text_color}; padding:10px; border-radius:8px; text-align:center; box-shadow:0 2px 4px rgba(0,0,0,0.1); transition:transform 0.2s; min-height:100px; display:flex; flex-direction:column; justify-content:space-between;" 
-                 onmouseover="this.style.transform='scale(1.03)'" onmouseout="this.style.transform='scale(1)'">
-                <div style="font-weight:bold; font-size:13px; border-bottom:1px solid rgba(0,0,0,0.1); padding-bottom:4px; margin-bottom:4px;">{res['code']}</div>
-                
-                <div style="display:grid; grid-template-columns: 1fr; gap:2px; font-size:11px;">
-                    <div title="バースト・スコア">💥 <span style="font-weight:bold; font-size:14px;">{res['score']}</span>x</div>
-                    <div title="壁までの距離" style="white-space:nowrap;">🚧 {res['wall_name']} <span style="font-weight:bold;">{res['wall_dist']}</span>%</div>
-                    <div title="RSI(14)">📊 RSI <span style="{rsi_style}">{res['rsi']}</span></div>
-                </div>
-                
-                <div style="font-size:9px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis; opacity:0.8; margin-top:6px;">{res['name']}</div>
-            </div>
-        </a>
-        """)
-    
-    full_html = full_html.replace('<!-- ヒートマップタイルがここに挿入される -->', "".join(heatmap_tiles))
+    heatmap_tiles = [
+        _FRAGMENTS.render("tile", render_tile, code=res["code"], name=res["name"], score=res["score"],
+                          wall_name=res["wall_name"], wall_dist=res["wall_dist"], rsi=res["rsi"])
+        for res in ticker_results
+    ]
 
+    # ページの組み立て（断片をリストに並べ、最後に1回だけ書き出す）
+    top, rest = header_html.split('<!-- ヒートマップタイルがここに挿入される -->')
+    middle, rest = rest.split('<!-- JSまたはPythonで挿入 -->')
+    lower, bottom = rest.split('<!-- 信用ランキング挿入 -->')
+    parts = [top, *heatmap_tiles, middle, *ranking_rows, lower, *margin_ranking_rows, bottom]
     for res in ticker_results:
-        full_html += f'<div id="{res["code"]}">'
-        full_html += res["html"]
-        full_html += '</div>'
+        shard = res["shard"]
+        if "error" in shard:
+            card = render_error_card(res["code"], shard["error"])
+        elif args.inline_cards:
+            card = _FRAGMENTS.render("card", render_card, shard=shard)
+        else:
+            card = _FRAGMENTS.render("lazy_card", render_lazy_card, shard=shard, shard_url=shard_url(res["code"]))
+        parts += [f'<div id="{res["code"]}">', card, '</div>']
+
+    # 一覧（ランキング・ヒートマップ・CSV用）と銘柄ごとの詳細を JSON で書き出す
+    write_data_files(now_str, full_raw_data, [res["shard"] for res in ticker_results if "error" not in res["shard"]])
         
-    # JSONデータの埋め込みとJavaScriptの追加
-    full_html += f"""
+    # JavaScriptの追加（カード詳細の遅延描画と CSV 保存）
+    if args.inline_cards:
+        # file:// で開いても CSV を保存できるよう、一覧も埋め込む
+        parts.append(f"""
     <script id="full-data-json" type="application/json">
-        {json.dumps(full_raw_data, ensure_ascii=False)}
-    </script>
+        {json.dumps(full_raw_data, ensure_ascii=False, separators=(",", ":"))}
+    </script>""")
+    parts.append(f"""
     <script>
-    function downloadFullCSV() {{
-        const jsonData = JSON.parse(document.getElementById('full-data-json').textContent);
-        const headers = ["取得日時", "コード", "銘柄名", "現在値", "前日比(%)", "勢い(倍)", "壁", "壁距離(%)", "RSI", "信用買残", "信用売残", "信用倍率", "信用残更新日"];
+    {CARD_SCRIPT}
+    async function loadIndex() {{
+        const embedded = document.getElementById('full-data-json');
+        if (embedded) return JSON.parse(embedded.textContent);
+        const res = await fetch('{DATA_DIR}/index.json', {{ cache: 'no-cache' }});
+        return (await res.json()).tickers;
+    }}
+    async function downloadFullCSV() {{
+        const jsonData = await loadIndex();
+        const headers = ["取得日時", "コード", "銘柄名", "現在値", "前日比(%)", "勢い(倍)", "壁", "壁距離(%)", "RSI", "SDI", "シグナル", "信用買残", "信用売残", "信用倍率", "信用残更新日"];
         
         const csvRows = [];
         csvRows.push(headers.join(','));
@@ -685,6 +1288,8 @@ def main():
                 item.wall_name,
                 item.wall_dist,
                 item.rsi,
+                item.sdi ?? "",
+                item.signals,
                 `"${{item.margin_buy.replace(/"/g, '""')}}"`,
                 `"${{item.margin_sell.replace(/"/g, '""')}}"`,
                 item.margin_ratio,
@@ -709,13 +1314,28 @@ def main():
     </script>
     </body>
     </html>
-    """
+    """)
     
-    filename = "index.html"
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(full_html)
+    save_indicator_states()
+
+    write_report(filename, parts, args.precompress)
+    render_span.end()
+    save_fingerprint(fingerprint)
+    _FRAGMENTS.save()
         
-    print(f"Successfully generated {filename} with check for {len(TARGET_TICKERS)} tickers.")
+    print(f"Successfully generated {filename} with check for {len(codes)} tickers "
+          f"in {time.perf_counter() - started:.1f}s.")
+    stats = quote_stats()
+    parsed = stats["parsed_by"]
+    print(f"Quote page: {stats['fetches']} fetches for {stats['reads']} reads (saved {stats['saved']} requests), "
+          f"parsed by state {parsed['state']} / partial {parsed['partial']} / DOM {parsed['dom']}")
+    print(format_http_stats())
+    print(f"OHLCV: {_BATCH.calls} batch downloads ({_BATCH.series} series) + {_SINGLE_FETCHES['count']} single downloads, "
+          f"{_DAILY_STORE.requests - store_requests} daily store requests")
+    frag = _FRAGMENTS.stats()
+    print(f"Fragments: {frag['rendered']} re-rendered, {frag['reused']} reused")
+    print("Stages (since process start): " + ", ".join(f"{k} x{v['count']} avg {v['avg_ms']}ms" for k, v in stage_summary().items()))
+    return True
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,165 @@
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import count_error
+
+try:
+    from requests_cache import CachedSession, SQLiteCache
+except ImportError:  # requests-cache が無い環境では普通のセッションで動かす
+    CachedSession = SQLiteCache = None
+
+# ===============================
+# 共通の HTTP クライアント
+#
+# スクレイピングは全てここの http_get() を通す。
+# - 接続プール（ワーカー数に合わせた keep-alive 接続の使い回し）
+# - ホストごとの同時接続数の上限
+# - SQLite に保存するレスポンスキャッシュ（URL の種類ごとの有効期限）
+# - 期限切れでも ETag / Last-Modified があれば条件付きリクエストで再検証（304 なら本文を再取得しない）
+# ===============================
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+HTTP_CACHE_PATH = os.environ.get("HTTP_CACHE_PATH", os.path.join(".cache", "http_cache.sqlite"))
+
+# ホスト別の同時接続数の上限（ワーカー数を増やしてもYahoo側に集中しすぎないように）
+HOST_LIMITS = {
+    "finance.yahoo.co.jp": 4,       # 銘柄ページのスクレイピング
+    "query2.finance.yahoo.com": 4,  # yfinance (chart API)
+}
+_HOST_SEMAPHORES = {host: threading.BoundedSemaphore(n) for host, n in HOST_LIMITS.items()}
+
+# URL の種類ごとの有効期限（秒）。上から順に最初に一致したものを使う
+#   0 は「保存はするが毎回再検証する」
+URLS_EXPIRE_AFTER = {
+    "finance.yahoo.co.jp/quote/*/history*": 60 * 60,  # 時系列（日足）は1時間
+    "finance.yahoo.co.jp/quote/*": 60,                # 銘柄ページ（現在値・信用残）は1分
+    "*.jpx.co.jp/*": 24 * 60 * 60,                    # 取引所の公表資料は1日
+}
+DEFAULT_EXPIRE_AFTER = 0
+
+DEFAULT_POOL_SIZE = 8
+
+_CLIENT = {"session": None, "pool_size": DEFAULT_POOL_SIZE, "transport": None}
+_CLIENT_LOCK = threading.Lock()
+_STATS = {"requests": 0, "hits": 0, "revalidated": 0, "misses": 0, "errors": 0, "bytes_saved": 0, "bytes_fetched": 0}
+_STATS_LOCK = threading.Lock()
+
+
+@contextmanager
+def host_slot(host):
+    """指定ホストへの同時リクエスト数を HOST_LIMITS 以内に抑える"""
+    sem = _HOST_SEMAPHORES.get(host)
+    if sem is None:
+        yield
+        return
+    with sem:
+        yield
+
+
+def _new_session(pool_size, transport=None):
+    if transport is not None:
+        # 記録・再生中はキャッシュを通さず、全リクエストを transport に渡す
+        session = requests.Session()
+        session.mount("https://", transport)
+        session.mount("http://", transport)
+        session.headers.update(HEADERS)
+        return session
+    if CachedSession is not None:
+        os.makedirs(os.path.dirname(HTTP_CACHE_PATH) or ".", exist_ok=True)
+        session = CachedSession(
+            backend=SQLiteCache(HTTP_CACHE_PATH, wal=True),
+            expire_after=DEFAULT_EXPIRE_AFTER,
+            urls_expire_after=URLS_EXPIRE_AFTER,
+            stale_if_error=True,  # 上流が落ちているときは期限切れでも直前の内容を返す
+        )
+    else:
+        session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(HOST_LIMITS) + 1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def configure(pool_size=None):
+    """接続プールの大きさ（ワーカー数）を設定する。次回以降の get_session() から反映"""
+    with _CLIENT_LOCK:
+        pool_size = max(1, pool_size or DEFAULT_POOL_SIZE)
+        if pool_size != _CLIENT["pool_size"] and _CLIENT["session"] is not None:
+            _CLIENT["session"].close()
+            _CLIENT["session"] = None
+        _CLIENT["pool_size"] = pool_size
+
+
+def get_session():
+    """プロセス内で共有するセッション（常駐実行では周期をまたいで接続を使い回す）"""
+    with _CLIENT_LOCK:
+        if _CLIENT["session"] is None:
+            _CLIENT["session"] = _new_session(_CLIENT["pool_size"], _CLIENT["transport"])
+        return _CLIENT["session"]
+
+
+def set_transport(adapter=None):
+    """送受信を差し替える（replay.py の記録・再生用）。None で通常のセッションに戻す"""
+    with _CLIENT_LOCK:
+        if _CLIENT["session"] is not None:
+            _CLIENT["session"].close()
+            _CLIENT["session"] = None
+        _CLIENT["transport"] = adapter
+
+
+def _count(response=None, error=False):
+    with _STATS_LOCK:
+        _STATS["requests"] += 1
+        if error:
+            _STATS["errors"] += 1
+            return
+        size = len(response.content or b"")
+        if getattr(response, "from_cache", False):
+            # revalidated: 304 を受けてキャッシュの本文を使った
+            _STATS["revalidated" if getattr(response, "revalidated", False) else "hits"] += 1
+            _STATS["bytes_saved"] += size
+        else:
+            _STATS["misses"] += 1
+            _STATS["bytes_fetched"] += size
+
+
+def http_get(url, timeout=5, host=None, **kwargs):
+    """共有セッションで GET する（ホスト上限・キャッシュ・統計つき）"""
+    host = host or urlparse(url).hostname
+    try:
+        with host_slot(host):
+            r = get_session().get(url, timeout=timeout, **kwargs)
+    except Exception as e:
+        _count(error=True)
+        count_error(host, type(e).__name__)
+        raise
+    _count(r)
+    if r.status_code >= 400:
+        count_error(host, f"http_{r.status_code}")
+    return r
+
+
+def http_stats():
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    served = stats["hits"] + stats["revalidated"]
+    stats["hit_rate"] = round(served / stats["requests"], 3) if stats["requests"] else 0.0
+    return stats
+
+
+def reset_http_stats():
+    with _STATS_LOCK:
+        for k in _STATS:
+            _STATS[k] = 0
+
+
+def format_http_stats(stats=None):
+    stats = stats or http_stats()
+    return (f"HTTP: {stats['requests']} requests, {stats['hits']} cache hits + {stats['revalidated']} revalidated (304) "
+            f"/ {stats['misses']} fetched, hit rate {stats['hit_rate']:.0%}, "
+            f"{stats['bytes_saved'] / 1024:.1f} KB saved, {stats['bytes_fetched'] / 1024:.1f} KB downloaded")
@@ -0,0 +1,193 @@
+import os
+import sys
+import argparse
+from datetime import datetime, time as dtime, timedelta, timezone
+
+# ===============================
+# 東証（JPX）の営業日カレンダーと立会時間のフェーズ
+#
+# - 土日・祝日・年末年始（12/31〜1/3）は休場
+# - 前場 9:00-11:30 / 昼休み / 後場 12:30-15:30（2024年11月から大引けは15:30）
+# フェーズごとに更新間隔を変え、寄り付き・大引け前後は細かく、
+# 昼休み・休場日・夜間は更新しない。
+# ===============================
+JST = timezone(timedelta(hours=9))
+
+# 休場日（土日以外）。毎年末に翌年分を追記する
+JPX_HOLIDAYS = {
+    # 2025
+    "2025-01-01", "2025-01-02", "2025-01-03", "2025-01-13", "2025-02-11", "2025-02-24",
+    "2025-03-20", "2025-04-29", "2025-05-05", "2025-05-06", "2025-07-21", "2025-08-11",
+    "2025-09-15", "2025-09-23", "2025-10-13", "2025-11-03", "2025-11-24", "2025-12-31",
+    # 2026
+    "2026-01-01", "2026-01-02", "2026-01-12", "2026-02-11", "2026-02-23", "2026-03-20",
+    "2026-04-29", "2026-05-04", "2026-05-05", "2026-05-06", "2026-07-20", "2026-08-11",
+    "2026-09-21", "2026-09-22", "2026-09-23", "2026-10-12", "2026-11-03", "2026-11-23",
+    "2026-12-31",
+    # 2027
+    "2027-01-01", "2027-01-11", "2027-02-11", "2027-02-23", "2027-03-22", "2027-04-29",
+    "2027-05-03", "2027-05-04", "2027-05-05", "2027-07-19", "2027-08-11", "2027-09-20",
+    "2027-09-23", "2027-10-11", "2027-11-03", "2027-11-23", "2027-12-31",
+}
+# 表に載っている最後の年（これより先は土日だけで判定するので警告を出す）
+HOLIDAY_TABLE_LAST_YEAR = 2027
+_WARNED_YEARS = set()  # 表より先の年の警告は年ごとに1回だけ出す
+
+# (フェーズ名, 開始, 終了, 更新間隔[分]（None は更新しない）)
+SESSION_PHASES = [
+    ("pre_open",   dtime(8, 0),   dtime(9, 0),   None),  # 気配のみ。寄り付きで更新する
+    ("opening",    dtime(9, 0),   dtime(9, 30),  5),     # 寄り付き直後は値動き・出来高が大きい
+    ("morning",    dtime(9, 30),  dtime(11, 30), 10),
+    ("lunch",      dtime(11, 30), dtime(12, 30), None),  # 昼休みは値が動かない
+    ("afternoon",  dtime(12, 30), dtime(15, 0),  10),
+    ("closing",    dtime(15, 0),  dtime(15, 30), 5),     # 大引け前後
+    ("post_close", dtime(15, 30), dtime(18, 0),  30),    # 終値・信用残の確定待ち（変化が無ければ生成を省略）
+]
+CLOSED = "closed"
+
+
+def now_jst():
+    return datetime.now(JST)
+
+
+def _as_jst(now):
+    if now is None:
+        return now_jst()
+    if now.tzinfo is None:
+        return now.replace(tzinfo=JST)
+    return now.astimezone(JST)
+
+
+def is_trading_day(d):
+    """東証の営業日かどうか"""
+    if isinstance(d, datetime):
+        d = _as_jst(d).date()
+    if d.weekday() >= 5:
+        return False
+    if d.year > HOLIDAY_TABLE_LAST_YEAR and d.year not in _WARNED_YEARS:
+        _WARNED_YEARS.add(d.year)
+        print(f"Warning: JPX holiday table ends in {HOLIDAY_TABLE_LAST_YEAR}; {d.year} is judged by weekday only")
+    return d.isoformat() not in JPX_HOLIDAYS
+
+
+def session_phase(now=None):
+    """現在のフェーズ名。休場日・時間外は "closed" """
+    now = _as_jst(now)
+    if not is_trading_day(now.date()):
+        return CLOSED
+    t = now.time()
+    for name, start, end, _ in SESSION_PHASES:
+        if start <= t < end:
+            return name
+    return CLOSED
+
+
+def refresh_interval(phase):
+    """フェーズの更新間隔（秒）。更新しないフェーズは None"""
+    for name, _, _, minutes in SESSION_PHASES:
+        if name == phase:
+            return minutes * 60 if minutes else None
+    return None
+
+
+def is_refresh_window(now=None):
+    """今がレポートを更新するフェーズかどうか"""
+    return refresh_interval(session_phase(now)) is not None
+
+
+def next_refresh_start(now=None):
+    """次に更新フェーズが始まる時刻（今が更新フェーズなら now）"""
+    now = _as_jst(now)
+    if is_refresh_window(now):
+        return now
+    day = now.date()
+    for _ in range(30):
+        if is_trading_day(day):
+            for _, start, _, minutes in SESSION_PHASES:
+                at = datetime.combine(day, start, tzinfo=JST)
+                if minutes and at > now:
+                    return at
+        day += timedelta(days=1)
+    return now + timedelta(days=1)
+
+
+def seconds_until_next_refresh(now=None):
+    """
+    次の更新までの待ち時間（秒）。
+    更新フェーズ中はそのフェーズの間隔（フェーズ境界をまたぐ場合は境界まで）、
+    それ以外は次の更新フェーズの開始まで
+    """
+    now = _as_jst(now)
+    phase = session_phase(now)
+    interval = refresh_interval(phase)
+    if interval is None:
+        return max(1, int((next_refresh_start(now) - now).total_seconds()))
+    for name, _, end, _ in SESSION_PHASES:
+        if name == phase:
+            phase_end = datetime.combine(now.date(), end, tzinfo=JST)
+            return max(1, int(min(interval, (phase_end - now).total_seconds())))
+    return interval
+
+
+def should_run_cron(now=None, cron_minutes=5, last_run=None):
+    """
+    cron_minutes 分おきに起動される cron 用の判定。
+    更新フェーズ中で、前回の更新からフェーズの更新間隔が経っていれば True
+    （前回時刻が分からなければ、間隔の区切りに当たる回だけ True）
+    """
+    now = _as_jst(now)
+    interval = refresh_interval(session_phase(now))
+    if interval is None:
+        return False
+    if last_run is not None:
+        # cron の起動は数分遅れることがあるので、半周期ぶんは早めに許す
+        return (now - _as_jst(last_run)).total_seconds() >= interval - cron_minutes * 30
+    minutes = interval // 60
+    return (now.hour * 60 + now.minute) % minutes < cron_minutes
+
+
+LAST_RUN_PATH = os.path.join(".cache", "last_refresh.txt")
+
+
+def load_last_run(path=LAST_RUN_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return datetime.fromisoformat(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def save_last_run(now, path=LAST_RUN_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(_as_jst(now).isoformat())
+
+
+# ===============================
+# GitHub Actions のゲート用 CLI
+#   python jpx_calendar.py --gate  → run=true/false を $GITHUB_OUTPUT に書く
+# ===============================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JPX カレンダーに基づいて今回の更新を実行するか判定する")
+    parser.add_argument("--gate", action="store_true", help="cron 起動時の実行可否を出力する")
+    parser.add_argument("--cron-minutes", type=int, default=5, help="cron の起動間隔（分）")
+    args = parser.parse_args(argv)
+
+    now = now_jst()
+    phase = session_phase(now)
+    last_run = load_last_run()
+    run = should_run_cron(now, args.cron_minutes, last_run)
+    print(f"{now.strftime('%Y-%m-%d %H:%M')} JST phase={phase} run={'true' if run else 'false'}")
+    if args.gate:
+        output = os.environ.get("GITHUB_OUTPUT")
+        if run:
+            save_last_run(now)
+        if output:
+            with open(output, "a", encoding="utf-8") as f:
+                f.write(f"run={'true' if run else 'false'}\n")
+                f.write(f"phase={phase}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
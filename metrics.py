@@ -0,0 +1,273 @@
+import itertools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# ===============================
+# 段階ごとの計測（スパン）とメトリクス
+#
+# - span("fetch", ticker=...) で囲んだ処理の所要時間を段階ごとのヒストグラムに積む
+# - 1回の実行（静的レポート生成 / app.update の1回）ごとに、スパンを JSON Lines で書き出す
+#     {"run": "...", "kind": "app.update", "stage": "fetch", "ms": 123.4, "ok": true, "ticker": "7203.T", ...}
+# - 上流のエラー数（HTTP / yfinance / ページ解析）を数える
+# - render_prometheus() で Prometheus のテキスト形式にする（app.py の /metrics）
+# ===============================
+SPAN_LOG_PATH = os.environ.get("SPAN_LOG_PATH", os.path.join(".cache", "spans.jsonl"))
+SPAN_LOG_MAX_BYTES = 10 * 1024 * 1024  # 超えたら .1 に回して新しく書く
+PREFIX = "jpsv"
+
+# ヒストグラムの区切り（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_LOCK = threading.Lock()
+_LOG_LOCK = threading.Lock()
+_HISTOGRAMS = {}      # (kind, stage) -> {"buckets": [...], "sum": 秒, "count": 回数}
+_STAGE_ERRORS = {}    # (kind, stage) -> 回数
+_UPSTREAM_ERRORS = {} # (source, reason) -> 回数
+_COLLECTORS = []      # 追加のメトリクス（キャッシュ統計など）を返す関数
+
+_RUN_IDS = itertools.count(1)
+_GLOBAL_RUN = {"run": None}      # 静的レポートのようにワーカースレッドをまたぐ実行
+_LOCAL = threading.local()       # app.update のようにリクエスト（スレッド）ごとの実行
+
+
+class _Run:
+    def __init__(self, kind, **labels):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_RUN_IDS)}"
+        self.kind = kind
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+
+def _current_run():
+    return getattr(_LOCAL, "run", None) or _GLOBAL_RUN["run"]
+
+
+def _observe(kind, stage, seconds, ok=True):
+    key = (kind, stage)
+    with _LOCK:
+        h = _HISTOGRAMS.get(key)
+        if h is None:
+            h = _HISTOGRAMS[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        i = bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS):
+            h["buckets"][i] += 1
+        h["sum"] += seconds
+        h["count"] += 1
+        if not ok:
+            _STAGE_ERRORS[key] = _STAGE_ERRORS.get(key, 0) + 1
+
+
+def observe(kind, stage, seconds, ok=True):
+    """外で測った所要時間（ブラウザの表示時間など）をヒストグラムに積む"""
+    _observe(kind, stage, seconds, ok)
+
+
+class Span:
+    """
+    1段階の計測。with で使うか、start() / end() を明示的に呼ぶ。
+    例外で抜けたら ok=False として記録し、例外はそのまま投げる
+    """
+
+    def __init__(self, stage, **labels):
+        self.stage = stage
+        self.labels = labels
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        return self
+
+    def end(self, error=None):
+        if self.started is None:
+            return
+        seconds = time.perf_counter() - self.started
+        self.started = None
+        run = _current_run()
+        kind = run.kind if run else "adhoc"
+        _observe(kind, self.stage, seconds, ok=error is None)
+        if run is not None:
+            record = {"stage": self.stage, "ms": round(seconds * 1000, 2), "ok": error is None, **self.labels}
+            if error is not None:
+                record["error"] = f"{type(error).__name__}: {error}"[:200]
+            run.add(record)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+        return False
+
+
+def span(stage, **labels):
+    return Span(stage, **labels)
+
+
+def begin_run(kind, thread_local=False, **labels):
+    """1回の実行の開始。thread_local なら今のスレッドだけの実行にする（同時に複数走る app.update 用）"""
+    run = _Run(kind, **labels)
+    if thread_local:
+        _LOCAL.run = run
+    else:
+        _GLOBAL_RUN["run"] = run
+    return run
+
+
+def end_run(run, ok=True, path=None):
+    """実行の終了。全体の所要時間も記録し、スパンを JSON Lines で書き出す"""
+    seconds = time.perf_counter() - run.started
+    _observe(run.kind, "total", seconds, ok=ok)
+    if getattr(_LOCAL, "run", None) is run:
+        _LOCAL.run = None
+    if _GLOBAL_RUN["run"] is run:
+        _GLOBAL_RUN["run"] = None
+    write_spans(run, seconds, ok, path)
+    return seconds
+
+
+def carry_run(func):
+    """今のスレッドの実行（run）を引き継いで func を呼ぶ関数を返す（スレッドプールに渡す用）"""
+    run = _current_run()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        prev = getattr(_LOCAL, "run", None)
+        _LOCAL.run = run
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _LOCAL.run = prev
+    return wrapper
+
+
+def traced(kind, thread_local=True, **labels):
+    """関数の1回の呼び出しを1回の実行として記録するデコレータ"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            run = begin_run(kind, thread_local=thread_local, **labels)
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                end_run(run, ok)
+        return wrapper
+    return decorator
+
+
+def write_spans(run, seconds, ok=True, path=None):
+    path = path or SPAN_LOG_PATH
+    if not path:
+        return
+    with run._lock:
+        spans = list(run.spans)
+    base = {"run": run.id, "kind": run.kind, "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), **run.labels}
+    lines = [json.dumps({**base, **s}, ensure_ascii=False, default=str) for s in spans]
+    lines.append(json.dumps({**base, "stage": "total", "ms": round(seconds * 1000, 2), "ok": ok,
+                             "spans": len(spans)}, ensure_ascii=False, default=str))
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _LOG_LOCK:
+            if os.path.exists(path) and os.path.getsize(path) > SPAN_LOG_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+    except OSError as e:
+        print(f"Span log error: {e}")
+
+
+def count_error(source, reason):
+    """上流（HTTP / yfinance / 解析）のエラーを数える"""
+    key = (str(source), str(reason))
+    with _LOCK:
+        _UPSTREAM_ERRORS[key] = _UPSTREAM_ERRORS.get(key, 0) + 1
+
+
+def register_collector(func):
+    """
+    /metrics に載せる追加のメトリクス。
+    func() は [(名前, 種類, 説明, [(ラベル dict, 値), ...]), ...] を返す
+    """
+    _COLLECTORS.append(func)
+    return func
+
+
+def stage_summary():
+    """段階ごとの回数・平均（ログ出力用）"""
+    with _LOCK:
+        return {f"{kind}/{stage}": {"count": h["count"], "avg_ms": round(h["sum"] / h["count"] * 1000, 1)}
+                for (kind, stage), h in _HISTOGRAMS.items() if h["count"]}
+
+
+def reset_metrics():
+    with _LOCK:
+        _HISTOGRAMS.clear()
+        _STAGE_ERRORS.clear()
+        _UPSTREAM_ERRORS.clear()
+
+
+# ===============================
+# Prometheus テキスト形式
+# ===============================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+
+def render_prometheus():
+    with _LOCK:
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _HISTOGRAMS.items()}
+        stage_errors = dict(_STAGE_ERRORS)
+        upstream = dict(_UPSTREAM_ERRORS)
+
+    lines = []
+    name = f"{PREFIX}_stage_duration_seconds"
+    lines.append(f"# HELP {name} Duration of each pipeline stage")
+    lines.append(f"# TYPE {name} histogram")
+    for (kind, stage), h in sorted(histograms.items()):
+        labels = {"kind": kind, "stage": stage}
+        cumulative = 0
+        for le, n in zip(BUCKETS, h["buckets"]):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {h['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {h['sum']:.6f}")
+        lines.append(f"{name}_count{_labels(labels)} {h['count']}")
+
+    _family(lines, f"{PREFIX}_stage_errors_total", "counter", "Stages that ended with an exception",
+            [({"kind": k, "stage": s}, n) for (k, s), n in sorted(stage_errors.items())])
+    _family(lines, f"{PREFIX}_upstream_errors_total", "counter", "Errors from upstream sources",
+            [({"source": s, "reason": r}, n) for (s, r), n in sorted(upstream.items())])
+
+    for collector in _COLLECTORS:
+        try:
+            for family in collector():
+                _family(lines, f"{PREFIX}_{family[0]}", *family[1:])
+        except Exception as e:
+            print(f"Metrics collector error: {e}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,90 @@
+import threading
+
+import pandas as pd
+import yfinance as yf
+
+from metrics import count_error
+
+# ===============================
+# 複数銘柄の一括ダウンロード（yfinance）
+#
+# (period, interval) の組み合わせごとに監視銘柄全体を1回の yf.download で取得し、
+# 各銘柄には自分の分だけを切り出して渡す。
+# ===============================
+
+
+def flatten_columns(df):
+    """単一銘柄の yf.download 結果の MultiIndex 列を解除する"""
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    return df
+
+
+def split_by_ticker(df, tickers):
+    """group_by="ticker" で取得したデータを {ticker: DataFrame} に分解する"""
+    frames = {}
+    if df is None or df.empty:
+        return frames
+    if not isinstance(df.columns, pd.MultiIndex):
+        # 1銘柄だけのときは MultiIndex にならないことがある
+        if len(tickers) == 1:
+            frames[tickers[0]] = df.dropna(how="all")
+        return frames
+    available = set(df.columns.get_level_values(0))
+    for t in tickers:
+        if t in available:
+            # 全銘柄の日時の和集合に揃えられているので、自分の無い行は落とす
+            frames[t] = df[t].dropna(how="all").copy()
+    return frames
+
+
+class OhlcvBatch:
+    """1回の実行ぶんの一括取得結果を保持する"""
+
+    def __init__(self):
+        self.frames = {}      # (period, interval) -> {ticker: DataFrame}
+        self.calls = 0        # yf.download の呼び出し回数
+        self.series = 0       # 取得できた銘柄×組み合わせの数
+        self._lock = threading.Lock()
+
+    def fetch(self, tickers, period, interval, threads=4, timeout=10):
+        """監視銘柄全体の (period, interval) を1回の呼び出しで取得する"""
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        try:
+            df = yf.download(tickers, period=period, interval=interval, group_by="ticker",
+                             progress=False, threads=threads, timeout=timeout)
+            frames = split_by_ticker(df, tickers)
+        except Exception as e:
+            print(f"Batch download error {period}/{interval}: {e}")
+            count_error("yfinance", type(e).__name__)
+            frames = {}
+        with self._lock:
+            self.calls += 1
+            self.series += len(frames)
+            self.frames[(period, interval)] = frames
+        return frames
+
+    def fetch_all(self, tickers, combos, threads=4, timeout=10):
+        for period, interval in combos:
+            self.fetch(tickers, period, interval, threads=threads, timeout=timeout)
+
+    def put(self, period, interval, frames):
+        """手元で導出した (period, interval) を登録する（ダウンロードは数えない）"""
+        with self._lock:
+            self.frames[(period, interval)] = frames
+
+    def get(self, ticker, period, interval):
+        """一括取得済みなら自分の分のコピーを返す。未取得なら None"""
+        with self._lock:
+            frames = self.frames.get((period, interval))
+        if frames is None or ticker not in frames:
+            return None
+        return frames[ticker].copy()
+
+    def clear(self):
+        with self._lock:
+            self.frames.clear()
+            self.calls = 0
+            self.series = 0
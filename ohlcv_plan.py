@@ -0,0 +1,153 @@
+import pandas as pd
+
+# ===============================
+# OHLCV 取得プランナー
+#
+# 1回の実行で必要な (period, interval) を全て集め、
+# それらを賄える最小限のダウンロードだけを行い、残りは手元で
+# 「期間の切り出し」や「足のリサンプリング」で作る。
+#   例: 5d/5m は 5d/1m から、5d/1d は 1mo/1d から作れる
+# ===============================
+
+# 期間をおおよその営業日数に換算（カバー判定用）
+PERIOD_SESSIONS = {
+    "1d": 1, "5d": 5, "1mo": 23, "3mo": 66, "6mo": 130,
+    "1y": 250, "2y": 500, "5y": 1250, "10y": 2500, "max": 10 ** 6,
+}
+
+# 足の長さ（分）。日足以上は日中足から作らない（引け値・出来高の扱いが異なるため）
+INTERVAL_MINUTES = {
+    "1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60,
+    "1d": None, "5d": None, "1wk": None, "1mo": None, "3mo": None,
+}
+
+# Yahoo側で取得できる最長期間（1分足は直近7日まで、それ以外の日中足は60日まで）
+MAX_PERIOD = {"1m": "5d"}
+MAX_INTRADAY_PERIOD = "1mo"
+
+_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Adj Close": "last", "Volume": "sum"}
+
+
+def _sessions(period):
+    return PERIOD_SESSIONS[period]
+
+
+def _max_period(interval):
+    if INTERVAL_MINUTES.get(interval) is None:
+        return "max"
+    return MAX_PERIOD.get(interval, MAX_INTRADAY_PERIOD)
+
+
+def derivable(src_interval, dst_interval):
+    """src の足から dst の足を作れるか"""
+    if src_interval == dst_interval:
+        return True
+    src_min = INTERVAL_MINUTES.get(src_interval)
+    dst_min = INTERVAL_MINUTES.get(dst_interval)
+    if src_min is None or dst_min is None:
+        return False
+    return dst_min % src_min == 0
+
+
+def covers(src, dst):
+    """ダウンロード src=(period, interval) から要求 dst を賄えるか"""
+    return derivable(src[1], dst[1]) and _sessions(src[0]) >= _sessions(dst[0])
+
+
+class FetchPlan:
+    def __init__(self, requirements, downloads, derivations):
+        self.requirements = requirements
+        self.downloads = downloads        # [(period, interval)]
+        self.derivations = derivations    # {要求: 元になるダウンロード}
+
+    def summary(self):
+        lines = [f"OHLCV plan: {len(self.requirements)} requirements -> {len(self.downloads)} downloads"]
+        for period, interval in self.downloads:
+            lines.append(f"  download {period}/{interval}")
+        for (period, interval), (src_p, src_i) in self.derivations.items():
+            how = "slice" if interval == src_i else "resample"
+            lines.append(f"  derive   {period}/{interval} <- {how} {src_p}/{src_i}")
+        return "\n".join(lines)
+
+
+def plan_downloads(requirements):
+    """要求の集合から最小限のダウンロードと、それ以外の導出方法を決める"""
+    reqs = list(dict.fromkeys(requirements))
+    # 細かい足・長い期間から順に見る（後から来る粗い足・短い期間はそこから作れることが多い）
+    order = sorted(reqs, key=lambda r: (INTERVAL_MINUTES.get(r[1]) or 10 ** 9, -_sessions(r[0])))
+
+    downloads = []
+    for req in order:
+        if any(covers(d, req) for d in downloads):
+            continue
+        # 既存の細かい足の期間を延ばせば賄えるならそうする（例: 1d/1m -> 5d/1m）
+        for i, (d_period, d_interval) in enumerate(downloads):
+            if (derivable(d_interval, req[1])
+                    and _sessions(req[0]) <= _sessions(_max_period(d_interval))):
+                downloads[i] = (req[0], d_interval)
+                break
+        else:
+            downloads.append(req)
+
+    derivations = {}
+    for req in reqs:
+        if req in downloads:
+            continue
+        # 同じ足があればそれを、無ければ一番粗い（=行数の少ない）元を使う
+        sources = [d for d in downloads if covers(d, req)]
+        src = max(sources, key=lambda d: (d[1] == req[1], INTERVAL_MINUTES.get(d[1]) or 10 ** 9))
+        derivations[req] = src
+    return FetchPlan(reqs, downloads, derivations)
+
+
+# ===============================
+# 導出（切り出し・リサンプリング）
+# ===============================
+def slice_period(df, period):
+    """取得済みの足から、直近 period 分だけを切り出す"""
+    if df is None or df.empty or period == "max":
+        return df
+    if period.endswith("d"):
+        # "5d" は直近5営業日
+        days = df.index.normalize()
+        keep = days.unique()[-int(period[:-1]):]
+        return df[days.isin(keep)]
+    offset = pd.DateOffset(months=int(period[:-2])) if period.endswith("mo") else pd.DateOffset(years=int(period[:-1]))
+    return df[df.index >= df.index[-1] - offset]
+
+
+def resample_bars(df, interval):
+    """1分足などを、より長い日中足（5分足など）にまとめる"""
+    if df is None or df.empty:
+        return df
+    agg = {c: f for c, f in _AGG.items() if c in df.columns}
+    out = df.resample(f"{INTERVAL_MINUTES[interval]}min", label="left", closed="left").agg(agg)
+    # 取引の無い時間帯（昼休み・夜間）の空バーは落とす
+    return out.dropna(subset=["Close"]) if "Close" in out.columns else out
+
+
+def derive(df, src, dst):
+    if df is None:
+        return None
+    out = df if src[1] == dst[1] else resample_bars(df, dst[1])
+    if dst[0] != src[0]:
+        out = slice_period(out, dst[0])
+    return out.copy()
+
+
+def execute_plan(plan, tickers, batch, threads=4, store=None):
+    """プランのダウンロードを一括取得し、導出分も batch に登録する
+    store（日足の永続ストア）を渡した場合、日足はストアの差分同期から読む"""
+    for period, interval in plan.downloads:
+        if store is not None and interval == "1d":
+            frames = store.load_period(tickers, period)
+            batch.put(period, interval, {t: slice_period(df, period) for t, df in frames.items()})
+        else:
+            batch.fetch(tickers, period, interval, threads=threads)
+    for dst, src in plan.derivations.items():
+        frames = {}
+        for t in tickers:
+            df = batch.get(t, *src)
+            if df is not None:
+                frames[t] = derive(df, src, dst)
+        batch.put(dst[0], dst[1], frames)
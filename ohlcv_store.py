@@ -0,0 +1,238 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+from ohlcv_batch import split_by_ticker
+
+# ===============================
+# 日足の永続ストア（SQLite）
+#
+# 銘柄ごとに保持している最終日を記録しておき、yfinance からは
+# 足りない末尾（＋数日の重なり）だけを取得してマージする。
+# 2年分の日足も2回目以降は小さな差分取得1回で済む。
+# ===============================
+STORE_PATH = os.environ.get("OHLCV_STORE_PATH", os.path.join(".cache", "ohlcv.sqlite"))
+
+# 差分取得時に遡る日数（当日足の更新・直近の訂正を取り込むため）
+OVERLAP_DAYS = 7
+# この秒数以内に確認済みなら再取得しない
+FRESH_SECONDS = 60
+# 重なり部分の終値がこれ以上ずれていたら分割・配当落ちで過去が修正されたとみなし全期間を取り直す
+ADJUST_TOLERANCE = 1e-3
+# 保存している足の種類。2: 分割・配当調整済み（yfinance の既定 auto_adjust=True。従来の取得と同じ値）
+# 変えたら保存済みの足は捨てて取り直す
+STORE_VERSION = 2
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_bars (
+    ticker TEXT NOT NULL,
+    date   TEXT NOT NULL,
+    open   REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS series_meta (
+    ticker       TEXT PRIMARY KEY,
+    covered_from TEXT,  -- この日以降は取得済み（上場前など足が無い期間も含む）
+    last_date    TEXT,
+    checked_at   TEXT
+);
+"""
+
+
+def period_start(period, today=None):
+    """yfinance の period 表記を、ストアから読み出す開始日に換算する"""
+    today = pd.Timestamp(today or datetime.today()).normalize()
+    if period.endswith("d"):
+        # 営業日数なので休日ぶん多めに遡る（読み出し後に切り出す）
+        return today - timedelta(days=int(period[:-1]) * 2 + 7)
+    if period.endswith("mo"):
+        return today - pd.DateOffset(months=int(period[:-2]))
+    if period.endswith("y"):
+        return today - pd.DateOffset(years=int(period[:-1]))
+    raise ValueError(f"Unsupported period: {period}")
+
+
+class DailyStore:
+    def __init__(self, path=STORE_PATH, fresh_seconds=FRESH_SECONDS):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.requests = 0  # yfinance への問い合わせ回数
+        self._locks = {}   # 銘柄ごとのロック（同じ銘柄を同時に取りに行かない）
+        self._locks_guard = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    # ---------------------------
+    # SQLite
+    # ---------------------------
+    @contextmanager
+    def _connect(self):
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with sqlite3.connect(self.path, timeout=30) as conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.executescript(_SCHEMA)
+                        if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+                            conn.execute("DELETE FROM daily_bars")
+                            conn.execute("DELETE FROM series_meta")
+                            conn.execute(f"PRAGMA user_version = {STORE_VERSION}")
+                    self._ready = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _meta(self, tickers):
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT ticker, covered_from, last_date, checked_at FROM series_meta "
+                f"WHERE ticker IN ({','.join('?' * len(tickers))})", tickers).fetchall()
+        return {r[0]: {"from": r[1], "last": r[2], "checked": r[3]} for r in rows}
+
+    def _ticker_locks(self, tickers):
+        with self._locks_guard:
+            return [self._locks.setdefault(t, threading.Lock()) for t in sorted(tickers)]
+
+    def _stored_closes(self, conn, ticker, since):
+        rows = conn.execute("SELECT date, close FROM daily_bars WHERE ticker = ? AND date >= ?",
+                            (ticker, since)).fetchall()
+        return dict(rows)
+
+    def _write(self, ticker, df, covered_from=None):
+        """
+        取得した足をマージする。covered_from を渡したら既存を捨てて入れ直す。
+        取得に失敗した（df が None / 空）ときは何もしない（保存済みの足と確認時刻はそのまま。次の呼び出しで取り直す）
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        replace = covered_from is not None
+        df = df.dropna(subset=["Close"]) if df is not None else None
+        if df is None or df.empty:
+            return
+        with self._connect() as conn:
+            if replace:
+                conn.execute("DELETE FROM daily_bars WHERE ticker = ?", (ticker,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(ticker, d.strftime("%Y-%m-%d"), *(None if pd.isna(v) else float(v) for v in row))
+                 for d, row in zip(df.index, df[COLUMNS].itertuples(index=False))])
+            last = conn.execute("SELECT MAX(date) FROM daily_bars WHERE ticker = ?", (ticker,)).fetchone()[0]
+            if replace:
+                conn.execute("INSERT OR REPLACE INTO series_meta VALUES (?, ?, ?, ?)",
+                             (ticker, covered_from.strftime("%Y-%m-%d"), last, now))
+            else:
+                conn.execute("UPDATE series_meta SET last_date = ?, checked_at = ? WHERE ticker = ?",
+                             (last, now, ticker))
+
+    def _download(self, tickers, start):
+        with self._locks_guard:
+            self.requests += 1
+        df = yf.download(tickers, start=start, auto_adjust=True, group_by="ticker",
+                         progress=False, threads=True, timeout=10)
+        return split_by_ticker(df, tickers)
+
+    # ---------------------------
+    # 差分同期
+    # ---------------------------
+    def sync(self, tickers, start):
+        """tickers の日足を start 以降について最新化する（必要な分だけ取得）"""
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return
+        start = pd.Timestamp(start).normalize()
+        locks = self._ticker_locks(tickers)
+        for lock in locks:
+            lock.acquire()
+        try:
+            self._sync_locked(tickers, start)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def _sync_locked(self, tickers, start):
+        now = datetime.now()
+        meta = self._meta(tickers)
+        cold, warm = [], []
+        for t in tickers:
+            m = meta.get(t)
+            if not m or not m["last"] or m["from"] > start.strftime("%Y-%m-%d"):
+                cold.append(t)
+            elif (now - datetime.fromisoformat(m["checked"])).total_seconds() >= self.fresh_seconds:
+                warm.append(t)
+
+        if cold:
+            # 未取得、または要求より古い期間が必要な銘柄は全期間を取り直す
+            frames = self._download(cold, start)
+            for t in cold:
+                self._write(t, frames.get(t), covered_from=start)
+
+        if warm:
+            # 保持している最終日の少し前から末尾だけを取得してマージ
+            tail_start = min(pd.Timestamp(meta[t]["last"]) for t in warm) - timedelta(days=OVERLAP_DAYS)
+            frames = self._download(warm, tail_start)
+            with self._connect() as conn:
+                refetch = [t for t in warm
+                           if frames.get(t) is not None and self._adjusted(conn, t, frames[t])]
+            for t in warm:
+                if t not in refetch:
+                    self._write(t, frames.get(t))
+            if refetch:
+                print(f"OHLCV store: history adjusted for {refetch}, refetching")
+                full_start = min(min(pd.Timestamp(meta[t]["from"]) for t in refetch), start)
+                frames = self._download(refetch, full_start)
+                for t in refetch:
+                    self._write(t, frames.get(t), covered_from=full_start)
+
+    def _adjusted(self, conn, ticker, df):
+        """重なり部分の終値が保存済みとずれていれば True（株式分割などで過去が修正された）"""
+        if df.empty:
+            return False
+        stored = self._stored_closes(conn, ticker, df.index[0].strftime("%Y-%m-%d"))
+        if not stored:
+            return False
+        latest = max(stored)  # 保存済みの最終日（ザラ場中の当日足）は値が動くので比較しない
+        for d, close in df["Close"].dropna().items():
+            key = d.strftime("%Y-%m-%d")
+            old = stored.get(key)
+            if old and key < latest and abs(close - old) / old > ADJUST_TOLERANCE:
+                return True
+        return False
+
+    # ---------------------------
+    # 読み出し
+    # ---------------------------
+    def read(self, ticker, start=None, end=None):
+        query = "SELECT date, open, high, low, close, volume FROM daily_bars WHERE ticker = ?"
+        params = [ticker]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            query += " AND date < ?"
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY date", params).fetchall()
+        df = pd.DataFrame(rows, columns=["Date"] + COLUMNS)
+        df["Date"] = pd.to_datetime(df["Date"])
+        return df.set_index("Date")
+
+    def history(self, ticker, start, end=None):
+        """1銘柄の日足（start 以降）。ストアを差分同期してから読む"""
+        self.sync([ticker], start)
+        return self.read(ticker, start, end)
+
+    def load_period(self, tickers, period):
+        """yfinance の period 指定相当の日足を {ticker: DataFrame} で返す"""
+        start = period_start(period)
+        self.sync(tickers, start)
+        return {t: self.read(t, start) for t in tickers}
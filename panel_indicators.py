@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ===============================
+# 複数銘柄まとめて（パネル）のインジケーター計算
+#
+# 入力は (銘柄数 × 日付数) の2次元配列。上場日の違いや欠損日は NaN で埋まっていてよい。
+# 各銘柄の「有効な足（Close が NaN でない足）」だけを右詰めにしてから計算し、
+# 元の位置に戻すので、1銘柄ずつ calc_sdi / calc_rsi_cutler を回したのと同じ値になる。
+# Pythonのループは銘柄数に比例せず、配列サイズに比例した1回の NumPy 計算で済む。
+# ===============================
+
+
+def _right_align(valid):
+    """各行の有効要素を（順序を保ったまま）右端に寄せる並び替えを返す"""
+    # False(0) が先・True(1) が後になる安定ソート
+    return np.argsort(valid, axis=1, kind="stable")
+
+
+def _take(a, order):
+    return np.take_along_axis(a, order, axis=1)
+
+
+def _restore(a, order):
+    out = np.empty_like(a)
+    np.put_along_axis(out, order, a, axis=1)
+    return out
+
+
+def _shift(a, n=1):
+    out = np.full_like(a, np.nan)
+    out[:, n:] = a[:, :-n]
+    return out
+
+
+def _diff(a):
+    return a - _shift(a)
+
+
+def _rolling_sum(a, period):
+    """pandas の rolling(period).sum() と同じく、窓に NaN を含むか足りなければ NaN"""
+    out = np.full(a.shape, np.nan)
+    if a.shape[1] >= period:
+        # 窓内に NaN があれば和も NaN になる
+        out[:, period - 1:] = sliding_window_view(a, period, axis=1).sum(axis=2)
+    return out
+
+
+def _ratio_index(num, den):
+    """100 - 100 / (1 + num/den)。den が 0 のときは NaN、0〜100 にクリップ"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = num / np.where(den == 0, np.nan, den)
+        return np.clip(100 - (100 / (1 + ratio)), 0, 100)
+
+
+# ===============================
+# インジケーター（右詰め済みの配列に対して計算）
+# ===============================
+def _sdi_aligned(high, low, close, volume, pad, period):
+    tp = (high + low + close) / 3.0
+    mf = tp * volume
+    delta = _diff(tp)
+    pos = np.where(delta > 0, mf, 0.0)
+    neg = np.abs(np.where(delta < 0, mf, 0.0))
+    # 詰め物の位置は「足が存在しない」ので窓に含まれたら NaN
+    pos[pad] = np.nan
+    neg[pad] = np.nan
+    return _ratio_index(_rolling_sum(pos, period), _rolling_sum(neg, period))
+
+
+def _rsi_aligned(close, pad, period):
+    delta = _diff(close)
+    gain = np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None))
+    loss = np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None))
+    gain[pad] = np.nan
+    loss[pad] = np.nan
+    return _ratio_index(_rolling_sum(gain, period) / period, _rolling_sum(loss, period) / period)
+
+
+def _signals_aligned(rsi, sdi):
+    """app.make_entry_signal と同じ A/B/C（RSI<50 & SDI<50 のときだけ点灯）"""
+    with np.errstate(invalid="ignore"):
+        prev_rsi, prev_sdi = _shift(rsi), _shift(sdi)
+        a = (prev_rsi < 30) & (rsi >= 30)
+        b = (prev_rsi <= prev_sdi) & (rsi > sdi)
+        cheap = (rsi < 50) & (sdi < 50)
+    return {"A": a & cheap, "B": b & cheap, "C": (a | b) & cheap}
+
+
+def panel_indicators(high, low, close, volume, period=14):
+    """
+    (銘柄 × 日付) の配列から SDI・RSI(14)・A/B/C シグナルをまとめて計算する。
+    戻り値の配列は入力と同じ形・同じ位置（無効な足の位置は NaN / False）
+    """
+    high, low, close, volume = (np.asarray(x, dtype=float) for x in (high, low, close, volume))
+    valid = ~np.isnan(close)
+    order = _right_align(valid)
+    pad = ~_take(valid, order)
+    h, l, c, v = (_take(x, order) for x in (high, low, close, volume))
+
+    sdi = _sdi_aligned(h, l, c, v, pad, period)
+    rsi = _rsi_aligned(c, pad, period)
+    signals = _signals_aligned(rsi, sdi)
+
+    out = {"SDI": _restore(sdi, order), "RSI14": _restore(rsi, order)}
+    for k, sig in signals.items():
+        out[k] = _restore(sig & ~pad, order)
+    return out
+
+
+def panel_last_valid(a):
+    """各行の最後の有効値と、その1つ前の有効値"""
+    a = np.asarray(a, dtype=float)
+    order = _right_align(~np.isnan(a))
+    aligned = _take(a, order)
+    return aligned[:, -1], aligned[:, -2] if a.shape[1] >= 2 else np.full(a.shape[0], np.nan)
+
+
+def panel_heat_score(volume_5m):
+    """
+    勢い（直近5分足の出来高 / 5分足平均）。get_heat_score と同じ定義
+    有効な足が2本未満の銘柄は NaN
+    """
+    volume_5m = np.asarray(volume_5m, dtype=float)
+    valid = ~np.isnan(volume_5m)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = np.nansum(volume_5m, axis=1) / count
+        last, _ = panel_last_valid(volume_5m)
+        score = np.where(avg > 0, last / avg, 1.0)
+    score[count < 2] = np.nan
+    return score, last
+
+
+def panel_change_pct(close_1d):
+    """前日比(%)。有効な終値が2本未満なら 0"""
+    last, prev = panel_last_valid(close_1d)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = np.where(prev > 0, (last - prev) / prev * 100, 0.0)
+    return np.nan_to_num(change, nan=0.0)
+
+
+# ===============================
+# DataFrame の辞書 <-> パネル
+# ===============================
+def to_panel(frames, tickers, fields):
+    """{ticker: DataFrame} を日付の和集合で揃えた {field: (銘柄 × 日付) 配列} にする"""
+    frames = {t: df for t, df in frames.items() if df is not None and not df.empty}
+    index = None
+    for df in frames.values():
+        index = df.index if index is None else index.union(df.index)
+    if index is None:
+        index = pd.DatetimeIndex([])
+    panel = {f: np.full((len(tickers), len(index)), np.nan) for f in fields}
+    for i, t in enumerate(tickers):
+        df = frames.get(t)
+        if df is None:
+            continue
+        aligned = df.reindex(index)
+        for f in fields:
+            if f in aligned.columns:
+                panel[f][i] = aligned[f].to_numpy(dtype=float)
+    return panel, index
+
+
+def screen_universe(tickers, daily_frames, intraday_frames=None, period=14):
+    """
+    監視銘柄全体の最新 SDI / RSI(14) / 当日シグナル / 勢い / 前日比 を1回で計算する。
+    戻り値: {ticker: {...}}（データの無い銘柄は含まない）
+    """
+    tickers = list(tickers)
+    daily, _ = to_panel(daily_frames, tickers, ["High", "Low", "Close", "Volume"])
+    ind = panel_indicators(daily["High"], daily["Low"], daily["Close"], daily["Volume"], period)
+    has_daily = ~np.isnan(daily["Close"]).all(axis=1)
+
+    # 各銘柄の最新の有効な足の位置
+    valid = ~np.isnan(daily["Close"])
+    last_pos = np.where(has_daily, valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1), 0)
+    change = panel_change_pct(daily["Close"])
+
+    heat = last_vol = None
+    if intraday_frames is not None:
+        intraday, _ = to_panel(intraday_frames, tickers, ["Volume"])
+        heat, last_vol = panel_heat_score(intraday["Volume"])
+
+    result = {}
+    for i, t in enumerate(tickers):
+        if not has_daily[i]:
+            continue
+        j = last_pos[i]
+        lit = [k for k in ("A", "B") if ind[k][i, j]]
+        result[t] = {
+            "sdi": None if np.isnan(ind["SDI"][i, j]) else round(float(ind["SDI"][i, j]), 2),
+            "rsi": None if np.isnan(ind["RSI14"][i, j]) else round(float(ind["RSI14"][i, j]), 2),
+            "signals": lit,  # 当日点灯したシグナル（C は A または B）
+            "change_pct": round(float(change[i]), 2),
+        }
+        if heat is not None:
+            result[t]["heat_score"] = None if np.isnan(heat[i]) else round(float(heat[i]), 2)
+            result[t]["last_vol"] = 0.0 if np.isnan(last_vol[i]) else float(last_vol[i])
+    return result
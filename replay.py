@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import pickle
+import random
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+from requests.adapters import HTTPAdapter
+
+import http_client
+from ohlcv_batch import flatten_columns, split_by_ticker
+
+# ===============================
+# 上流（Yahoo!ファイナンスJP の銘柄ページ / yfinance）の記録と再生
+#
+# record: 実際に取得しながら fixtures/ に保存する
+#   pages/<URL>.html          http_client 経由の HTML
+#   frames/<銘柄>_<期間>_<足>.pkl  yf.download の結果（銘柄ごと。start 指定の取得は期間 "start"）
+#   info/<銘柄>.json          yf.Ticker().info
+# replay: ネットワークに出ず fixtures から返す。遅延（秒）を足して上流の待ち時間を再現できる
+#
+#   python replay.py record 7203 285A --app   # 静的レポートと Dash の両方の経路で記録
+#   python replay.py synth 7203 285A          # オフライン用の合成 fixtures を作る
+# ===============================
+FIXTURE_DIR = os.environ.get("FIXTURE_DIR", "fixtures")
+START_PERIOD = "start"  # start= 指定の取得（日足ストアの同期）の保存名
+
+_ORIGINAL = {"download": yf.download, "Ticker": yf.Ticker}
+_STATS = {"pages": 0, "frames": 0, "info": 0, "misses": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _count(key):
+    with _STATS_LOCK:
+        _STATS[key] += 1
+
+
+def replay_stats():
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+def _safe(text):
+    return re.sub(r"[^0-9A-Za-z.]+", "_", text).strip("_")
+
+
+def page_path(fixture_dir, url):
+    u = urlparse(url)
+    name = _safe(u.netloc + u.path + (f"_{u.query}" if u.query else ""))
+    return os.path.join(fixture_dir, "pages", f"{name}.html")
+
+
+def frame_path(fixture_dir, ticker, period, interval):
+    return os.path.join(fixture_dir, "frames", f"{_safe(ticker)}_{period}_{interval}.pkl")
+
+
+def info_path(fixture_dir, ticker):
+    return os.path.join(fixture_dir, "info", f"{_safe(ticker)}.json")
+
+
+def _tickers(tickers):
+    if isinstance(tickers, str):
+        return tickers.split()
+    return list(tickers)
+
+
+def _write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{threading.get_ident()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# ===============================
+# 記録
+# ===============================
+class RecordingAdapter(HTTPAdapter):
+    """通常どおり送信し、200 の応答本文を fixtures に保存する"""
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.fixture_dir = fixture_dir
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            _write_bytes(page_path(self.fixture_dir, request.url), response.content)
+            _count("pages")
+        return response
+
+
+def _recording_download(fixture_dir):
+    def download(tickers, *args, **kwargs):
+        df = _ORIGINAL["download"](tickers, *args, **kwargs)
+        names = _tickers(tickers)
+        period = kwargs.get("period") or (START_PERIOD if kwargs.get("start") is not None else "1mo")
+        interval = kwargs.get("interval", "1d")
+        if kwargs.get("group_by") == "ticker":
+            frames = split_by_ticker(df, names)
+        else:
+            frames = {names[0]: flatten_columns(df.copy())} if df is not None and not df.empty else {}
+        for t, frame in frames.items():
+            _write_bytes(frame_path(fixture_dir, t, period, interval), pickle.dumps(frame))
+            _count("frames")
+        return df
+    return download
+
+
+def _recording_ticker(fixture_dir):
+    class RecordingTicker(_ORIGINAL["Ticker"]):
+        @property
+        def info(self):
+            info = super().info
+            _write_bytes(info_path(fixture_dir, self.ticker),
+                         json.dumps(info, ensure_ascii=False, default=str).encode("utf-8"))
+            _count("info")
+            return info
+    return RecordingTicker
+
+
+def record(fixture_dir=FIXTURE_DIR):
+    """以降の取得を実際に行いつつ fixtures に保存する"""
+    http_client.set_transport(RecordingAdapter(fixture_dir))
+    yf.download = _recording_download(fixture_dir)
+    yf.Ticker = _recording_ticker(fixture_dir)
+
+
+# ===============================
+# 再生
+# ===============================
+class Latency:
+    """注入する遅延（秒）: base + 0〜jitter の一様乱数"""
+
+    def __init__(self, base=0.0, jitter=0.0, seed=None):
+        self.base = base
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if self.base <= 0 and self.jitter <= 0:
+            return
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+        time.sleep(self.base + extra)
+
+
+class ReplayAdapter(HTTPAdapter):
+    """fixtures の HTML を返す（無ければ 404）"""
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, latency=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fixture_dir = fixture_dir
+        self.latency = latency or Latency()
+
+    def send(self, request, **kwargs):
+        self.latency.wait()
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        try:
+            with open(page_path(self.fixture_dir, request.url), "rb") as f:
+                response._content = f.read()
+            response.status_code = 200
+            response.headers["Content-Type"] = "text/html; charset=utf-8"
+            _count("pages")
+        except OSError:
+            response._content = b""
+            response.status_code = 404
+            _count("misses")
+        return response
+
+
+def _load_frame(fixture_dir, ticker, period, interval, start=None):
+    try:
+        with open(frame_path(fixture_dir, ticker, period, interval), "rb") as f:
+            frame = pickle.load(f)
+    except OSError:
+        return None
+    if start is not None and not frame.empty:
+        start = pd.Timestamp(start)
+        if frame.index.tz is not None and start.tz is None:
+            start = start.tz_localize(frame.index.tz)
+        frame = frame[frame.index >= start]
+    return frame.copy()
+
+
+def _replay_download(fixture_dir, latency):
+    def download(tickers, *args, **kwargs):
+        latency.wait()
+        names = _tickers(tickers)
+        start = kwargs.get("start")
+        period = kwargs.get("period") or (START_PERIOD if start is not None else "1mo")
+        interval = kwargs.get("interval", "1d")
+        frames = {}
+        for t in names:
+            frame = _load_frame(fixture_dir, t, period, interval, start)
+            if frame is None:
+                _count("misses")
+                continue
+            _count("frames")
+            frames[t] = frame
+        if not frames:
+            return pd.DataFrame()
+        if kwargs.get("group_by") == "ticker":
+            return pd.concat(frames, axis=1)
+        return frames[names[0]] if names[0] in frames else pd.DataFrame()
+    return download
+
+
+def _replay_ticker(fixture_dir, latency):
+    class ReplayTicker:
+        def __init__(self, ticker, *args, **kwargs):
+            self.ticker = ticker
+
+        @property
+        def info(self):
+            latency.wait()
+            try:
+                with open(info_path(fixture_dir, self.ticker), encoding="utf-8") as f:
+                    info = json.load(f)
+                _count("info")
+                return info
+            except OSError:
+                _count("misses")
+                return {}
+    return ReplayTicker
+
+
+def replay(fixture_dir=FIXTURE_DIR, page_latency=0.0, ohlcv_latency=0.0, jitter=0.0, seed=0):
+    """以降の取得を fixtures から返す（ネットワークに出ない）"""
+    reset_replay_stats()
+    http_client.set_transport(ReplayAdapter(fixture_dir, Latency(page_latency, jitter, seed)))
+    ohlcv = Latency(ohlcv_latency, jitter, seed)
+    yf.download = _replay_download(fixture_dir, ohlcv)
+    yf.Ticker = _replay_ticker(fixture_dir, ohlcv)
+
+
+def uninstall():
+    """記録・再生をやめて通常の取得に戻す"""
+    http_client.set_transport(None)
+    yf.download = _ORIGINAL["download"]
+    yf.Ticker = _ORIGINAL["Ticker"]
+
+
+def reset_replay_stats():
+    with _STATS_LOCK:
+        for k in _STATS:
+            _STATS[k] = 0
+
+
+# ===============================
+# オフライン用の合成 fixtures（ネットワークに出られない環境でのベンチ用）
+# ===============================
+SYNTH_INTRADAY = {("5d", "1m"): 330 * 5, ("5d", "5m"): 66 * 5, ("1d", "1m"): 330}
+SYNTH_DAILY_DAYS = 520
+
+
+def _walk(rng, n, start):
+    close = start * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.002, n)), "High": close * 1.01, "Low": close * 0.99,
+        "Close": close, "Adj Close": close, "Volume": rng.integers(1_000, 500_000, n).astype(float),
+    })
+
+
+def synthesize(codes, fixture_dir=FIXTURE_DIR, seed=0):
+    from bench_quote_parse import make_page
+    from generate_static_report import normalize_ticker
+    from yahoo_quote import QUOTE_URL
+
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now().normalize()
+    for code in codes:
+        ticker = normalize_ticker(code)
+        daily = _walk(rng, SYNTH_DAILY_DAYS, rng.uniform(300, 20_000))
+        daily.index = pd.bdate_range(end=end, periods=SYNTH_DAILY_DAYS)
+        for period, days in (("5d", 5), ("1mo", 21), ("3mo", 63), ("6mo", 126), ("2y", SYNTH_DAILY_DAYS)):
+            _write_bytes(frame_path(fixture_dir, ticker, period, "1d"), pickle.dumps(daily.iloc[-days:]))
+        _write_bytes(frame_path(fixture_dir, ticker, START_PERIOD, "1d"), pickle.dumps(daily))
+        last = float(daily["Close"].iloc[-1])
+        for (period, interval), n in SYNTH_INTRADAY.items():
+            bars = _walk(rng, n, last)
+            minutes = 1 if interval == "1m" else 5
+            bars.index = pd.date_range(end=end + pd.Timedelta(hours=15), periods=n,
+                                       freq=f"{minutes}min", tz="Asia/Tokyo")
+            _write_bytes(frame_path(fixture_dir, ticker, period, interval), pickle.dumps(bars))
+        page = make_page(True, code=ticker.replace(".T", ""), name=f"合成{ticker}(株)", price=f"{last:,.1f}")
+        _write_bytes(page_path(fixture_dir, QUOTE_URL.format(ticker=ticker)), page)
+        _write_bytes(info_path(fixture_dir, ticker),
+                     json.dumps({"shortName": f"SYNTH {ticker}"}).encode("utf-8"))
+    print(f"Synthesized fixtures for {len(codes)} tickers in {fixture_dir}/")
+
+
+# ===============================
+# CLI
+# ===============================
+def record_pipeline(codes, with_app=False, workers=4):
+    """静的レポート（と Dash のコールバック）と同じ経路で取得して記録する"""
+    import generate_static_report as g
+
+    tickers = [g.normalize_ticker(c) for c in codes]
+    g.prefetch_ohlcv(tickers)
+    g.screen_tickers(tickers)
+    g.run_tickers(tickers, workers)
+    if with_app:
+        import app
+        for code in codes:
+            app.update(code)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="上流の応答を fixtures に記録する / 合成する")
+    parser.add_argument("command", choices=["record", "synth"])
+    parser.add_argument("codes", nargs="*", help="銘柄コード（省略時は監視銘柄リスト）")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--app", action="store_true", help="Dash のコールバックの経路でも記録する")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    codes = args.codes
+    if not codes:
+        from generate_static_report import TARGET_TICKERS
+        codes = TARGET_TICKERS
+
+    if args.command == "synth":
+        synthesize(codes, args.fixtures)
+        return 0
+
+    # 記録中は HTTP キャッシュを通さない（全応答を実際に取得して保存する）
+    record(args.fixtures)
+    try:
+        record_pipeline(codes, args.app, args.workers)
+    finally:
+        uninstall()
+    stats = replay_stats()
+    print(f"Recorded {stats['pages']} pages, {stats['frames']} frames, {stats['info']} info into {args.fixtures}/")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,20 @@
 import time
+import argparse
+import traceback
 import subprocess
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
+
+import jpx_calendar
+
+# 常駐モードの状態（レポート生成モジュールは最初の周期で1回だけ import する）
+_WORKER = {"module": None, "cycles": 0, "cold": None, "warm": []}
 
 def is_market_hours():
-    """現在時刻が平日の 9:00 - 15:30 (JST) かどうかを判定"""
-    # 日本時間 (JST = UTC+9) の生成
-    JST = timezone(timedelta(hours=9))
-    now = datetime.now(JST)
-    
-    # 平日判定 (0=月, 4=金, 5=土, 6=日)
-    if now.weekday() >= 5:
-        return False
-    
-    # 時間判定
-    start_time = now.replace(hour=9, minute=0, second=0, microsecond=0)
-    end_time = now.replace(hour=18, minute=0, second=0, microsecond=0)
-    
-    return start_time <= now <= end_time
+    """現在がレポートを更新するフェーズ（東証の営業日の立会時間前後）かどうかを判定"""
+    return jpx_calendar.is_refresh_window()
 
-def run_update():
-    """レポート生成プログラムを実行"""
+def run_update_subprocess():
+    """レポート生成プログラムを別プロセスで実行（毎回 import し直す従来の方式）"""
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 更新を開始します...")
     try:
         # generate_static_report.py を実行
@@ -31,20 +26,75 @@ def run_update():
     except Exception as e:
         print(f"実行中に例外が発生しました: {e}")
 
-def main():
+def run_update_resident():
+    """
+    レポート生成をこのプロセス内で実行する。
+    pandas / yfinance などの import、HTTP セッション、キャッシュは周期をまたいで使い回す。
+    1回の失敗でループが止まらないよう、例外はここで受け止める
+    """
+    started = time.perf_counter()
+    cold = _WORKER["module"] is None
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 更新を開始します... ({'cold' if cold else 'warm'})")
+    ok = False
+    try:
+        if cold:
+            import generate_static_report
+            _WORKER["module"] = generate_static_report
+            print(f"レポート生成モジュールを読み込みました ({time.perf_counter() - started:.1f}s)")
+        _WORKER["module"].main([])
+        ok = True
+        print("更新が正常に完了しました。")
+    except Exception:
+        print(f"更新中にエラーが発生しました:\n{traceback.format_exc()}")
+
+    elapsed = time.perf_counter() - started
+    _WORKER["cycles"] += 1
+    if cold and ok:
+        _WORKER["cold"] = elapsed
+    elif ok:
+        _WORKER["warm"].append(elapsed)
+    log_cycle_time(elapsed, cold, ok)
+
+def log_cycle_time(elapsed, cold, ok):
+    """周期ごとの所要時間（cold = 初回 / warm = 2回目以降）"""
+    status = "OK" if ok else "ERROR"
+    line = f"cycle #{_WORKER['cycles']} {'cold' if cold else 'warm'} {status} {elapsed:.1f}s"
+    warm = _WORKER["warm"]
+    if warm:
+        line += f" | warm avg {sum(warm) / len(warm):.1f}s ({len(warm)} runs)"
+    if _WORKER["cold"] is not None:
+        line += f" | cold {_WORKER['cold']:.1f}s"
+    print(line)
+
+UPDATERS = {
+    "resident": run_update_resident,
+    "subprocess": run_update_subprocess,
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="株需給レポートの定期更新スケジューラー")
+    parser.add_argument("--mode", choices=sorted(UPDATERS), default="resident",
+                        help="resident: 同じプロセス内で実行し続ける (既定) / subprocess: 毎回別プロセスで実行")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    run_update = UPDATERS[args.mode]
     print("株需給レポート定期更新スケジューラーを起動しました。")
-    print("条件: 平日 9:00 - 18:00 (JST) の間、10分おきに実行")
+    print("条件: 東証の営業日のみ。寄り付き・大引け前後は5分、ザラ場は10分、引け後は30分おき（昼休み・夜間・休場日は停止）")
+    print(f"実行方式: {args.mode}")
     
     while True:
-        if is_market_hours():
+        now = jpx_calendar.now_jst()
+        phase = jpx_calendar.session_phase(now)
+        if jpx_calendar.refresh_interval(phase) is not None:
             run_update()
-            print("次の更新まで10分待機します...")
-            time.sleep(600)  # 10分 (600秒)
-        else:
-            # 市場時間外の場合は5分おきにチェック
-            now_jst = datetime.now(timezone(timedelta(hours=9)))
-            print(f"[{now_jst.strftime('%H:%M:%S')}] 現在は市場時間外です。5分後に再確認します。")
-            time.sleep(300)  # 5分 (300秒)
+        # 間隔は更新の開始時刻から数える（実行にかかった時間は差し引く）
+        elapsed = (jpx_calendar.now_jst() - now).total_seconds()
+        wait = max(1, int(jpx_calendar.seconds_until_next_refresh(now) - elapsed))
+        resume = jpx_calendar.now_jst() + timedelta(seconds=wait)
+        print(f"[{now.strftime('%H:%M:%S')}] phase={phase} 次の更新は {resume.strftime('%m/%d %H:%M')} ({wait // 60}分後)")
+        time.sleep(wait)
 
 if __name__ == "__main__":
     main()
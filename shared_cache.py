@@ -0,0 +1,218 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# ===============================
+# プロセス間で共有するキャッシュ（gunicorn の複数ワーカー用）
+#
+# - SQLite（WAL）に pickle した値を有効期限つきで保存し、全ワーカーが読み書きする
+# - ロック表で「同じキーを取りに行くのは1ワーカーだけ」にし、他のワーカーは結果が入るのを待つ
+#   （取得中のプロセスが死んでいればすぐ、そうでなくてもロックは LOCK_SECONDS で期限切れになり、別のワーカーが引き継ぐ。
+#    打ち切られた Dash のバックグラウンドジョブがロックを持ったまま消えても待たされない）
+# - 値の実体はディスク上の1か所だけなので、ワーカーを増やしても各プロセスのメモリは増えない
+#   （TTLCache の2段目として使い、1段目のプロセス内キャッシュは小さく保つ）
+# ===============================
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", os.path.join(".cache", "shared_cache.sqlite"))
+LOCK_SECONDS = 60      # 1回の取得にかかってよい最大時間
+POLL_SECONDS = 0.05    # 他のワーカーの取得を待つ間隔
+PURGE_EVERY = 200      # 書き込みこの回数ごとに期限切れを掃除する
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS locks (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def _pid_alive(pid):
+    """同じホストのプロセスが生きているか（終了して回収待ちのゾンビは死んだとみなす）"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return f.read().rsplit(b")", 1)[1].split()[0] != b"Z"
+    except (OSError, IndexError):
+        return True
+
+
+class SharedCache:
+    def __init__(self, path=SHARED_CACHE_PATH, lock_seconds=LOCK_SECONDS):
+        self.path = os.path.abspath(path)  # 作業ディレクトリが変わっても同じファイルを使う
+        self.lock_seconds = lock_seconds
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "waits": 0, "takeovers": 0, "errors": 0}
+        self._writes = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    # ---------------------------
+    # SQLite（スレッド・プロセスごとに接続を持つ。fork 後は作り直す）
+    # ---------------------------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _owner(self):
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    # ---------------------------
+    # 値
+    # ---------------------------
+    def get(self, key):
+        """有効な値があれば返す（無ければ None）"""
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def contains(self, key):
+        """有効な値があるか（値は読まない）"""
+        row = self._connect().execute(
+            "SELECT 1 FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row is not None
+
+    def put(self, kind, key, value, ttl):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, kind, time.time() + ttl, blob))
+        with self._stats_lock:
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        if purge:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+
+    def invalidate(self, kind=None):
+        conn = self._connect()
+        if kind is None:
+            conn.execute("DELETE FROM entries")
+        else:
+            conn.execute("DELETE FROM entries WHERE kind = ?", (kind,))
+
+    # ---------------------------
+    # プロセス間ロック
+    # ---------------------------
+    def _try_lock(self, key, seconds=None):
+        now = time.time()
+        cur = self._connect().execute(
+            "INSERT INTO locks VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE locks.expires_at <= ?",
+            (key, self._owner(), now + (seconds or self.lock_seconds), now))
+        return cur.rowcount == 1
+
+    def claim(self, key, seconds):
+        """
+        key を seconds 秒だけ押さえる（取れたら True）。外さずに期限切れを待つので、
+        「この間隔で1プロセスだけがやる」処理（先読みのウォームアップなど）に使う
+        """
+        self._clear_dead_lock(key)
+        return self._try_lock(key, seconds)
+
+    def _locked_by_other(self, key):
+        row = self._connect().execute(
+            "SELECT 1 FROM locks WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row is not None
+
+    def _clear_dead_lock(self, key):
+        """ロックを持っているプロセスが死んでいたら外す（外したら True）"""
+        row = self._connect().execute(
+            "SELECT owner FROM locks WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        if row is None:
+            return False
+        try:
+            pid = int(row[0].split(":", 1)[0])
+        except ValueError:
+            return False
+        if pid == os.getpid() or _pid_alive(pid):
+            return False
+        cur = self._connect().execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, row[0]))
+        return cur.rowcount == 1
+
+    def _unlock(self, key):
+        self._connect().execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, self._owner()))
+
+    def get_or_load(self, kind, key, loader, ttl):
+        """
+        共有キャッシュにあれば返す。無ければロックを取ったワーカーだけが loader() を呼んで保存し、
+        他のワーカーはその結果を待って読む
+        """
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+        self._count("misses")
+
+        waited = False
+        deadline = time.monotonic() + self.lock_seconds
+        while True:
+            if self._try_lock(key):
+                if waited:
+                    self._count("takeovers")
+                try:
+                    # ロックを待っている間に他のワーカーが入れたかもしれない
+                    value = self.get(key)
+                    if value is not None:
+                        return value
+                    self._count("loads")
+                    value = loader()
+                    if value is not None:
+                        self.put(kind, key, value, ttl)
+                    return value
+                except Exception:
+                    self._count("errors")
+                    raise
+                finally:
+                    self._unlock(key)
+
+            if not waited:
+                waited = True
+                self._count("waits")
+            time.sleep(POLL_SECONDS)
+            value = self.get(key)
+            if value is not None:
+                return value
+            if self._clear_dead_lock(key):
+                continue
+            if time.monotonic() > deadline and self._locked_by_other(key):
+                # 取得中のワーカーが長すぎる。待たずに自分で取る（共有キャッシュには書かない）
+                return loader()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        try:
+            row = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries WHERE expires_at > ?",
+                (time.time(),)).fetchone()
+            stats["entries"], stats["bytes"] = row
+        except sqlite3.Error:
+            pass
+        return stats
@@ -0,0 +1,224 @@
+import json
+import math
+import os
+from collections import deque
+
+# ===============================
+# 逐次更新型のインジケーター（SDI / Cutler RSI）
+#
+# app.calc_sdi / app.calc_rsi_cutler と同じ値を、過去全体を再計算せずに
+# 新しい足を1本追加するごとに定数時間で更新する。
+#   - push(...)  : 新しい足を追加
+#   - amend(...) : 最新の足を差し替え（ザラ場中の当日足の更新）
+# 状態は to_state()/from_state() で JSON に保存・復元できる。
+# ===============================
+NAN = float("nan")
+
+
+def _isnan(x):
+    return x is None or x != x
+
+
+def _clip(v):
+    return v if _isnan(v) else min(max(v, 0.0), 100.0)
+
+
+class RollingWindow:
+    """固定長のリングバッファ。満杯かつ NaN を含まないときだけ合計を返す（pandas の rolling と同じ扱い）"""
+    __slots__ = ("size", "values")
+
+    def __init__(self, size, values=()):
+        self.size = size
+        self.values = deque((NAN if v is None else v for v in values), maxlen=size)
+
+    def append(self, v):
+        self.values.append(v)
+
+    def replace_last(self, v):
+        self.values[-1] = v
+
+    def sum(self):
+        if len(self.values) < self.size or any(_isnan(v) for v in self.values):
+            return NAN
+        # 窓幅ぶんの正確な和（窓幅は固定なので定数時間）
+        return math.fsum(self.values)
+
+    def to_state(self):
+        return [None if _isnan(v) else v for v in self.values]
+
+
+class StreamingRSI:
+    """RSI（Cutler / SMA版）。calc_rsi_cutler と同じ定義"""
+    __slots__ = ("period", "gains", "losses", "last", "prev", "last_key", "value")
+
+    def __init__(self, period=14):
+        self.period = period
+        self.gains = RollingWindow(period)
+        self.losses = RollingWindow(period)
+        self.last = None       # 最新足の終値
+        self.prev = None       # その1本前の終値（amend 用）
+        self.last_key = None   # 最新足の日付など（呼び出し側のキー）
+        self.value = NAN
+
+    def _diff(self, close, base):
+        if base is None or _isnan(close) or _isnan(base):
+            return NAN, NAN
+        delta = close - base
+        return max(delta, 0.0), max(-delta, 0.0)
+
+    def _calc(self):
+        gain_sum = self.gains.sum()
+        loss_sum = self.losses.sum()
+        if _isnan(gain_sum) or _isnan(loss_sum) or loss_sum == 0:
+            self.value = NAN
+        else:
+            rs = (gain_sum / self.period) / (loss_sum / self.period)
+            self.value = _clip(100 - (100 / (1 + rs)))
+        return self.value
+
+    def push(self, close, key=None):
+        close = NAN if close is None else float(close)
+        gain, loss = self._diff(close, self.last)
+        self.gains.append(gain)
+        self.losses.append(loss)
+        self.prev, self.last, self.last_key = self.last, close, key
+        return self._calc()
+
+    def amend(self, close, key=None):
+        """最新の足を差し替える（まだ1本も無ければ push と同じ）"""
+        if self.last_key is None and self.last is None:
+            return self.push(close, key)
+        close = NAN if close is None else float(close)
+        gain, loss = self._diff(close, self.prev)
+        self.gains.replace_last(gain)
+        self.losses.replace_last(loss)
+        self.last = close
+        if key is not None:
+            self.last_key = key
+        return self._calc()
+
+    def to_state(self):
+        return {
+            "kind": "rsi", "period": self.period,
+            "gains": self.gains.to_state(), "losses": self.losses.to_state(),
+            "last": None if _isnan(self.last) else self.last,
+            "prev": None if _isnan(self.prev) else self.prev,
+            "last_key": self.last_key,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        obj = cls(state["period"])
+        obj.gains = RollingWindow(obj.period, state["gains"])
+        obj.losses = RollingWindow(obj.period, state["losses"])
+        obj.last, obj.prev, obj.last_key = state["last"], state["prev"], state["last_key"]
+        obj._calc()
+        return obj
+
+
+class StreamingSDI:
+    """SDI（MFIベース）。calc_sdi と同じ定義"""
+    __slots__ = ("period", "pos", "neg", "last_tp", "prev_tp", "last_key", "value")
+
+    def __init__(self, period=14):
+        self.period = period
+        self.pos = RollingWindow(period)
+        self.neg = RollingWindow(period)
+        self.last_tp = None
+        self.prev_tp = None
+        self.last_key = None
+        self.value = NAN
+
+    @staticmethod
+    def _flows(tp, mf, base):
+        # calc_sdi と同様、前日との差が NaN の場合は 0 として扱う
+        delta = NAN if base is None or _isnan(base) or _isnan(tp) else tp - base
+        pos = mf if (not _isnan(delta) and delta > 0) else 0.0
+        neg = abs(mf) if (not _isnan(delta) and delta < 0) else 0.0
+        return pos, neg
+
+    def _calc(self):
+        pos_sum = self.pos.sum()
+        neg_sum = self.neg.sum()
+        if _isnan(pos_sum) or _isnan(neg_sum) or neg_sum == 0:
+            self.value = NAN
+        else:
+            self.value = _clip(100 - (100 / (1 + pos_sum / neg_sum)))
+        return self.value
+
+    @staticmethod
+    def _tp_mf(high, low, close, volume):
+        vals = [NAN if v is None else float(v) for v in (high, low, close, volume)]
+        tp = (vals[0] + vals[1] + vals[2]) / 3.0
+        return tp, tp * vals[3]
+
+    def push(self, high, low, close, volume, key=None):
+        tp, mf = self._tp_mf(high, low, close, volume)
+        pos, neg = self._flows(tp, mf, self.last_tp)
+        self.pos.append(pos)
+        self.neg.append(neg)
+        self.prev_tp, self.last_tp, self.last_key = self.last_tp, tp, key
+        return self._calc()
+
+    def amend(self, high, low, close, volume, key=None):
+        if self.last_key is None and self.last_tp is None:
+            return self.push(high, low, close, volume, key)
+        tp, mf = self._tp_mf(high, low, close, volume)
+        pos, neg = self._flows(tp, mf, self.prev_tp)
+        self.pos.replace_last(pos)
+        self.neg.replace_last(neg)
+        self.last_tp = tp
+        if key is not None:
+            self.last_key = key
+        return self._calc()
+
+    def to_state(self):
+        return {
+            "kind": "sdi", "period": self.period,
+            "pos": self.pos.to_state(), "neg": self.neg.to_state(),
+            "last_tp": None if _isnan(self.last_tp) else self.last_tp,
+            "prev_tp": None if _isnan(self.prev_tp) else self.prev_tp,
+            "last_key": self.last_key,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        obj = cls(state["period"])
+        obj.pos = RollingWindow(obj.period, state["pos"])
+        obj.neg = RollingWindow(obj.period, state["neg"])
+        obj.last_tp, obj.prev_tp, obj.last_key = state["last_tp"], state["prev_tp"], state["last_key"]
+        obj._calc()
+        return obj
+
+
+_KINDS = {"rsi": StreamingRSI, "sdi": StreamingSDI}
+
+
+# ===============================
+# 状態の保存・復元（スケジューラーの実行間で引き継ぐ）
+# ===============================
+def save_states(path, engines):
+    """{名前: インジケーター} を JSON に保存する"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({name: eng.to_state() for name, eng in engines.items()}, f)
+    os.replace(tmp, path)
+
+
+def load_states(path):
+    """save_states で保存した状態を読み込む。無い・壊れている場合は空"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    engines = {}
+    for name, state in raw.items():
+        cls = _KINDS.get(state.get("kind"))
+        if cls is not None:
+            try:
+                engines[name] = cls.from_state(state)
+            except (KeyError, TypeError):
+                continue
+    return engines
@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import time
+
+# app を読み込むと上流のキャッシュなどを作るので、作業ディレクトリを一時フォルダにする
+os.chdir(tempfile.mkdtemp(prefix="test_background_jobs_"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app
+
+# ===============================
+# app.JobManager（DiskcacheManager の上書き）が使っている dash の振る舞いの確認
+# ジョブを起動して結果をポーリングで受け取る / 走っているジョブを止める。
+# dash を上げるときはこれを通すこと:  python test_background_jobs.py  （pytest でも動く）
+# ===============================
+
+
+def slow_double(x):
+    time.sleep(x)
+    return x * 2
+
+
+def _start(manager, key, x):
+    job_fn = manager.make_job_fn(slow_double, False)
+    return manager.call_job_fn(key, job_fn, [x], {"args": {}})
+
+
+def _poll(manager, key, job, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = manager.get_result(key, job)
+        if result is not manager.UNDEFINED:
+            return result
+        time.sleep(0.1)
+    raise AssertionError(f"job {job} did not finish in {timeout}s")
+
+
+def test_start_poll_cancel():
+    manager = app.make_job_manager(path=os.path.join(tempfile.mkdtemp(), "jobs"))
+
+    job = _start(manager, "done", 0.2)
+    assert _poll(manager, "done", job) == 0.4
+    # get_result の後始末でジョブは止まっている
+    time.sleep(0.5)
+    assert not manager.job_running(job)
+
+    job = _start(manager, "cancelled", 30)
+    time.sleep(0.5)
+    assert manager.job_running(job)
+    manager.terminate_job(job)
+    deadline = time.monotonic() + 5
+    while manager.job_running(job) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not manager.job_running(job)
+    assert manager.get_result("cancelled", job) is manager.UNDEFINED
+
+    # 消えたジョブ・おかしな値でも例外にならない
+    manager.terminate_job(job)
+    assert not manager.job_running(job)
+    assert not manager.job_running(None)
+
+
+if __name__ == "__main__":
+    test_start_poll_cancel()
+    print("OK")
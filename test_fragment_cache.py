@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fragment_cache import FragmentCache
+
+# ===============================
+# HTML 断片キャッシュのキーと保存の確認
+# 描画関数（テンプレート）・入力・バージョンのどれかが変われば描き直し、同じなら使い回す
+#   python test_fragment_cache.py   （pytest でも動く）
+# ===============================
+
+
+def render_row(code, price):
+    return f"<tr><td>{code}</td><td>{price:,.1f}</td></tr>"
+
+
+def render_row_same(code, price):
+    return f"<tr><td>{code}</td><td>{price:,.1f}</td></tr>"
+
+
+def render_row_changed(code, price):
+    return f"<tr class=\"row\"><td>{code}</td><td>{price:,.1f}</td></tr>"
+
+
+def _cache(path=None, **kwargs):
+    return FragmentCache(path or os.path.join(tempfile.mkdtemp(prefix="test_fragment_cache_"), "fragments.json"),
+                         **kwargs)
+
+
+def test_key_follows_renderer_template():
+    cache = _cache()
+    inputs = {"code": "7203", "price": 2876.5}
+    key = cache.key("row", render_row, inputs)
+    assert cache.key("row", render_row_same, inputs) == key          # 同じ中身の関数なら同じキー
+    assert cache.key("row", render_row_changed, inputs) != key       # テンプレートを変えたらキーも変わる
+    assert cache.key("row", render_row, {"code": "7203", "price": 2877.0}) != key
+    assert cache.key("tile", render_row, inputs) != key
+    assert _cache(version=cache.version + 1).key("row", render_row, inputs) != key
+
+
+def test_render_reuses_and_numpy_inputs():
+    cache = _cache()
+    first = cache.render("row", render_row, code="7203", price=np.float64(2876.5))
+    again = cache.render("row", render_row, code="7203", price=2876.5)
+    assert first == again
+    assert cache.stats() == {"rendered": 1, "reused": 1, "entries": 1}
+    cache.render("row", render_row_changed, code="7203", price=2876.5)
+    assert cache.stats()["rendered"] == 2
+
+
+def test_save_keeps_only_used_fragments():
+    path = os.path.join(tempfile.mkdtemp(prefix="test_fragment_cache_"), "fragments.json")
+    cache = _cache(path)
+    cache.render("row", render_row, code="7203", price=1.0)
+    cache.render("row", render_row, code="6501", price=2.0)
+    cache.save()
+
+    # 次の実行で 7203 だけ使ったら、6501 の断片は捨てる
+    cache = _cache(path)
+    cache.begin_run()
+    cache.render("row", render_row, code="7203", price=1.0)
+    assert cache.stats()["reused"] == 1
+    cache.save()
+    assert _cache(path).stats()["entries"] == 1
+
+    # バージョンが違う保存ファイルは読まない
+    assert _cache(path, version=_cache(path).version + 1).stats()["entries"] == 0
+
+
+if __name__ == "__main__":
+    test_key_follows_renderer_template()
+    test_render_reuses_and_numpy_inputs()
+    test_save_keeps_only_used_fragments()
+    print("OK")
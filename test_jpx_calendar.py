@@ -0,0 +1,96 @@
+import contextlib
+import io
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jpx_calendar as cal
+
+# ===============================
+# 東証カレンダー・フェーズ・cron ゲートの境界の確認
+#   python test_jpx_calendar.py   （pytest でも動く）
+# ===============================
+
+
+def jst(*args):
+    return datetime(*args, tzinfo=cal.JST)
+
+
+def test_holiday_table():
+    for day in cal.JPX_HOLIDAYS:
+        d = date.fromisoformat(day)
+        assert d.weekday() < 5, f"{day} is a weekend; the table only lists weekday holidays"
+        assert d.year <= cal.HOLIDAY_TABLE_LAST_YEAR
+    # 年末年始（12/31〜1/3）が平日なら休場
+    for year in range(2025, cal.HOLIDAY_TABLE_LAST_YEAR + 1):
+        for d in (date(year, 1, 1), date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)):
+            assert not cal.is_trading_day(d), d
+    assert cal.is_trading_day(date(2026, 10, 16))       # 金曜
+    assert not cal.is_trading_day(date(2026, 10, 17))   # 土曜
+    assert not cal.is_trading_day(date(2026, 10, 12))   # スポーツの日
+
+
+def test_past_table_warns_once_per_year():
+    assert cal.HOLIDAY_TABLE_LAST_YEAR < 2028  # 表を延ばしたら年を進める
+    cal._WARNED_YEARS.clear()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        # 表より先の年は土日だけで判定する（平日5日ぶん呼んでも警告は1回）
+        for day in range(10, 15):
+            assert cal.is_trading_day(date(2028, 1, day))
+    assert out.getvalue().count("Warning") == 1
+
+
+def test_session_phase_boundaries():
+    cases = {
+        (8, 59): "pre_open", (9, 0): "opening", (9, 30): "morning", (11, 29): "morning",
+        (11, 30): "lunch", (12, 30): "afternoon", (15, 0): "closing", (15, 30): "post_close",
+        (17, 59): "post_close", (18, 0): cal.CLOSED, (7, 59): cal.CLOSED,
+    }
+    for (h, m), phase in cases.items():
+        assert cal.session_phase(jst(2026, 10, 16, h, m)) == phase, (h, m)
+    assert cal.session_phase(jst(2026, 10, 12, 10, 0)) == cal.CLOSED  # 祝日
+    # タイムゾーン付きの時刻は JST に直してから判定する（UTC 0:00 = JST 9:00）
+    assert cal.session_phase(datetime(2026, 10, 16, 0, 0, tzinfo=timezone.utc)) == "opening"
+
+
+def test_should_run_cron_without_last_run():
+    assert cal.should_run_cron(jst(2026, 10, 16, 9, 0))
+    assert cal.should_run_cron(jst(2026, 10, 16, 9, 5))         # 寄り付き直後は5分おき
+    assert not cal.should_run_cron(jst(2026, 10, 16, 9, 35))    # ザラ場は10分おき
+    assert cal.should_run_cron(jst(2026, 10, 16, 9, 40))
+    assert cal.should_run_cron(jst(2026, 10, 16, 16, 0))        # 引け後は30分おき
+    assert not cal.should_run_cron(jst(2026, 10, 16, 16, 5))
+    assert not cal.should_run_cron(jst(2026, 10, 16, 12, 0))    # 昼休み
+    assert not cal.should_run_cron(jst(2026, 10, 12, 10, 0))    # 祝日
+
+
+def test_should_run_cron_with_last_run():
+    now = jst(2026, 10, 16, 10, 0)
+    # 間隔10分・cron 5分おき: 遅れを見込んで 7分30秒経っていれば実行する
+    assert cal.should_run_cron(now, 5, now - timedelta(seconds=450))
+    assert not cal.should_run_cron(now, 5, now - timedelta(seconds=449))
+    assert not cal.should_run_cron(jst(2026, 10, 16, 12, 0), 5, now - timedelta(hours=2))
+
+
+def test_seconds_until_next_refresh():
+    # フェーズの境界（11:30 の昼休み）までで打ち切る
+    assert cal.seconds_until_next_refresh(jst(2026, 10, 16, 11, 25)) == 300
+    assert cal.seconds_until_next_refresh(jst(2026, 10, 16, 10, 0)) == 600
+    assert cal.seconds_until_next_refresh(jst(2026, 10, 16, 12, 0)) == 1800
+    # 金曜の夜 → 月曜が祝日なので火曜の寄り付き
+    friday = jst(2026, 10, 9, 18, 0)
+    assert cal.next_refresh_start(friday) == jst(2026, 10, 13, 9, 0)
+    assert cal.seconds_until_next_refresh(friday) == int((jst(2026, 10, 13, 9, 0) - friday).total_seconds())
+
+
+if __name__ == "__main__":
+    test_holiday_table()
+    test_past_table_warns_once_per_year()
+    test_session_phase_boundaries()
+    test_should_run_cron_without_last_run()
+    test_should_run_cron_with_last_run()
+    test_seconds_until_next_refresh()
+    print("OK")
@@ -1,11 +1,11 @@
-import requests
+from http_client import http_get
 from bs4 import BeautifulSoup
 import re
 
 def get_margin_balance(ticker):
     url = f"https://finance.yahoo.co.jp/quote/{ticker}"
     try:
-        r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=5)
+        r = http_get(url, timeout=5)
         soup = BeautifulSoup(r.content, "html.parser")
         
         def get_val(label):
@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metrics
+
+# ===============================
+# スパン・実行ログ（JSON Lines）・Prometheus 出力の確認
+#   python test_metrics.py   （pytest でも動く）
+# ===============================
+
+
+def _log_path():
+    return os.path.join(tempfile.mkdtemp(prefix="test_metrics_"), "spans.jsonl")
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_run_writes_spans_and_total():
+    metrics.reset_metrics()
+    path = _log_path()
+    run = metrics.begin_run("static_report", mode="test")
+    with metrics.span("fetch", ticker="7203.T"):
+        pass
+    try:
+        with metrics.span("parse", ticker="7203.T"):
+            raise ValueError("broken page")
+    except ValueError:
+        pass
+    metrics.end_run(run, ok=True, path=path)
+
+    records = _read(path)
+    assert [r["stage"] for r in records] == ["fetch", "parse", "total"]
+    assert all(r["run"] == run.id and r["mode"] == "test" for r in records)
+    assert records[1]["ok"] is False and records[1]["error"] == "ValueError: broken page"
+    assert records[2]["spans"] == 2
+    summary = metrics.stage_summary()
+    assert summary["static_report/fetch"]["count"] == 1 and summary["static_report/total"]["count"] == 1
+
+
+def test_carry_run_into_worker_threads():
+    path = _log_path()
+    run = metrics.begin_run("static_report")
+
+    def work(code):
+        with metrics.span("render", ticker=code):
+            return code
+
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        list(ex.map(metrics.carry_run(work), ["7203.T", "6501.T"]))
+    metrics.end_run(run, path=path)
+    assert sorted(r["ticker"] for r in _read(path) if r["stage"] == "render") == ["6501.T", "7203.T"]
+
+
+def test_prometheus_text():
+    metrics.reset_metrics()
+    metrics.observe("app.update", "first_paint", 0.03)
+    metrics.observe("app.update", "first_paint", 0.3)
+    metrics.observe("app.update", "first_paint", 60, ok=False)
+    metrics.count_error("quote", 'parse "empty"')
+    text = metrics.render_prometheus()
+
+    name = f"{metrics.PREFIX}_stage_duration_seconds"
+    labels = 'kind="app.update",stage="first_paint"'
+    assert f'{name}_bucket{{{labels},le="0.05"}} 1' in text
+    assert f'{name}_bucket{{{labels},le="0.5"}} 2' in text     # 累積
+    assert f'{name}_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f"{name}_count{{{labels}}} 3" in text
+    assert f"{metrics.PREFIX}_stage_errors_total{{{labels}}} 1" in text
+    assert f'{metrics.PREFIX}_upstream_errors_total{{source="quote",reason="parse \\"empty\\""}} 1' in text
+
+
+if __name__ == "__main__":
+    test_run_writes_spans_and_total()
+    test_carry_run_into_worker_threads()
+    test_prometheus_text()
+    print("OK")
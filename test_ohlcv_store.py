@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ohlcv_store import COLUMNS, STORE_VERSION, DailyStore
+
+# ===============================
+# DailyStore の同期の確認（yfinance には行かず、_download を差し替えた FakeStore で動かす）
+#   python test_ohlcv_store.py   （pytest でも動く）
+# ===============================
+TICKER = "7203.T"
+
+
+def bars(start, end, close=100.0):
+    index = pd.bdate_range(start, end)
+    return pd.DataFrame({c: close for c in COLUMNS}, index=index)
+
+
+class FakeStore(DailyStore):
+    """_download の結果を frames で決める（None なら取得失敗）"""
+
+    def __init__(self, path):
+        super().__init__(path, fresh_seconds=0)
+        self.frames = None
+
+    def _download(self, tickers, start):
+        return {t: self.frames for t in tickers} if self.frames is not None else {}
+
+
+def _store():
+    return FakeStore(os.path.join(tempfile.mkdtemp(prefix="test_ohlcv_store_"), "ohlcv.sqlite"))
+
+
+def test_failed_cold_extend_keeps_history():
+    store = _store()
+    store.frames = bars("2025-01-06", "2025-03-31")
+    store.sync([TICKER], "2025-01-06")
+    before = store.read(TICKER)
+    assert len(before) == len(store.frames)
+
+    # より古い期間を要求（全期間の取り直し）したが取得に失敗した
+    store.frames = None
+    store.sync([TICKER], "2024-01-04")
+    pd.testing.assert_frame_equal(store.read(TICKER), before)
+    assert store._meta([TICKER])[TICKER]["last"] == "2025-03-31"
+
+
+def test_failed_split_refetch_keeps_history():
+    store = _store()
+    store.frames = bars("2025-01-06", "2025-03-31")
+    store.sync([TICKER], "2025-01-06")
+    before = store.read(TICKER)
+
+    # 差分の終値が半分（分割）→ 全期間の取り直しが空で返ってきた
+    split = bars("2025-03-17", "2025-04-04", close=50.0)
+    original = store._download
+    calls = []
+
+    def download(tickers, start):
+        calls.append(start)
+        return {t: split for t in tickers} if len(calls) == 1 else {}
+    store._download = download
+    store.sync([TICKER], "2025-01-06")
+    store._download = original
+
+    assert len(calls) == 2
+    pd.testing.assert_frame_equal(store.read(TICKER), before)
+    assert store._meta([TICKER])[TICKER]["last"] == "2025-03-31"
+
+
+def test_store_from_older_version_is_refetched():
+    store = _store()
+    store.frames = bars("2025-01-06", "2025-03-31")
+    store.sync([TICKER], "2025-01-06")
+    with sqlite3.connect(store.path) as conn:
+        conn.execute(f"PRAGMA user_version = {STORE_VERSION - 1}")
+
+    # 調整前の足を保存していた古いストアは、開き直したら空から取り直す
+    reopened = FakeStore(store.path)
+    assert reopened.read(TICKER).empty
+    assert reopened._meta([TICKER]) == {}
+
+
+if __name__ == "__main__":
+    test_failed_cold_extend_keeps_history()
+    test_failed_split_refetch_keeps_history()
+    test_store_from_older_version_is_refetched()
+    print("OK")
@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# app を読み込むと上流のキャッシュなどを作るので、作業ディレクトリを一時フォルダにする
+os.chdir(tempfile.mkdtemp(prefix="test_panel_indicators_"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from panel_indicators import panel_indicators, screen_universe, to_panel
+
+# ===============================
+# パネル計算（全銘柄まとめて）が、1銘柄ずつ app.calc_sdi / app.calc_rsi_cutler /
+# make_entry_signal を回したのと同じ値になることの確認。
+# 上場日の違い（先頭の NaN）・途中の欠損日・窓に満たない銘柄を含める
+#   python test_panel_indicators.py   （pytest でも動く）
+# ===============================
+PERIOD = 14
+SIGNAL = "エントリー(買い)"
+
+
+def baseline_entry_signal(df, sig_mode):
+    """従来の app.make_entry_signal（シグナル判定を calc_signal_flags に分ける前）"""
+    out = df.sort_values("Date", ascending=True).copy()
+    sdi = pd.to_numeric(out["SDI"], errors="coerce")
+    rsi = pd.to_numeric(out["RSI14"], errors="coerce")
+    A = (rsi.shift(1) < 30) & (rsi >= 30)
+    B = (rsi.shift(1) <= sdi.shift(1)) & (rsi > sdi)
+    cheap_filter = (rsi < 50) & (sdi < 50)
+    entry_raw = {"A": A & cheap_filter, "B": B & cheap_filter, "C": (A | B) & cheap_filter}[sig_mode]
+    out["Signal"] = np.where(entry_raw.fillna(False), SIGNAL, "")
+    return out
+
+
+def frames(seed=0):
+    """銘柄ごとに長さ・欠損の違う日足（シグナルが点灯するよう値動きを大きめにする）"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2025-06-02", periods=120)
+    out = {}
+    for i, (start, gaps) in enumerate([(0, ()), (25, (60, 61)), (100, ()), (110, ())]):
+        n = len(index) - start
+        close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.04, n)))
+        df = pd.DataFrame({"High": close * 1.02, "Low": close * 0.98, "Close": close,
+                           "Volume": rng.integers(1_000, 100_000, n).astype(float)}, index=index[start:])
+        df.iloc[[g - start for g in gaps], df.columns.get_loc("Close")] = np.nan
+        out[f"{1000 + i}.T"] = df
+    return out
+
+
+def _per_ticker(df):
+    """従来どおり1銘柄ずつ（有効な足だけ）計算した SDI / RSI とシグナル"""
+    bars = df.dropna(subset=["Close"])
+    table = pd.DataFrame({"Date": bars.index, "SDI": app.calc_sdi(bars, PERIOD).to_numpy(),
+                          "RSI14": app.calc_rsi_cutler(bars["Close"], PERIOD).to_numpy()}, index=bars.index)
+    for mode in ("A", "B", "C"):
+        table[mode] = baseline_entry_signal(table, mode)["Signal"].to_numpy() == SIGNAL
+    return table
+
+
+def test_panel_matches_per_ticker():
+    data = frames()
+    tickers = list(data)
+    panel, index = to_panel(data, tickers, ["High", "Low", "Close", "Volume"])
+    ind = panel_indicators(panel["High"], panel["Low"], panel["Close"], panel["Volume"], PERIOD)
+
+    lit = 0
+    for i, t in enumerate(tickers):
+        expected = _per_ticker(data[t])
+        pos = index.get_indexer(expected.index)
+        for col in ("SDI", "RSI14"):
+            np.testing.assert_allclose(ind[col][i, pos], expected[col].to_numpy(dtype=float),
+                                       rtol=1e-9, equal_nan=True, err_msg=f"{t} {col}")
+        for mode in ("A", "B", "C"):
+            assert (ind[mode][i, pos] == expected[mode].to_numpy()).all(), f"{t} {mode}"
+            lit += int(expected[mode].sum())
+        # 足が無い位置（上場前・欠損日）は NaN / 点灯しない
+        missing = np.setdiff1d(np.arange(len(index)), pos)
+        assert np.isnan(ind["SDI"][i, missing]).all() and np.isnan(ind["RSI14"][i, missing]).all()
+        assert not ind["C"][i, missing].any()
+    assert lit > 0  # シグナルの比較が空振りしていない
+
+
+def test_make_entry_signal_matches_baseline():
+    table = _per_ticker(frames()["1000.T"])[["Date", "SDI", "RSI14"]]
+    for mode in ("A", "B", "C"):
+        expected = baseline_entry_signal(table, mode)["Signal"]
+        pd.testing.assert_series_equal(app.make_entry_signal(table, mode)["Signal"], expected)
+    assert (app.make_entry_signal(table, "NONE")["Signal"] == "").all()
+
+
+def test_screen_universe_latest_values():
+    data = frames()
+    result = screen_universe(list(data) + ["9999.T"], data)
+    assert "9999.T" not in result  # データの無い銘柄は含まない
+    for t, df in data.items():
+        expected = _per_ticker(df).iloc[-1]
+        rsi = None if pd.isna(expected["RSI14"]) else round(float(expected["RSI14"]), 2)
+        assert result[t]["rsi"] == rsi, t
+        assert result[t]["signals"] == [k for k in ("A", "B") if expected[k]]
+    # 窓に満たない銘柄は値なし
+    assert result["1003.T"]["sdi"] is None and result["1003.T"]["rsi"] is None
+
+
+if __name__ == "__main__":
+    test_panel_matches_per_ticker()
+    test_make_entry_signal_matches_baseline()
+    test_screen_universe_latest_values()
+    print("OK")
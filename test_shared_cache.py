@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from shared_cache import SharedCache
+
+# ===============================
+# SharedCache のロックの確認
+# 同じキーを取りに行くのは1つだけ / 持ち主が死んだロックはすぐ引き継ぐ / 生きている持ち主のロックは期限まで待つ
+# （owner はプロセスとスレッドの組なので、スレッドで別ワーカーの代わりをさせる）
+#   python test_shared_cache.py   （pytest でも動く）
+# ===============================
+KEY = "('margin', ('7203.T',), ())"
+
+
+def _cache(**kwargs):
+    return SharedCache(os.path.join(tempfile.mkdtemp(prefix="test_shared_cache_"), "shared_cache.sqlite"), **kwargs)
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _hold_lock(cache, owner, seconds=60):
+    cache._connect().execute("INSERT OR REPLACE INTO locks VALUES (?, ?, ?)", (KEY, owner, time.time() + seconds))
+
+
+def test_one_loader_per_key():
+    cache = _cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.3)
+        return {"buy": "12,345"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("margin", KEY, loader, 60)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"buy": "12,345"}] * 4
+    assert cache.stats()["waits"] >= 1
+
+
+def test_dead_owner_is_taken_over():
+    cache = _cache(lock_seconds=30)
+    _hold_lock(cache, f"{_dead_pid()}:1")
+
+    t0 = time.monotonic()
+    assert cache.get_or_load("margin", KEY, lambda: "loaded", 60) == "loaded"
+    assert time.monotonic() - t0 < 5  # lock_seconds まで待たない
+    assert cache.stats()["takeovers"] == 1
+    assert cache.get(KEY) == "loaded"
+
+
+def test_claim():
+    cache = _cache()
+    # 生きているプロセス（親）が持っているあいだは取れない
+    _hold_lock(cache, f"{os.getppid()}:1", seconds=0.2)
+    assert not cache.claim(KEY, 60)
+    time.sleep(0.3)
+    assert cache.claim(KEY, 60)
+
+    # 持ち主が死んでいれば期限前でも取れる
+    _hold_lock(cache, f"{_dead_pid()}:1")
+    assert cache.claim(KEY, 60)
+
+
+def test_entries_expire():
+    cache = _cache()
+    cache.put("margin", KEY, "value", ttl=0.1)
+    assert cache.contains(KEY) and cache.get(KEY) == "value"
+    time.sleep(0.2)
+    assert not cache.contains(KEY) and cache.get(KEY) is None
+
+
+if __name__ == "__main__":
+    test_one_loader_per_key()
+    test_dead_owner_is_taken_over()
+    test_claim()
+    test_entries_expire()
+    print("OK")
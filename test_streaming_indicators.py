@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# app を読み込むと上流のキャッシュなどを作るので、作業ディレクトリを一時フォルダにする
+os.chdir(tempfile.mkdtemp(prefix="test_streaming_indicators_"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import calc_rsi_cutler, calc_sdi
+from streaming_indicators import StreamingRSI, StreamingSDI, load_states, save_states
+
+# ===============================
+# 逐次更新の SDI / RSI が app.calc_sdi / app.calc_rsi_cutler と同じ値になることの確認
+# 足りない先頭（NaN）・途中の欠損・当日足の差し替え・状態の保存と復元を含む
+#   python test_streaming_indicators.py   （pytest でも動く）
+# ===============================
+PERIOD = 14
+
+
+def bars(n=80, seed=0, gaps=(30, 31, 55)):
+    rng = np.random.default_rng(seed)
+    close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    df = pd.DataFrame({
+        "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": rng.integers(1_000, 100_000, n).astype(float),
+    }, index=pd.bdate_range("2026-01-05", periods=n))
+    # 途中の欠損（値の無い足）も pandas の rolling と同じ扱いになるか
+    df.iloc[list(gaps), df.columns.get_loc("Close")] = np.nan
+    return df
+
+
+def _assert_same(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype=float), expected.to_numpy(dtype=float),
+                               rtol=1e-9, equal_nan=True)
+
+
+def _push_sdi(engine, df):
+    return [engine.push(r.High, r.Low, r.Close, r.Volume) for r in df.itertuples()]
+
+
+def test_rsi_matches_calc_rsi_cutler():
+    df = bars()
+    engine = StreamingRSI(PERIOD)
+    values = [engine.push(c) for c in df["Close"]]
+    expected = calc_rsi_cutler(df["Close"], PERIOD)
+    assert expected.iloc[:PERIOD].isna().all()  # 先頭は窓が埋まるまで NaN
+    _assert_same(values, expected)
+
+
+def test_sdi_matches_calc_sdi():
+    df = bars()
+    values = _push_sdi(StreamingSDI(PERIOD), df)
+    expected = calc_sdi(df, PERIOD)
+    assert expected.iloc[:PERIOD - 1].isna().all()
+    _assert_same(values, expected)
+
+
+def test_short_series_is_all_nan():
+    df = bars(n=PERIOD, gaps=())
+    assert all(np.isnan(StreamingRSI(PERIOD).push(c)) for c in df["Close"])
+    assert np.isnan(_push_sdi(StreamingSDI(PERIOD), df)[-2])
+
+
+def test_amend_replaces_last_bar():
+    df = bars(gaps=())
+    rsi, sdi = StreamingRSI(PERIOD), StreamingSDI(PERIOD)
+    for c in df["Close"]:
+        rsi.push(c)
+    _push_sdi(sdi, df)
+
+    # ザラ場中に当日足が動いた
+    amended = df.copy()
+    amended.iloc[-1] = [1.0, 0.5, 0.8, 5.0] * amended.iloc[-1].to_numpy()
+    last = amended.iloc[-1]
+    assert np.isclose(rsi.amend(last["Close"]), calc_rsi_cutler(amended["Close"], PERIOD).iloc[-1], rtol=1e-9)
+    assert np.isclose(sdi.amend(last["High"], last["Low"], last["Close"], last["Volume"]),
+                      calc_sdi(amended, PERIOD).iloc[-1], rtol=1e-9)
+
+
+def test_state_round_trip():
+    df = bars()
+    half = len(df) // 2
+    engines = {"rsi": StreamingRSI(PERIOD), "sdi": StreamingSDI(PERIOD)}
+    for key, r in zip(df.index[:half].strftime("%Y-%m-%d"), df.iloc[:half].itertuples()):
+        engines["rsi"].push(r.Close, key)
+        engines["sdi"].push(r.High, r.Low, r.Close, r.Volume, key)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="test_streaming_state_"), "state.json")
+    save_states(path, engines)
+    restored = load_states(path)
+    assert restored["rsi"].last_key == df.index[half - 1].strftime("%Y-%m-%d")
+
+    # 復元した状態から続きを足しても、最初から通しで計算した値と同じ
+    rsi = [restored["rsi"].push(c) for c in df["Close"].iloc[half:]]
+    sdi = _push_sdi(restored["sdi"], df.iloc[half:])
+    _assert_same(rsi, calc_rsi_cutler(df["Close"], PERIOD).iloc[half:])
+    _assert_same(sdi, calc_sdi(df, PERIOD).iloc[half:])
+
+
+def test_broken_state_file_is_empty():
+    path = os.path.join(tempfile.mkdtemp(prefix="test_streaming_state_"), "state.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert load_states(path) == {}
+    assert load_states(path + ".missing") == {}
+
+
+if __name__ == "__main__":
+    test_rsi_matches_calc_rsi_cutler()
+    test_sdi_matches_calc_sdi()
+    test_short_series_is_all_nan()
+    test_amend_replaces_last_bar()
+    test_state_round_trip()
+    test_broken_state_file_is_empty()
+    print("OK")
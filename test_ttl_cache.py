@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ttl_cache import TTLCache, estimate_size
+
+# ===============================
+# TTLCache（プロセス内キャッシュ）の確認
+# 有効期限 / サイズ上限の LRU / 同時に来た同じキーの合流 / memoize のキーとコピー
+#   python test_ttl_cache.py   （pytest でも動く）
+# ===============================
+
+
+def test_ttl_expiry():
+    cache = TTLCache({"quote": 0.1})
+    calls = []
+    load = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_load("quote", "7203.T", load) == 1
+    assert cache.get_or_load("quote", "7203.T", load) == 1
+    time.sleep(0.15)
+    assert cache.get_or_load("quote", "7203.T", load) == 2
+    assert cache.stats()["kinds"]["quote"]["hits"] == 1
+
+
+def test_lru_eviction_by_bytes():
+    value = "x" * 1000
+    size = estimate_size(value)
+    cache = TTLCache({"page": 60}, max_bytes=size * 2)
+    cache.get_or_load("page", "a", lambda: value)
+    cache.get_or_load("page", "b", lambda: value)
+    cache.get_or_load("page", "a", lambda: "reloaded")   # a を使ったので b が一番古い
+    cache.get_or_load("page", "c", lambda: value)
+
+    assert cache.contains("page", "a") and cache.contains("page", "c")
+    assert not cache.contains("page", "b")
+    assert cache.stats()["kinds"]["page"]["evictions"] == 1
+    # 上限より大きい値はキャッシュしない
+    cache.get_or_load("page", "big", lambda: "x" * (size * 3))
+    assert not cache.contains("page", "big")
+
+
+def test_concurrent_loads_coalesce():
+    cache = TTLCache({"margin": 60})
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"buy": "1,000"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("margin", "7203.T", loader)))
+               for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"buy": "1,000"}] * 5
+    assert cache.stats()["kinds"]["margin"]["coalesced"] == 4
+
+
+def test_failures_are_not_cached():
+    cache = TTLCache({"margin": 60})
+    try:
+        cache.get_or_load("margin", "7203.T", lambda: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    else:
+        raise AssertionError("loader error was swallowed")
+    assert cache.get_or_load("margin", "7203.T", lambda: None) is None
+    assert cache.get_or_load("margin", "7203.T", lambda: "ok") == "ok"
+
+
+def test_memoize_keys_and_copies():
+    cache = TTLCache({"hist": 60})
+    calls = []
+
+    @cache.memoize("hist")
+    def history(ticker, period="1mo"):
+        calls.append((ticker, period))
+        return pd.DataFrame({"Close": [1.0, 2.0]})
+
+    df = history("7203.T")
+    history("7203.T", "1mo")
+    history("7203.T", period="1mo")
+    assert calls == [("7203.T", "1mo")]
+    assert history.is_cached("7203.T") and not history.is_cached("7203.T", "3mo")
+
+    # 返した値を書き換えても、キャッシュ上の値は変わらない
+    df.loc[0, "Close"] = -1.0
+    assert history("7203.T")["Close"].tolist() == [1.0, 2.0]
+
+
+if __name__ == "__main__":
+    test_ttl_expiry()
+    test_lru_eviction_by_bytes()
+    test_concurrent_loads_coalesce()
+    test_failures_are_not_cached()
+    test_memoize_keys_and_copies()
+    print("OK")
@@ -0,0 +1,81 @@
+import glob
+import os
+import sys
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import replay
+import yahoo_quote as yq
+from bench_quote_parse import make_page
+
+# ===============================
+# 銘柄ページの段階的な解析（埋め込み JSON → 部分解析 → ページ全体）の確認
+# 3つの段が同じ値を返すこと / 信用残の欄が無いページでページ全体の解析まで落ちないこと。
+# fixtures/pages/ に記録済みのページ（python replay.py record ...）があればそれも確かめる
+#   python test_yahoo_quote.py   （pytest でも動く）
+# ===============================
+FIELDS = ("price", "name", "buy", "sell", "ratio", "date")
+
+
+def _layers(content):
+    """各段を単独で動かした結果（その段で取れなかった項目は None）"""
+    state = yq.extract_preloaded_state(content)
+    layers = {
+        "partial": yq._parse_soup(yq.partial_soup(content)),
+        "dom": yq._parse_soup(BeautifulSoup(content, "html.parser")),
+    }
+    if state is not None:
+        layers["state"] = yq._parse_state(state)
+    return {name: {k: (found.get(k) if found.get(k) not in ("", "-") else None) for k in FIELDS}
+            for name, found in layers.items()}
+
+
+def _assert_layers_agree(content, label):
+    layers = _layers(content)
+    dom = layers.pop("dom")
+    for name, found in layers.items():
+        for k in FIELDS:
+            # JSON だけ・部分解析だけで取れない項目は次の段で補うので、取れた値が一致すればよい
+            if found[k] is not None:
+                assert found[k] == dom[k], f"{label}: {name}.{k} = {found[k]!r}, dom = {dom[k]!r}"
+
+
+def _recorded_pages():
+    # 他のテストが作業ディレクトリを変えるので、相対パスはこのファイルの場所から辿る
+    fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), replay.FIXTURE_DIR)
+    return sorted(glob.glob(os.path.join(fixtures, "pages", "finance.yahoo.co.jp_quote_*.html")))
+
+
+def test_layers_agree():
+    for label, content in (("with state", make_page(True)), ("no state", make_page(False)),
+                           ("no margin", make_page(True, margin=False))):
+        _assert_layers_agree(content, label)
+    for path in _recorded_pages():
+        with open(path, "rb") as f:
+            _assert_layers_agree(f.read(), path)
+
+
+def test_page_without_margin_stops_at_state():
+    yq.reset_quote_stats()
+    snap = yq.parse_quote_page("1306.T", make_page(True, code="1306", name="ＴＯＰＩＸ連動型上場投信", margin=False))
+    assert snap.parsed_by == "state"
+    assert snap.price == 2876.5 and snap.name
+    assert (snap.margin_buy, snap.margin_sell, snap.margin_ratio, snap.margin_date) == ("-", "-", "-", "")
+    assert yq.quote_stats()["parsed_by"] == {"state": 1, "partial": 0, "dom": 0}
+
+
+def test_null_margin_in_state_is_absent():
+    state = {"priceBoard": {"name": "ETF", "price": "100"}, "marginTransaction": None}
+    found = yq._parse_state(state)
+    assert found["absent"] == set(yq.MARGIN_FIELDS)
+    # キーが無いだけなら「まだ分からない」ので次の段に回す
+    assert "absent" not in yq._parse_state({"priceBoard": {"name": "ETF", "price": "100"}})
+
+
+if __name__ == "__main__":
+    test_layers_agree()
+    test_page_without_margin_stops_at_state()
+    test_null_margin_in_state_is_absent()
+    print("OK")
@@ -0,0 +1,189 @@
+import copy
+import inspect
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+# ===============================
+# プロセス内キャッシュ（TTL + メモリ上限つきLRU + リクエスト合流）
+#
+# - データ種別（kind）ごとに有効期限を持つ
+# - 合計サイズが上限を超えたら古い順に捨てる
+# - 同じキーの取得が同時に来たら、上流への問い合わせは1回だけにして結果を共有する
+# - shared（shared_cache.SharedCache）を渡すと2段目として使い、他のワーカーが取得済みならそれを読む
+# - memoize した関数は、書き換えられる値（DataFrame / dict / list）をコピーして返す
+#   （呼び出し側が書き換えても、キャッシュ上の値と他の利用者の結果は変わらない）
+# ===============================
+
+
+def estimate_size(value):
+    """キャッシュ値のおおよそのバイト数"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _copy(value):
+    """キャッシュから返す値。書き換えられる型はコピーにする"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+class _Flight:
+    """取得中のキー。後から来た呼び出しはこれを待つ"""
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, ttls, max_bytes=128 * 1024 * 1024, default_ttl=60, shared=None, local_ttl=None):
+        self.ttls = dict(ttls)
+        self.shared = shared
+        self.local_ttl = local_ttl   # プロセス内に置く最長時間（共有キャッシュと併用するとき短くする）
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # (kind, key) -> (expires_at, size, value)
+        self._inflight = {}          # (kind, key) -> _Flight
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {}             # kind -> {"hits", "misses", "coalesced", "evictions", "errors"}
+
+    def _count(self, kind, name):
+        stats = self._stats.setdefault(kind, {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "errors": 0})
+        stats[name] += 1
+
+    def _evict(self, full_key):
+        _, size, _ = self._data.pop(full_key)
+        self._bytes -= size
+
+    def get_or_load(self, kind, key, loader):
+        """キャッシュにあれば返し、無ければ loader() で取得して保存する"""
+        full_key = (kind, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(full_key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._data.move_to_end(full_key)
+                    self._count(kind, "hits")
+                    return entry[2]
+                self._evict(full_key)
+
+            flight = self._inflight.get(full_key)
+            if flight is not None:
+                leader = False
+                self._count(kind, "coalesced")
+            else:
+                leader = True
+                flight = self._inflight[full_key] = _Flight()
+                self._count(kind, "misses")
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            if self.shared is not None:
+                ttl = self.ttls.get(kind, self.default_ttl)
+                flight.value = self.shared.get_or_load(kind, repr(full_key), loader, ttl)
+            else:
+                flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._count(kind, "errors")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+                # 取得失敗（None / 例外）はキャッシュしない
+                if flight.error is None and flight.value is not None:
+                    self._put_locked(kind, full_key, flight.value)
+            flight.event.set()
+        return flight.value
+
+    def contains(self, kind, key):
+        """取得せずに、有効な値がキャッシュにあるかだけを見る（2段目も見る）"""
+        full_key = (kind, key)
+        with self._lock:
+            entry = self._data.get(full_key)
+            if entry is not None and entry[0] > time.monotonic():
+                return True
+        return self.shared is not None and self.shared.contains(repr(full_key))
+
+    def _put_locked(self, kind, full_key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if full_key in self._data:
+            self._evict(full_key)
+        ttl = self.ttls.get(kind, self.default_ttl)
+        if self.local_ttl is not None:
+            ttl = min(ttl, self.local_ttl)
+        self._data[full_key] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._data:
+            oldest = next(iter(self._data))
+            self._evict(oldest)
+            self._count(oldest[0], "evictions")
+
+    def memoize(self, kind):
+        """
+        関数の引数をキーにしてキャッシュするデコレータ。
+        キーは既定値を埋めた引数なので、f(t, 5) と f(t, period=5) と（既定値が 5 なら）f(t) は同じキーになる
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            def make_key(args, kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                return bound.args, tuple(sorted(bound.kwargs.items()))
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                return _copy(self.get_or_load(kind, key, lambda: func(*args, **kwargs)))
+            wrapper.uncached = func
+            wrapper.is_cached = lambda *args, **kwargs: self.contains(kind, make_key(args, kwargs))
+            return wrapper
+        return decorator
+
+    def invalidate(self, kind=None):
+        with self._lock:
+            for full_key in [k for k in self._data if kind is None or k[0] == kind]:
+                self._evict(full_key)
+        if self.shared is not None:
+            self.shared.invalidate(kind)
+
+    def stats(self):
+        with self._lock:
+            kinds = {k: dict(v) for k, v in self._stats.items()}
+            entries, size = len(self._data), self._bytes
+        total = {name: sum(v[name] for v in kinds.values())
+                 for name in ("hits", "misses", "coalesced", "evictions", "errors")}
+        lookups = total["hits"] + total["misses"] + total["coalesced"]
+        total["hit_rate"] = round((total["hits"] + total["coalesced"]) / lookups, 3) if lookups else 0.0
+        stats = {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "total": total, "kinds": kinds}
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
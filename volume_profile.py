@@ -0,0 +1,108 @@
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+# ===============================
+# 価格帯別出来高（Volume Profile）の共通エンジン
+#
+# app.py（Dash）と generate_static_report.py の両方から使う。
+# ビン分割は np.histogram の重み付き集計で行い、結果は
+# 「ビン境界（昇順）」と「ビンごとの出来高」の配列で返す。
+# ===============================
+DEFAULT_BINS = 30
+
+# 東証の呼値（値段の刻み）: (この価格以下, 刻み)
+# ※TOPIX100構成銘柄はより細かい刻みだが、ビン境界の目安としてはこちらで十分
+TSE_TICK_TABLE = [
+    (3_000, 1),
+    (5_000, 5),
+    (30_000, 10),
+    (50_000, 50),
+    (300_000, 100),
+    (500_000, 500),
+    (3_000_000, 1_000),
+    (5_000_000, 5_000),
+    (30_000_000, 10_000),
+    (50_000_000, 50_000),
+]
+
+
+def tick_size(price):
+    """東証の呼値単位"""
+    for upper, tick in TSE_TICK_TABLE:
+        if price <= upper:
+            return tick
+    return 100_000
+
+
+class VolumeProfile(NamedTuple):
+    edges: np.ndarray    # ビン境界（昇順, 長さ n+1）
+    volumes: np.ndarray  # ビンごとの出来高（長さ n, int64）
+
+    @property
+    def lower(self):
+        return self.edges[:-1]
+
+    @property
+    def upper(self):
+        return self.edges[1:]
+
+    @property
+    def mids(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    @property
+    def max_volume(self):
+        return int(self.volumes.max()) if len(self.volumes) else 0
+
+    @property
+    def total_volume(self):
+        return int(self.volumes.sum())
+
+    def descending(self, skip_empty=True):
+        """(下限, 上限, 出来高) を価格の高い順に返す。skip_empty なら出来高0のビンは飛ばす"""
+        for i in range(len(self.volumes) - 1, -1, -1):
+            v = int(self.volumes[i])
+            if skip_empty and v == 0:
+                continue
+            yield float(self.edges[i]), float(self.edges[i + 1]), v
+
+    def to_rows(self):
+        """JSON等に書き出す用の [[下限, 上限, 出来高], ...]（価格降順・出来高0は除く）"""
+        return [[lo, hi, v] for lo, hi, v in self.descending()]
+
+
+def tick_aligned_edges(p_min, p_max, bins=DEFAULT_BINS):
+    """呼値の倍数に揃えたビン境界。ビン幅は呼値の整数倍で、ビン数はおおよそ bins"""
+    tick = tick_size(p_max)
+    step = max(tick, math.ceil((p_max - p_min) / bins / tick) * tick)
+    lo = math.floor(p_min / step) * step
+    # np.histogram の最後のビンは右端を含むので、最高値がちょうど境界でも取りこぼさない
+    n = max(1, math.ceil((p_max - lo) / step))
+    return lo + step * np.arange(n + 1, dtype=float)
+
+
+def build_profile(price, volume, bins=DEFAULT_BINS, tick_aligned=False):
+    """
+    価格と出来高の系列から価格帯別出来高を作る。
+    データ不足や値幅ゼロのときは None
+    """
+    price = np.asarray(price, dtype=float)
+    volume = np.asarray(volume, dtype=float)
+    mask = ~(np.isnan(price) | np.isnan(volume))
+    price, volume = price[mask], volume[mask]
+    if price.size == 0:
+        return None
+
+    p_min, p_max = price.min(), price.max()
+    if p_min == p_max:
+        return None
+
+    if tick_aligned:
+        edges = tick_aligned_edges(p_min, p_max, bins)
+    else:
+        edges = np.linspace(p_min, p_max, bins + 1)
+
+    hist, edges = np.histogram(price, bins=edges, weights=volume)
+    return VolumeProfile(edges=edges, volumes=np.rint(hist).astype(np.int64))
@@ -0,0 +1,357 @@
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cached_property
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401  任意: 部分解析を速くする
+    PARTIAL_PARSER = "lxml"
+except ImportError:
+    PARTIAL_PARSER = "html.parser"
+
+from http_client import http_get
+from metrics import count_error, span
+
+# ===============================
+# Yahoo!ファイナンスJP 銘柄ページ（quote）スナップショット
+#
+# 1銘柄につき1回だけ取得・1回だけ解析し、
+# 現在値 / 銘柄名 / 信用残 などを全ての利用側で共有する。
+#
+# 解析は軽い順に試し、取れなかった項目だけを次の段で補う:
+#   1. ページに埋め込まれた __PRELOADED_STATE__ の JSON
+#   2. 必要なタグ（title / h1 / span / dl）だけの部分解析
+#   3. ページ全体の DOM 解析（従来の方法）
+# ページに欄そのものが無いと分かった項目（ETF・REIT など信用残の無い銘柄）は、次の段でも取れないので待たない
+# ===============================
+QUOTE_URL = "https://finance.yahoo.co.jp/quote/{ticker}"
+
+# 取得回数と読み出し回数（読み出し - 取得 = 節約できたリクエスト数）
+_STATS = {"fetches": 0, "reads": 0}
+# どの段の解析で全項目が揃ったか
+_PARSED = {"state": 0, "partial": 0, "dom": 0}
+_STATS_LOCK = threading.Lock()
+
+
+@dataclass
+class QuoteSnapshot:
+    ticker: str
+    status: int = 0
+    price: float = None
+    name: str = None
+    title: str = ""
+    margin_buy: str = "-"      # 信用買残
+    margin_sell: str = "-"     # 信用売残
+    margin_ratio: str = "-"    # 信用倍率
+    margin_date: str = ""      # 基準日 (01/23)
+    fetched_at: datetime = None
+    error: str = ""
+    parsed_by: str = ""        # state / partial / dom
+    # 解析した段が「ページに無い」と確かめた項目（buy / sell / ratio / date）。「まだ解析していない」とは区別する
+    absent: set = field(default_factory=set, repr=False)
+    # 生のHTML（上記以外の項目が必要になったときは soup から辿る）
+    content: bytes = field(default=b"", repr=False)
+
+    @property
+    def ok(self):
+        return self.status == 200 and not self.error
+
+    @cached_property
+    def soup(self):
+        return BeautifulSoup(self.content, "html.parser")
+
+
+def _count(key, n=1):
+    with _STATS_LOCK:
+        _STATS[key] += n
+
+
+def _count_parsed(layer):
+    with _STATS_LOCK:
+        _PARSED[layer] += 1
+
+
+def quote_stats():
+    """今回の実行での取得回数・読み出し回数・節約数"""
+    with _STATS_LOCK:
+        fetches, reads = _STATS["fetches"], _STATS["reads"]
+        parsed = dict(_PARSED)
+    return {"fetches": fetches, "reads": reads, "saved": max(reads - fetches, 0), "parsed_by": parsed}
+
+
+def reset_quote_stats():
+    with _STATS_LOCK:
+        _STATS["fetches"] = 0
+        _STATS["reads"] = 0
+        for k in _PARSED:
+            _PARSED[k] = 0
+
+
+# ===============================
+# 解析 1: 埋め込み JSON（window.__PRELOADED_STATE__）
+# ===============================
+PRELOADED_MARKER = b"__PRELOADED_STATE__"
+
+# 埋め込み JSON のキー。見つからない項目は HTML の解析で補うので、ページ側の変更で壊れても値は取れる
+STATE_PRICE_BOARD = "priceBoard"  # {"name": "トヨタ自動車(株)", "price": "2,876.5", ...}
+STATE_MARGIN_KEYS = ("marginTransaction", "marginTransactionInformation")
+STATE_MARGIN_FIELDS = {
+    "buy": ("marginBuyingBalance", "buyingBalance"),
+    "sell": ("marginSellingBalance", "sellingBalance"),
+    "ratio": ("marginRatio", "ratio"),
+    "date": ("updateDate", "date"),
+}
+MARGIN_FIELDS = tuple(STATE_MARGIN_FIELDS)
+# HTML のどの段も、このラベルを手がかりに信用残を探す（ページに無ければどの段でも取れない）
+MARGIN_LABEL = "信用買残".encode("utf-8")
+_NOT_FOUND = object()
+
+
+def extract_preloaded_state(content):
+    """HTML から __PRELOADED_STATE__ の JSON だけを切り出して読む（無ければ None）"""
+    i = content.find(PRELOADED_MARKER)
+    if i < 0:
+        return None
+    start = content.find(b"=", i + len(PRELOADED_MARKER))
+    end = content.find(b"</script>", start)
+    if start < 0 or end < 0:
+        return None
+    text = content[start + 1:end].decode("utf-8", "replace").strip()
+    try:
+        state, _ = json.JSONDecoder().raw_decode(text)
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def _state_find(obj, keys, default=None):
+    """入れ子の dict / list から keys のいずれかのキーを持つ最初の値を探す（キーが無ければ default）"""
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, dict):
+            for k in keys:
+                if k in cur:
+                    return cur[k]
+            stack.extend(reversed(list(cur.values())))
+        elif isinstance(cur, list):
+            stack.extend(reversed(cur))
+    return default
+
+
+def _state_text(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value).strip()
+
+
+def _parse_state(state):
+    """埋め込み JSON から取れた項目だけを dict で返す（値が null と書かれていた項目は "absent" に入れる）"""
+    found = {}
+    board = _state_find(state, (STATE_PRICE_BOARD,))
+    if isinstance(board, dict):
+        try:
+            found["price"] = float(str(board.get("price", "")).replace(",", ""))
+        except ValueError:
+            pass
+        if board.get("name"):
+            found["name"] = _clean_name(board["name"])
+
+    margin = _state_find(state, STATE_MARGIN_KEYS, _NOT_FOUND)
+    if margin is None or margin == {}:
+        # 欄はあるが中身が空: 信用取引の情報が無い銘柄
+        found["absent"] = set(MARGIN_FIELDS)
+    elif isinstance(margin, dict):
+        absent = set()
+        for field_name, keys in STATE_MARGIN_FIELDS.items():
+            raw = _state_find(margin, keys, _NOT_FOUND)
+            value = _state_text(raw) if raw is not _NOT_FOUND else None
+            if value:
+                found[field_name] = value
+            elif raw is None:
+                absent.add(field_name)
+        if absent:
+            found["absent"] = absent
+        if "date" in found:
+            # "2026/01/23" や "2026-01-23" は HTML 表示と同じ "01/23" にそろえる
+            m = re.search(r"(\d{1,2})[/-](\d{1,2})$", found["date"])
+            if m:
+                found["date"] = f"{int(m.group(1)):02d}/{int(m.group(2)):02d}"
+    return found
+
+
+# ===============================
+# 解析 2, 3: HTML（部分解析 → ページ全体）
+# ===============================
+# 値が入っているタグだけを木にする（信用残の dt/dd は dl の中）
+_PARTIAL_TAGS = SoupStrainer(["title", "h1", "span", "dl"])
+
+
+def partial_soup(content):
+    return BeautifulSoup(content, PARTIAL_PARSER, parse_only=_PARTIAL_TAGS)
+
+
+def _clean_name(text):
+    text = text.split("【")[0].strip()
+    text = text.replace("(株)", "").replace("（株）", "")
+    return text.replace("株式会社", "").strip()
+
+
+def _parse_price(soup):
+    # 1. PriceBoard__price__ シリーズが現在の標準
+    price_tag = soup.select_one('span[class*="PriceBoard__price__"]')
+    if not price_tag:
+        # 2. フォールバック (StyledNumber__value__ や _3rXWJKZF)
+        price_tag = soup.select_one('span[class*="StyledNumber__value__"], span[class*="_3rXWJKZF"]')
+    if not price_tag:
+        return None
+    try:
+        return float(price_tag.get_text().replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _parse_name(soup):
+    # タイトルから銘柄名を抽出 (例: "キオクシアホールディングス(株)【285A】")
+    title = soup.find("title")
+    title_text = title.get_text(strip=True) if title else ""
+    if "【" in title_text:
+        return _clean_name(title_text), title_text
+
+    # フォールバック: h1タグから取得
+    h1 = soup.find("h1")
+    if h1:
+        return h1.get_text(strip=True), title_text
+    return None, title_text
+
+
+def _parse_margin(soup):
+    def get_val(label):
+        # テキストノードを探してから、親のdtを取得する
+        target_text = soup.find(string=re.compile(label))
+        if target_text and target_text.parent.name == "dt":
+            dd = target_text.parent.find_next_sibling("dd")
+            if dd:
+                val_span = dd.find("span", class_=lambda c: c and "StyledNumber__value" in c)
+                if val_span:
+                    return val_span.get_text(strip=True)
+                return dd.get_text(strip=True)
+        return "-"
+
+    margin = {
+        "buy": get_val("信用買残"),
+        "sell": get_val("信用売残"),
+        "ratio": get_val("信用倍率"),
+        "date": "",
+    }
+
+    date_span = soup.find("span", class_=lambda c: c and "MarginTransactionInformation__date" in c)
+    if date_span:
+        margin["date"] = date_span.get_text(strip=True).replace("(", "").replace(")", "")
+
+    # dt/dd で取れない場合は「信用取引情報」セクションのテキストから正規表現で拾う
+    if margin["buy"] == "-" or not margin["date"]:
+        for s in soup.find_all("section"):
+            text = s.get_text()
+            if "信用取引情報" not in text:
+                continue
+            patterns = {
+                "buy": r"信用買残([\d,]+)株",
+                "sell": r"信用売残([\d,]+)株",
+                "ratio": r"信用倍率([\d,.]+)倍",
+                "date": r"\(([\d/]+)\)",
+            }
+            for key, pat in patterns.items():
+                m = re.search(pat, text)
+                if m and margin[key] in ("-", ""):
+                    margin[key] = m.group(1)
+            break
+
+    return margin
+
+
+def _missing(snap):
+    """まだ取れていない項目があるか（信用残は従来どおり買残と基準日で判定。ページに無いと分かった項目は除く）"""
+    margin = ((snap.margin_buy == "-" and "buy" not in snap.absent)
+              or (not snap.margin_date and "date" not in snap.absent))
+    return snap.price is None or not snap.name or margin
+
+
+def _fill(snap, found):
+    """取れた項目のうち、まだ空いているものだけを埋める"""
+    if snap.price is None and found.get("price") is not None:
+        snap.price = found["price"]
+    if not snap.name and found.get("name"):
+        snap.name = found["name"]
+    if not snap.title and found.get("title"):
+        snap.title = found["title"]
+    for key, attr in (("buy", "margin_buy"), ("sell", "margin_sell"), ("ratio", "margin_ratio")):
+        if getattr(snap, attr) == "-" and found.get(key) not in (None, "", "-"):
+            setattr(snap, attr, found[key])
+    if not snap.margin_date and found.get("date"):
+        snap.margin_date = found["date"]
+    snap.absent.update(found.get("absent", ()))
+
+
+def _parse_soup(soup):
+    name, title = _parse_name(soup)
+    found = {"price": _parse_price(soup), "name": name, "title": title}
+    found.update(_parse_margin(soup))
+    return found
+
+
+def parse_quote_page(ticker, content, status=200):
+    """取得済みHTMLを1回だけ解析して QuoteSnapshot を作る（軽い解析で揃わなかった項目だけ次の段へ）"""
+    snap = QuoteSnapshot(ticker=ticker, status=status, content=content, fetched_at=datetime.now())
+    if MARGIN_LABEL not in content:
+        snap.absent.update(MARGIN_FIELDS)
+    state = extract_preloaded_state(content)
+    if state is not None:
+        _fill(snap, _parse_state(state))
+        snap.parsed_by = "state"
+    if _missing(snap):
+        _fill(snap, _parse_soup(partial_soup(content)))
+        snap.parsed_by = "partial"
+    if _missing(snap):
+        _fill(snap, _parse_soup(snap.soup))
+        snap.parsed_by = "dom"
+    _count_parsed(snap.parsed_by)
+    return snap
+
+
+# ===============================
+# 取得
+# ===============================
+def fetch_quote_snapshot(ticker, timeout=5):
+    """銘柄ページを1回だけ取得して解析する。失敗時も QuoteSnapshot（ok=False）を返す"""
+    url = QUOTE_URL.format(ticker=ticker)
+    _count("fetches")
+    try:
+        with span("fetch", ticker=ticker, source="quote"):
+            r = http_get(url, timeout=timeout)
+        if r.status_code != 200:
+            return QuoteSnapshot(ticker=ticker, status=r.status_code, fetched_at=datetime.now())
+        with span("parse", ticker=ticker):
+            snap = parse_quote_page(ticker, r.content, status=r.status_code)
+        if snap.price is None and not snap.name:
+            count_error("quote", "parse_empty")
+        return snap
+    except Exception as e:
+        print(f"Quote Error {ticker}: {e}")
+        return QuoteSnapshot(ticker=ticker, error=str(e), fetched_at=datetime.now())
+
+
+def use_snapshot(ticker, snapshot=None):
+    """渡されたスナップショットを再利用し、無ければ取得する（読み出し回数を数える）"""
+    if snapshot is None or snapshot.ticker != ticker:
+        snapshot = fetch_quote_snapshot(ticker)
+    _count("reads")
+    return snapshot